@@ -2,22 +2,17 @@ import os
 import streamlit as st
 import tempfile
 from dotenv import load_dotenv
-from langchain.embeddings import HuggingFaceEmbeddings
-from langchain_community.vectorstores import Pinecone as LangPinecone
-from langchain_groq import ChatGroq
-from langchain.chains import RetrievalQA
-from langchain.prompts import PromptTemplate
-from pinecone import Pinecone, ServerlessSpec
-import pdfplumber
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain.schema import Document
+from qa_chain import ChainCache, format_sources
+from streaming import PendingAnswer
+import qa_pipeline
 import time
+import common_path  # noqa: F401
+from tracing import current_span, get_tracer, render_debug_panel
 
 # Load environment variables
 load_dotenv()
-groq_api_key = os.getenv("GROQ_API_KEY")
-pinecone_api_key = os.getenv("PINECONE_API_KEY")
-pinecone_env = os.getenv("PINECONE_ENV")
+# VECTOR_BACKEND, LOCAL_INDEX_DIR, INDEX_NAMESPACE, EMBEDDING_CACHE_PATH, GROQ/PINECONE keys
+settings = qa_pipeline.Settings.from_env()
 
 # App configuration
 st.set_page_config(
@@ -28,66 +23,107 @@ st.set_page_config(
 
 # App title and description
 st.title("Document Q&A Chatbot")
-st.markdown("Upload a PDF document and ask questions about its content.")
+st.markdown("Upload PDF documents to a collection and ask questions about their content.")
 
 # Initialize Pinecone client
 @st.cache_resource
 def init_pinecone():
-    pc = Pinecone(api_key=pinecone_api_key)
-    
-    # Define index name
-    index_name = "doc-qa-index"
-    
-    # Check if index exists, if not create
-    if index_name not in pc.list_indexes().names():
-        pc.create_index(
-            name=index_name,
-            dimension=384,  # all-MiniLM-L6-v2 has 384 dimensions
-            metric="cosine",
-            spec=ServerlessSpec(cloud="aws", region="us-east-1")
-        )
-    return pc, index_name
+    return qa_pipeline.init_pinecone(settings)
 
-# Load and split PDF
-def load_and_split_pdf(file_path):
-    with pdfplumber.open(file_path) as pdf:
-        text = "\n".join([page.extract_text() for page in pdf.pages if page.extract_text()])
-    
-    splitter = RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=50)
-    return splitter.create_documents([text])
-
-# Create embedding model
+# Create embedding model, served through the on-disk embedding cache
 @st.cache_resource
 def get_embedding_model():
-    return HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
+    return qa_pipeline.make_embedding_model(settings)
+
+# Semantic cache of answers to earlier questions (shared by all sessions)
+@st.cache_resource
+def get_answer_cache():
+    return qa_pipeline.make_answer_cache(get_embedding_model())
+
+# Open a collection's persistent local index (shared by all sessions)
+@st.cache_resource
+def init_local_vectorstore(namespace):
+    return qa_pipeline.open_local_store(settings.for_namespace(namespace), get_embedding_model())
+
+# BM25 keyword index kept next to the vectors for hybrid retrieval (None in dense mode)
+@st.cache_resource
+def get_keyword_index(namespace):
+    local_store = init_local_vectorstore(namespace) if settings.vector_backend == "local" else None
+    return qa_pipeline.open_keyword_index(settings.for_namespace(namespace), local_store=local_store)
+
+# Which documents (and which versions of them) each collection holds
+@st.cache_resource
+def get_manifest(namespace):
+    return qa_pipeline.open_manifest(settings.for_namespace(namespace))
+
+# Vector store and writer of a collection (local directory or Pinecone namespace)
+@st.cache_resource
+def get_index(namespace):
+    if settings.vector_backend == "local":
+        return qa_pipeline.open_index(
+            settings.for_namespace(namespace), get_embedding_model(),
+            local_store=init_local_vectorstore(namespace), keyword_index=get_keyword_index(namespace)
+        )
+    return qa_pipeline.open_index(
+        settings.for_namespace(namespace), get_embedding_model(),
+        pinecone_client=init_pinecone(), keyword_index=get_keyword_index(namespace)
+    )
+
+# Optional cross-encoder reranker, loaded once so queries stay within RERANK_BUDGET_MS
+@st.cache_resource
+def get_reranker():
+    reranker = qa_pipeline.make_reranker(settings)
+    if reranker is not None:
+        reranker.load()
+    return reranker
 
 # Initialize LLM without system_prompt
 @st.cache_resource
 def init_llm():
-    return ChatGroq(
-        api_key=groq_api_key,
-        model_name="llama3-8b-8192",
-        temperature=0.2,
-        top_p=0.9,
-        max_tokens=1024
-    )
+    return qa_pipeline.make_llm(settings)
 
 # Session state initialization
-if 'chat_history' not in st.session_state:
-    st.session_state.chat_history = []
-if 'vectorstore' not in st.session_state:
-    st.session_state.vectorstore = None
-if 'pdf_processed' not in st.session_state:
-    st.session_state.pdf_processed = False
+if 'memory' not in st.session_state:
+    # Recent turns verbatim plus a rolling summary; condenses follow-up questions
+    st.session_state.memory = qa_pipeline.make_memory(settings, init_llm())
+if 'show_messages' not in st.session_state:
+    st.session_state.show_messages = 20
 if 'query' not in st.session_state:
     st.session_state.query = ""
 if 'last_response_time' not in st.session_state:
     st.session_state.last_response_time = 0
+if 'chain_cache' not in st.session_state:
+    st.session_state.chain_cache = ChainCache()
+if 'last_timings' not in st.session_state:
+    st.session_state.last_timings = None
+if 'pending_answer' not in st.session_state:
+    st.session_state.pending_answer = None
+if 'doc_id' not in st.session_state:
+    st.session_state.doc_id = None
+if 'question_vector' not in st.session_state:
+    st.session_state.question_vector = None
+if 'trace_id' not in st.session_state:
+    st.session_state.trace_id = None
+if 'pending_question' not in st.session_state:
+    st.session_state.pending_question = None
 
-# Sidebar for PDF upload
+# Sidebar for collection selection and PDF upload
 with st.sidebar:
+    st.header("Collection")
+    namespace = st.text_input("Collection name", value=settings.namespace,
+                              help="Documents are stored and searched per collection")
+    try:
+        collection_settings = settings.for_namespace(namespace)
+        collection_settings.namespace_dir
+    except ValueError as e:
+        st.error(str(e))
+        st.stop()
+    manifest = get_manifest(namespace)
+
     st.header("Upload Document")
     uploaded_file = st.file_uploader("Choose a PDF file", type="pdf")
+    stream_answers = st.toggle("Stream answers", value=True)
+    show_trace = st.toggle("Show trace", value=False, help="Per-stage spans of the last question")
     
     if uploaded_file is not None:
         # Create a temporary file to store the uploaded PDF
@@ -98,24 +134,41 @@ with st.sidebar:
         if st.button("Process Document"):
             with st.spinner("Processing PDF..."):
                 try:
-                    # Initialize Pinecone
-                    pc, index_name = init_pinecone()
-                    
-                    # Load and split PDF
-                    docs = load_and_split_pdf(tmp_filepath)
-                    
                     # Get embedding model
                     embedding_model = get_embedding_model()
                     
-                    # Create vectorstore
-                    st.session_state.vectorstore = LangPinecone.from_documents(
-                        documents=docs,
-                        embedding=embedding_model,
-                        index_name=index_name
+                    # The collection's local memory-mapped index or Pinecone namespace
+                    _, index_writer = get_index(namespace)
+                    
+                    # Stream pages through extraction, chunking, embedding and upsert;
+                    # a re-uploaded file only writes the chunks that changed
+                    progress_text = st.empty()
+                    report = qa_pipeline.ingest_document(
+                        tmp_filepath,
+                        embedding_model,
+                        index_writer,
+                        manifest,
+                        source=uploaded_file.name,
+                        progress=lambda s: progress_text.text(f"{s.pages} pages, {s.chunks} chunks indexed")
                     )
+                    # Answers are cached per collection content, so no invalidation is needed
+                    if report["status"] == "unchanged":
+                        st.info(f"{uploaded_file.name} is already up to date in '{namespace}'")
+                    else:
+                        st.success(f"Document processed: {uploaded_file.name} ({report['status']})")
+                        throughput = report["throughput"]
+                        progress_text.text(
+                            f"{report['pages']} pages, {report['chunks']} chunks in {report['wall_seconds']:.1f}s "
+                            f"({report['added']} added, {report['deleted']} removed; "
+                            f"{throughput['pages_per_sec']:.1f} pages/s)"
+                        )
                     
-                    st.session_state.pdf_processed = True
-                    st.success(f"Document processed: {uploaded_file.name}")
+                    # Report how much of the document was already embedded
+                    cache_stats = get_embedding_model().cache.stats()
+                    st.caption(
+                        f"Embedding cache: {cache_stats['hits']} hits, "
+                        f"{cache_stats['misses']} misses ({cache_stats['hit_rate']:.0%} hit rate)"
+                    )
                     
                 except Exception as e:
                     st.error(f"Error processing document: {e}")
@@ -123,86 +176,171 @@ with st.sidebar:
                     # Clean up the temporary file
                     os.unlink(tmp_filepath)
 
+    # Documents in this collection: restrict the search or delete them
+    documents = manifest.documents()
+    selected_sources = []
+    if documents:
+        st.header("Documents")
+        selected_sources = st.multiselect(
+            "Search in", [doc["source"] for doc in documents],
+            help="Leave empty to search the whole collection"
+        )
+        for doc in documents:
+            col_name, col_delete = st.columns([4, 1])
+            col_name.caption(f"{doc['source']} · {doc['pages']} pages · {doc['chunks']} chunks")
+            if col_delete.button("🗑️", key=f"delete-{doc['source']}", help=f"Delete {doc['source']}"):
+                qa_pipeline.delete_document(doc["source"], get_index(namespace)[1], manifest)
+                st.rerun()
+
 # Define callback for query submission
 def submit_query():
     if st.session_state.query_input and st.session_state.query_input != st.session_state.query:
-        # Store the current query
-        current_query = st.session_state.query_input
-        
-        # Update session state with current query to prevent duplication
-        st.session_state.query = current_query
-        st.session_state.last_response_time = time.time()
-        
-        # Update chat history with user query
-        st.session_state.chat_history.append({"role": "user", "content": current_query})
-        
-        # Initialize LLM and get answer
-        with st.spinner("Thinking..."):
-            # Initialize LLM
-            llm = init_llm()
-            
-            # Configure retriever with better parameters
-            retriever = st.session_state.vectorstore.as_retriever(
-                search_type="mmr",  # Use Maximal Marginal Relevance for better diversity
-                search_kwargs={"k": 5}  # Get top 5 relevant chunks
-            )
-            
-            # Build the enhanced RAG chain with better prompt
-            qa_chain = RetrievalQA.from_chain_type(
-                llm=llm,
-                chain_type="stuff",
-                retriever=retriever,
-                return_source_documents=True,
-                chain_type_kwargs={
-                    "prompt": PromptTemplate(
-                        template=(
-                            "You are an expert assistant that helps answer questions based on the provided context.\n\n"
-                            "Context:\n{context}\n\n"
-                            "Question: {question}\n\n"
-                            "Instructions:\n"
-                            "1. Answer the question based on the context provided.\n"
-                            "2. If the answer is not in the context, say \"I don't have enough information to answer this question.\"\n"
-                            "3. Be concise but thorough in your response.\n"
-                            "4. If relevant, include the source document name and page number in your answer.\n"
-                            "5. Format your answer in clear, easy-to-read paragraphs.\n"
-                            "6. Use bullet points or numbered lists when appropriate.\n\n"
-                            "Answer:"
-                        ),
-                        input_variables=["context", "question"],
-                    )
-                }
-            )
-            
-            # Get answer with source documents
-            result = qa_chain.invoke({"query": current_query})
-            answer = result['result']
-            
-            # Add source documents if available
-            if 'source_documents' in result and result['source_documents']:
-                sources = list(set(
-                    f"Page {doc.metadata.get('page', 'N/A')}" 
-                    for doc in result['source_documents']
-                ))
-                if sources:
-                    answer += f"\n\nSources: {', '.join(sources)}"
-            
-            # Update chat history with AI response
-            st.session_state.chat_history.append({"role": "assistant", "content": answer})
+        # Every stage of this question is recorded under one trace; a streamed
+        # answer keeps the root span open until its last token
+        tracer = get_tracer()
+        root = tracer.start_span("qa.question")
+        st.session_state.trace_id = root.trace_id
+        try:
+            with tracer.use_span(root):
+                answer_query()
+        except BaseException as exc:
+            tracer.finish(root, error=exc)
+            raise
+        if st.session_state.pending_answer is None:
+            tracer.finish(root)
+
+# Record a streamed answer in the conversation; only complete answers are cached
+def save_streamed_answer(pending, question, interrupted=False):
+    if interrupted:
+        pending.cancel()
+        answer = pending.answer + " *(interrupted)*" + format_sources(pending.source_documents)
+    else:
+        answer = pending.answer + format_sources(pending.source_documents)
+        get_answer_cache().store(
+            st.session_state.doc_id, pending.query, answer,
+            latency=pending.timings["total"],
+            vector=st.session_state.question_vector
+        )
+    st.session_state.memory.record(question, answer)
+    st.session_state.memory.add_message("assistant", answer)
+    st.session_state.last_timings = pending.timings
+    return answer
+
+# Answer the submitted query from the cache, the blocking chain or a stream
+def answer_query():
+    # A stream that a rerun cut off before it reached the chat area is kept as it stands
+    if st.session_state.pending_answer is not None:
+        pending, st.session_state.pending_answer = st.session_state.pending_answer, None
+        save_streamed_answer(pending, st.session_state.pending_question or pending.query, interrupted=True)
+
+    # Store the current query
+    current_query = st.session_state.query_input
+
+    # Update session state with current query to prevent duplication
+    st.session_state.query = current_query
+    st.session_state.last_response_time = time.time()
+
+    # Update chat history with user query
+    memory = st.session_state.memory
+    memory.add_message("user", current_query)
+
+    # Rewrite follow-ups ("what about the second one?") into standalone questions
+    condense_start = time.perf_counter()
+    standalone_query = memory.condense(current_query)
+    condense_seconds = time.perf_counter() - condense_start
+
+    # Answer near-identical repeat questions from the semantic cache, scoped to
+    # the searched documents of this collection
+    st.session_state.doc_id = qa_pipeline.collection_id(collection_settings, manifest, selected_sources)
+    lookup_start = time.perf_counter()
+    cached, st.session_state.question_vector = qa_pipeline.lookup_answer(
+        get_answer_cache(), st.session_state.doc_id, standalone_query
+    )
+    if cached is not None:
+        memory.add_message("assistant", cached.answer)
+        memory.record(current_query, cached.answer)
+        st.session_state.last_timings = {"condense": condense_seconds, "cache": time.perf_counter() - lookup_start}
+        return
+
+    # Initialize LLM
+    llm = init_llm()
+
+    # Reuse the RAG chain built for this collection (dense + BM25 fused, or MMR only in dense mode)
+    vectorstore, _ = get_index(namespace)
+    qa_chain = qa_pipeline.build_chain(
+        collection_settings,
+        vectorstore,
+        llm,
+        keyword_index=get_keyword_index(namespace),
+        reranker=get_reranker(),
+        chain_cache=st.session_state.chain_cache,
+        sources=selected_sources
+    )
+
+    if stream_answers:
+        # Start retrieval now; tokens are streamed into the chat area below
+        st.session_state.pending_answer = PendingAnswer(
+            standalone_query, qa_chain.retriever, llm, root=current_span()
+        )
+        st.session_state.pending_question = current_query
+        return
+
+    # Get answer in one blocking call
+    with st.spinner("Thinking..."):
+        # Get answer with source documents, timing each stage
+        answer, timings = qa_pipeline.run_chain(qa_chain, standalone_query)
+        st.session_state.last_timings = {"condense": condense_seconds, **timings}
+        get_answer_cache().store(
+            st.session_state.doc_id, standalone_query, answer,
+            latency=timings["total"],
+            vector=st.session_state.question_vector
+        )
+
+        # Update chat history with AI response; older turns are summarised in the background
+        memory.add_message("assistant", answer)
+        memory.record(current_query, answer)
 
 # Main chat area
-if st.session_state.pdf_processed:
-    # Display chat history in a container
+if documents:
+    # Display the most recent messages; their markdown was formatted when they were added
+    memory = st.session_state.memory
     chat_container = st.container()
     with chat_container:
-        for message in st.session_state.chat_history:
-            if message["role"] == "user":
-                st.markdown(f"**You:** {message['content']}")
-            else:
-                # Format AI response with better markdown
-                response = message['content']
-                # Convert line breaks to markdown paragraphs
-                response = response.replace('\n', '  \n\n')
-                st.markdown(f"**AI:** {response}", unsafe_allow_html=True)
+        transcript = list(memory.transcript)
+        shown = transcript[-st.session_state.show_messages:]
+        earlier = len(transcript) - len(shown)
+        if earlier or memory.hidden_messages:
+            col_earlier, col_clear = st.columns([3, 1])
+            col_earlier.caption(f"{earlier + memory.hidden_messages} earlier messages not shown")
+            if earlier and col_earlier.button("Show earlier messages"):
+                st.session_state.show_messages += 20
+                st.rerun()
+            if col_clear.button("Clear conversation"):
+                memory.clear()
+                st.session_state.show_messages = 20
+                st.rerun()
+        for message in shown:
+            st.markdown(message["markdown"], unsafe_allow_html=message["role"] != "user")
+        
+        # Stream the pending answer, then attach its sources
+        pending = st.session_state.pending_answer
+        if pending is not None:
+            st.session_state.pending_answer = None
+            question = st.session_state.pending_question or pending.query
+            placeholder = st.empty()
+            try:
+                for _ in pending:
+                    placeholder.markdown(f"**AI:** {pending.answer}▌")
+                save_streamed_answer(pending, question)
+            except Exception as e:
+                memory.add_message("assistant", f"Error generating answer: {e}")
+                st.session_state.last_timings = pending.timings
+            except BaseException:
+                # A rerun (e.g. the next question) stopped the script mid-stream:
+                # stop generating and keep the partial answer in the conversation
+                save_streamed_answer(pending, question, interrupted=True)
+                raise
+            placeholder.markdown(memory.transcript[-1]["markdown"], unsafe_allow_html=True)
     
     # Query input with callback
     st.text_input(
@@ -210,6 +348,26 @@ if st.session_state.pdf_processed:
         key="query_input",
         on_change=submit_query
     )
+    
+    # Latency breakdown of the last answer
+    if st.session_state.last_timings:
+        timings = st.session_state.last_timings
+        st.caption(" | ".join(
+            f"{stage}: {seconds * 1000:.0f} ms"
+            for stage, seconds in timings.items() if seconds is not None
+        ))
+    
+    # Semantic answer cache effectiveness
+    answer_cache_stats = get_answer_cache().stats()
+    if answer_cache_stats["lookups"]:
+        st.caption(
+            f"Answer cache: {answer_cache_stats['hit_rate']:.0%} hit rate, "
+            f"{answer_cache_stats['seconds_saved']:.1f}s saved"
+        )
+    
+    # Span tree of the last question
+    if show_trace:
+        render_debug_panel(st.session_state.trace_id)
 else:
     st.info("Please upload and process a document to start the conversation.")
 
@@ -0,0 +1,219 @@
+"""Incremental BM25 keyword index for the Document Q&A Chatbot.
+
+Dense embeddings are good at paraphrases but weak at exact tokens such as
+part numbers, error codes or identifiers. This index keeps an inverted list
+of every chunk's terms in a small SQLite file, filled batch by batch during
+ingestion next to the vectors, and scores queries with Okapi BM25. Results
+are LangChain ``Document`` objects so they can be fused with the dense hits
+(see :mod:`hybrid_retriever`).
+
+Chunks are keyed by :func:`document_key` (source, page and text) -- the
+same content-hash id the vector stores use -- so re-ingesting a document
+does not index its chunks twice and stale chunks can be deleted by id.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import math
+import re
+import sqlite3
+import threading
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from langchain.schema import Document
+
+from local_vectorstore import metadata_matches
+
+# Lower-cased alphanumeric runs, keeping joined forms such as "err-4021",
+# "v2.3.1" or "x86_64" together; their parts are indexed as well.
+_TOKEN = re.compile(r"[a-z0-9]+(?:[-_./:][a-z0-9]+)*")
+_JOINERS = re.compile(r"[-_./:]")
+
+STOPWORDS = frozenset(
+    "a an and are as at be but by for from has have in is it its of on or that the this to was were "
+    "what when where which who why will with how do does did can i you your we our".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    tokens = []
+    for token in _TOKEN.findall(text.lower()):
+        if token in STOPWORDS:
+            continue
+        tokens.append(token)
+        if _JOINERS.search(token):
+            tokens.extend(part for part in _JOINERS.split(token) if part and part not in STOPWORDS)
+    return tokens
+
+
+def document_key(doc: Document) -> str:
+    """Content-hash id of a chunk, shared by the vector stores, the keyword index and rank fusion."""
+    meta = doc.metadata or {}
+    page = meta.get("page", "")
+    # Pinecone returns numeric metadata as floats.
+    if isinstance(page, float) and page.is_integer():
+        page = int(page)
+    raw = f"{meta.get('source', '')}\0{page}\0{doc.page_content}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class BM25Index:
+    """SQLite-backed inverted index scored with BM25.
+
+    Parameters
+    ----------
+    path : str | Path
+        SQLite database file; created if missing.
+    k1, b : float
+        BM25 term-frequency saturation and length normalisation.
+    """
+
+    def __init__(self, path: str | Path, k1: float = 1.2, b: float = 0.75):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            "CREATE TABLE IF NOT EXISTS docs ("
+            " id INTEGER PRIMARY KEY, key TEXT UNIQUE NOT NULL, text TEXT NOT NULL,"
+            " metadata TEXT NOT NULL, length INTEGER NOT NULL);"
+            "CREATE TABLE IF NOT EXISTS postings ("
+            " term TEXT NOT NULL, doc INTEGER NOT NULL, tf INTEGER NOT NULL, PRIMARY KEY (term, doc))"
+            " WITHOUT ROWID;"
+            "CREATE INDEX IF NOT EXISTS postings_doc ON postings (doc);"
+            "CREATE TABLE IF NOT EXISTS terms (term TEXT PRIMARY KEY, df INTEGER NOT NULL) WITHOUT ROWID;"
+            "CREATE TABLE IF NOT EXISTS stats (name TEXT PRIMARY KEY, value INTEGER NOT NULL);"
+        )
+        self._conn.commit()
+
+    # ------------------------------------------------------------------
+    # Writes
+    # ------------------------------------------------------------------
+
+    def add_documents(self, docs: Iterable[Document]) -> int:
+        """Index ``docs`` in one transaction; return how many were new."""
+        added = 0
+        total_length = 0
+        postings: List[Tuple[str, int, int]] = []
+        df: Counter = Counter()
+        with self._lock:
+            for doc in docs:
+                counts = Counter(tokenize(doc.page_content))
+                length = sum(counts.values())
+                cursor = self._conn.execute(
+                    "INSERT OR IGNORE INTO docs (key, text, metadata, length) VALUES (?, ?, ?, ?)",
+                    (document_key(doc), doc.page_content, json.dumps(doc.metadata or {}), length),
+                )
+                if not cursor.rowcount:
+                    continue
+                added += 1
+                total_length += length
+                postings.extend((term, cursor.lastrowid, tf) for term, tf in counts.items())
+                df.update(counts.keys())
+            self._conn.executemany("INSERT INTO postings VALUES (?, ?, ?)", postings)
+            self._conn.executemany(
+                "INSERT INTO terms VALUES (?, ?) ON CONFLICT(term) DO UPDATE SET df = df + excluded.df",
+                df.items(),
+            )
+            self._conn.executemany(
+                "INSERT INTO stats VALUES (?, ?) ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+                [("docs", added), ("length", total_length)],
+            )
+            self._conn.commit()
+        return added
+
+    def delete(self, keys: Iterable[str]) -> int:
+        """Remove the chunks with the given :func:`document_key` ids; return how many existed."""
+        removed = 0
+        total_length = 0
+        with self._lock:
+            for key in keys:
+                row = self._conn.execute("SELECT id, length FROM docs WHERE key = ?", (key,)).fetchone()
+                if row is None:
+                    continue
+                doc, length = row
+                removed += 1
+                total_length += length
+                self._conn.execute(
+                    "UPDATE terms SET df = df - 1 WHERE term IN (SELECT term FROM postings WHERE doc = ?)", (doc,)
+                )
+                self._conn.execute("DELETE FROM postings WHERE doc = ?", (doc,))
+                self._conn.execute("DELETE FROM docs WHERE id = ?", (doc,))
+            self._conn.execute("DELETE FROM terms WHERE df <= 0")
+            self._conn.executemany("UPDATE stats SET value = value - ? WHERE name = ?",
+                                   [(removed, "docs"), (total_length, "length")])
+            self._conn.commit()
+        return removed
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.executescript("DELETE FROM docs; DELETE FROM postings; DELETE FROM terms; DELETE FROM stats;")
+            self._conn.commit()
+
+    # ------------------------------------------------------------------
+    # Search
+    # ------------------------------------------------------------------
+
+    def _stats(self) -> Tuple[int, float]:
+        values = dict(self._conn.execute("SELECT name, value FROM stats").fetchall())
+        n = values.get("docs", 0)
+        return n, (values.get("length", 0) / n if n else 0.0)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._stats()[0]
+
+    def search_with_scores(self, query: str, k: int = 20,
+                           filter: Optional[dict] = None) -> List[Tuple[Document, float]]:
+        """Return the ``k`` best chunks for ``query`` with their BM25 scores.
+
+        ``filter`` restricts results by metadata, as in
+        :meth:`local_vectorstore.LocalVectorStore.similarity_search`.
+        """
+        terms = Counter(tokenize(query))
+        if not terms or k <= 0:
+            return []
+        scores: Dict[int, float] = defaultdict(float)
+        with self._lock:
+            n, avg_length = self._stats()
+            if not n:
+                return []
+            marks = ",".join("?" * len(terms))
+            dfs = dict(self._conn.execute(f"SELECT term, df FROM terms WHERE term IN ({marks})", list(terms)))
+            for term, df in dfs.items():
+                idf = math.log(1.0 + (n - df + 0.5) / (df + 0.5))
+                rows = self._conn.execute(
+                    "SELECT p.doc, p.tf, d.length FROM postings p JOIN docs d ON d.id = p.doc WHERE p.term = ?",
+                    (term,),
+                )
+                for doc, tf, length in rows:
+                    norm = self.k1 * (1.0 - self.b + self.b * length / avg_length)
+                    scores[doc] += terms[term] * idf * tf * (self.k1 + 1.0) / (tf + norm)
+
+            ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+            results: List[Tuple[Document, float]] = []
+            # Without a filter one page of k is enough; with one, keep paging until k match.
+            for start in range(0, len(ranked), k):
+                page = ranked[start:start + k]
+                marks = ",".join("?" * len(page))
+                records = {
+                    row[0]: row[1:]
+                    for row in self._conn.execute(f"SELECT id, text, metadata FROM docs WHERE id IN ({marks})",
+                                                  [doc for doc, _ in page])
+                }
+                for doc, score in page:
+                    metadata = json.loads(records[doc][1])
+                    if metadata_matches(metadata, filter):
+                        results.append((Document(page_content=records[doc][0], metadata=metadata), score))
+                if len(results) >= k:
+                    break
+        return results[:k]
+
+    def search(self, query: str, k: int = 20, filter: Optional[dict] = None) -> List[Document]:
+        return [doc for doc, _ in self.search_with_scores(query, k=k, filter=filter)]
@@ -0,0 +1,235 @@
+"""Headless batch runner for the Document Q&A Chatbot.
+
+Ingest a directory of PDFs, or answer a JSONL file of questions, without
+Streamlit::
+
+    python cli.py ingest docs/ extra.pdf --out ingest.jsonl
+    python cli.py ask questions.jsonl --out answers.jsonl --workers 8
+    python cli.py ask followups.jsonl --conversation
+    python cli.py --namespace team-a list
+    python cli.py --namespace team-a delete old-report.pdf
+
+Question lines are JSON objects with a ``question`` field (other fields are
+copied to the output) or plain text. Input and output default to
+stdin/stdout (``-``). Settings come from the same environment variables as
+the app (``VECTOR_BACKEND``, ``LOCAL_INDEX_DIR``, ``INDEX_NAMESPACE``, ...).
+With ``--conversation`` the questions are one dialogue: they are answered in
+order and follow-ups are rewritten against the earlier turns.
+A PDF found in a directory is stored under its path relative to that
+directory (``a/report.pdf``), a PDF given directly under the path as given;
+re-ingesting it under the same source only writes the chunks that changed.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Tuple
+
+from dotenv import load_dotenv
+
+import qa_pipeline
+
+
+def read_jsonl(path: str) -> Iterator[Dict[str, Any]]:
+    stream = sys.stdin if path == "-" else open(path, encoding="utf-8")
+    with stream:
+        for line in stream:
+            line = line.strip()
+            if not line:
+                continue
+            yield json.loads(line) if line.startswith("{") else {"question": line}
+
+
+class JsonlWriter:
+    """Thread-safe JSONL sink that flushes every record."""
+
+    def __init__(self, path: str):
+        self._stream = sys.stdout if path == "-" else open(path, "w", encoding="utf-8")
+        self._lock = threading.Lock()
+
+    def write(self, record: Dict[str, Any]) -> None:
+        with self._lock:
+            self._stream.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+            self._stream.flush()
+
+    def close(self) -> None:
+        if self._stream is not sys.stdout:
+            self._stream.close()
+
+
+def find_pdfs(paths: List[str]) -> List[Tuple[Path, str]]:
+    """Return ``(pdf, source)`` pairs; raise ``ValueError`` if two files map to one source."""
+    pdfs = []
+    for path in map(Path, paths):
+        if path.is_dir():
+            pdfs.extend((pdf, pdf.relative_to(path).as_posix()) for pdf in sorted(path.rglob("*.pdf")))
+        else:
+            pdfs.append((path, path.as_posix()))
+    seen: Dict[str, Path] = {}
+    for pdf, source in pdfs:
+        if source in seen and seen[source].resolve() != pdf.resolve():
+            raise ValueError(f"{seen[source]} and {pdf} would both be stored as {source!r}")
+        seen[source] = pdf
+    return list(dict((source, (pdf, source)) for pdf, source in pdfs).values())
+
+
+def cmd_ingest(args: argparse.Namespace, settings: qa_pipeline.Settings) -> int:
+    # Sources are unique, so concurrent files never update the same manifest entry.
+    try:
+        pdfs = find_pdfs(args.paths)
+    except ValueError as exc:
+        print(f"error: {exc}", file=sys.stderr)
+        return 2
+    embedding = qa_pipeline.make_embedding_model(settings)
+    _, index_writer = qa_pipeline.open_index(settings, embedding,
+                                             keyword_index=qa_pipeline.open_keyword_index(settings))
+    manifest = qa_pipeline.open_manifest(settings)
+    writer = JsonlWriter(args.out)
+    failures = 0
+
+    def _ingest(pdf: Path, source: str) -> Dict[str, Any]:
+        try:
+            return qa_pipeline.ingest_document(str(pdf), embedding, index_writer, manifest, source=source,
+                                               workers=args.page_workers, force=args.force)
+        except Exception as exc:  # noqa: BLE001 - reported per file
+            return {"source": source, "error": str(exc)}
+
+    # Several files at once; each one also extracts its pages in a process pool.
+    with ThreadPoolExecutor(max_workers=args.file_workers) as pool:
+        for future in as_completed([pool.submit(_ingest, pdf, source) for pdf, source in pdfs]):
+            report = future.result()
+            failures += "error" in report
+            writer.write(report)
+    writer.close()
+    return 1 if failures else 0
+
+
+def cmd_ask(args: argparse.Namespace, settings: qa_pipeline.Settings) -> int:
+    embedding = qa_pipeline.make_embedding_model(settings)
+    vectorstore, _ = qa_pipeline.open_index(settings, embedding)
+    keyword_index = qa_pipeline.open_keyword_index(
+        settings, local_store=vectorstore if settings.vector_backend == "local" else None
+    )
+    llm = qa_pipeline.make_llm(settings)
+    qa_chain = qa_pipeline.build_chain(settings, vectorstore, llm,
+                                       keyword_index=keyword_index, reranker=qa_pipeline.make_reranker(settings),
+                                       search_type=args.search_type, sources=args.source)
+    answer_cache = None if args.no_cache else qa_pipeline.make_answer_cache(embedding)
+    doc_id = args.doc_id or qa_pipeline.collection_id(settings, qa_pipeline.open_manifest(settings), args.source)
+    memory = qa_pipeline.make_memory(settings, llm) if args.conversation else None
+    writer = JsonlWriter(args.out)
+    failures = 0
+
+    def _answer(record: Dict[str, Any]) -> Dict[str, Any]:
+        question = record.get("question") or record.get("query", "")
+        try:
+            result = qa_pipeline.answer_question(qa_chain, question, answer_cache=answer_cache, doc_id=doc_id,
+                                                 memory=memory)
+            return {**record, **result}
+        except Exception as exc:  # noqa: BLE001 - reported per question
+            return {**record, "error": str(exc)}
+
+    # LLM calls are I/O bound, so threads overlap them; map keeps input order.
+    # A conversation depends on its earlier turns and is answered sequentially.
+    with ThreadPoolExecutor(max_workers=1 if memory is not None else args.workers) as pool:
+        for result in pool.map(_answer, read_jsonl(args.input)):
+            failures += "error" in result
+            writer.write(result)
+    writer.close()
+    return 1 if failures else 0
+
+
+def cmd_list(args: argparse.Namespace, settings: qa_pipeline.Settings) -> int:
+    writer = JsonlWriter(args.out)
+    for document in qa_pipeline.open_manifest(settings).documents():
+        writer.write({"namespace": settings.namespace, **document})
+    writer.close()
+    return 0
+
+
+def cmd_delete(args: argparse.Namespace, settings: qa_pipeline.Settings) -> int:
+    embedding = qa_pipeline.make_embedding_model(settings)
+    _, index_writer = qa_pipeline.open_index(settings, embedding,
+                                             keyword_index=qa_pipeline.open_keyword_index(settings))
+    manifest = qa_pipeline.open_manifest(settings)
+    writer = JsonlWriter(args.out)
+    missing = 0
+    for source in args.sources:
+        if manifest.document(source) is None:
+            missing += 1
+            writer.write({"source": source, "error": "not in namespace"})
+            continue
+        writer.write({"source": source, "deleted": qa_pipeline.delete_document(source, index_writer, manifest)})
+    writer.close()
+    return 1 if missing else 0
+
+
+def main(argv: List[str] | None = None) -> int:
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Document Q&A batch runner")
+    parser.add_argument("--backend", choices=["pinecone", "local"], help="Override VECTOR_BACKEND")
+    parser.add_argument("--index-dir", help="Override LOCAL_INDEX_DIR")
+    parser.add_argument("--namespace", help="Override INDEX_NAMESPACE (per-user or per-collection partition)")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    ingest = sub.add_parser("ingest", help="Ingest PDFs (files or directories, searched recursively)")
+    ingest.add_argument("paths", nargs="+")
+    ingest.add_argument("--out", default="-", help="JSONL report, one line per PDF")
+    ingest.add_argument("--file-workers", type=int, default=2, help="PDFs ingested concurrently")
+    ingest.add_argument("--page-workers", type=int, default=None, help="Page-extraction processes per PDF")
+    ingest.add_argument("--force", action="store_true", help="Re-chunk files even if unchanged")
+    ingest.set_defaults(func=cmd_ingest)
+
+    ask = sub.add_parser("ask", help="Answer a JSONL file of questions")
+    ask.add_argument("input", nargs="?", default="-")
+    ask.add_argument("--out", default="-")
+    ask.add_argument("--workers", type=int, default=4, help="Questions answered concurrently")
+    ask.add_argument("--search-type", default="mmr", help="Dense search: mmr or similarity")
+    ask.add_argument("--retrieval", choices=["hybrid", "dense"], help="Override RETRIEVAL_MODE")
+    ask.add_argument("--k", type=int, help="Chunks passed to the LLM (overrides RETRIEVAL_K)")
+    ask.add_argument("--rerank", action="store_true", help="Rerank fused results with the cross-encoder")
+    ask.add_argument("--context-tokens", type=int, help="Prompt context budget, 0 = no packing (CONTEXT_MAX_TOKENS)")
+    ask.add_argument("--compress", action="store_true", help="Extractive sentence compression of the context")
+    ask.add_argument("--source", action="append", help="Only search this document (repeatable)")
+    ask.add_argument("--doc-id", help="Semantic-cache scope (defaults to the searched documents)")
+    ask.add_argument("--no-cache", action="store_true", help="Skip the semantic answer cache")
+    ask.add_argument("--conversation", action="store_true",
+                     help="Treat the questions as one dialogue and rewrite follow-ups (MEMORY_* settings)")
+    ask.set_defaults(func=cmd_ask)
+
+    list_docs = sub.add_parser("list", help="List the documents in the namespace")
+    list_docs.add_argument("--out", default="-")
+    list_docs.set_defaults(func=cmd_list)
+
+    delete = sub.add_parser("delete", help="Delete documents (by source name) from the namespace")
+    delete.add_argument("sources", nargs="+")
+    delete.add_argument("--out", default="-")
+    delete.set_defaults(func=cmd_delete)
+
+    args = parser.parse_args(argv)
+    settings = qa_pipeline.Settings.from_env()
+    if args.backend:
+        settings.vector_backend = args.backend
+    if args.index_dir:
+        settings.local_index_dir = args.index_dir
+    if args.namespace:
+        settings.namespace = args.namespace
+    if getattr(args, "retrieval", None):
+        settings.retrieval_mode = args.retrieval
+    if getattr(args, "k", None):
+        settings.retrieval_k = args.k
+    if getattr(args, "rerank", False):
+        settings.rerank = True
+    if getattr(args, "context_tokens", None) is not None:
+        settings.context_max_tokens = args.context_tokens
+    if getattr(args, "compress", False):
+        settings.context_compress = True
+    return args.func(args, settings)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
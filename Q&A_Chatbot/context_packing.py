@@ -0,0 +1,299 @@
+"""Token-budgeted context assembly between the retriever and the chat model.
+
+Retrieved chunks overlap (the splitter repeats 50 characters between
+neighbours), often come from the same page and sometimes repeat each
+other. :func:`pack_context` turns them into a compact context:
+
+1. exact and near-duplicate chunks are dropped,
+2. overlapping or adjacent chunks of the same page are merged back into one
+   passage,
+3. passages are added in relevance order until ``max_tokens`` is reached;
+   a passage that does not fit is cut to the leading sentences that do.
+   With ``compress`` each passage is instead reduced to the sentences that
+   mention query terms (extractive compression), best-scoring first when
+   space is short.
+
+:class:`PackedRetriever` applies this to any retriever, so the "stuff"
+chain and the streaming path send the packed passages unchanged. Tokens are
+counted with tiktoken's ``cl100k_base`` when its encoding is available
+locally and estimated from words and punctuation otherwise.
+"""
+from __future__ import annotations
+
+import re
+import threading
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from langchain.callbacks.manager import AsyncCallbackManagerForRetrieverRun, CallbackManagerForRetrieverRun
+from langchain.schema import BaseRetriever, Document
+
+from bm25_index import tokenize
+
+import common_path  # noqa: F401
+from tracing import get_tracer
+
+_SENTENCE = re.compile(r"(?<=[.!?])\s+(?=[A-Z0-9\"'(\[])")
+_WORD_PIECES = re.compile(r"\w+|[^\w\s]")
+_MIN_OVERLAP = 20
+
+
+# ---------------------------------------------------------------------------
+# Token counting
+# ---------------------------------------------------------------------------
+
+_encoder_lock = threading.Lock()
+_count_tokens: Optional[Callable[[str], int]] = None
+
+
+def _estimate_tokens(text: str) -> int:
+    # Long words split into several BPE pieces; ~1.3 tokens per word on English prose.
+    return sum(1 + len(piece) // 6 for piece in _WORD_PIECES.findall(text))
+
+
+def count_tokens(text: str) -> int:
+    """Token count of ``text`` (tiktoken ``cl100k_base``, or an estimate when it cannot be loaded)."""
+    global _count_tokens
+    if _count_tokens is None:
+        with _encoder_lock:
+            if _count_tokens is None:
+                try:
+                    import tiktoken
+
+                    encoding = tiktoken.get_encoding("cl100k_base")
+                    _count_tokens = lambda t: len(encoding.encode(t, disallowed_special=()))  # noqa: E731
+                except Exception:  # noqa: BLE001 - not installed, or the encoding file cannot be fetched
+                    _count_tokens = _estimate_tokens
+    return _count_tokens(text)
+
+
+# ---------------------------------------------------------------------------
+# Passages
+# ---------------------------------------------------------------------------
+
+
+@dataclass
+class Passage:
+    """One or more merged chunks of a page; ``rank`` is the best rank among them."""
+
+    text: str
+    metadata: Dict[str, Any]
+    rank: int
+    start: Optional[int] = None
+    chunks: int = 1
+
+    @property
+    def end(self) -> Optional[int]:
+        return None if self.start is None else self.start + len(self.text)
+
+
+def _normalize(text: str) -> str:
+    return " ".join(text.split()).lower()
+
+
+def _overlap(left: str, right: str, max_overlap: int = 200) -> int:
+    """Length of the longest suffix of ``left`` that is a prefix of ``right``."""
+    for size in range(min(len(left), len(right), max_overlap), _MIN_OVERLAP - 1, -1):
+        if left.endswith(right[:size]):
+            return size
+    return 0
+
+
+def _shingles(text: str, size: int = 3) -> Set[Tuple[str, ...]]:
+    words = text.split()
+    return {tuple(words[i:i + size]) for i in range(max(1, len(words) - size + 1))}
+
+
+def _try_merge(a: Passage, b: Passage) -> Optional[Passage]:
+    """Merge two passages of the same page if they overlap or touch."""
+    if a.start is not None and b.start is not None:
+        first, second = (a, b) if a.start <= b.start else (b, a)
+        if second.start > first.end + 1:
+            return None
+        text = first.text + second.text[max(0, first.end - second.start):]
+    else:
+        if (size := _overlap(a.text, b.text)):
+            first, second, text = a, b, a.text + b.text[size:]
+        elif (size := _overlap(b.text, a.text)):
+            first, second, text = b, a, b.text + a.text[size:]
+        else:
+            return None
+    return Passage(text=text, metadata=first.metadata, rank=min(a.rank, b.rank), start=first.start,
+                   chunks=a.chunks + b.chunks)
+
+
+def merge_chunks(docs: List[Document], near_duplicate: float = 0.9) -> List[Passage]:
+    """Deduplicate ``docs`` (in relevance order) and merge neighbouring chunks of each page."""
+    kept: List[Passage] = []
+    signatures: List[Tuple[str, Set[Tuple[str, ...]]]] = []
+    for rank, doc in enumerate(docs):
+        norm = _normalize(doc.page_content)
+        if not norm:
+            continue
+        shingles = _shingles(norm)
+        duplicate = any(
+            norm in other or len(shingles & other_shingles) / len(shingles | other_shingles) >= near_duplicate
+            for other, other_shingles in signatures
+        )
+        if duplicate:
+            continue
+        signatures.append((norm, shingles))
+        kept.append(Passage(text=doc.page_content, metadata=dict(doc.metadata), rank=rank,
+                            start=doc.metadata.get("start_index")))
+
+    by_page: Dict[Tuple[Any, Any], List[Passage]] = {}
+    for passage in kept:
+        by_page.setdefault((passage.metadata.get("source"), passage.metadata.get("page")), []).append(passage)
+
+    merged: List[Passage] = []
+    for passages in by_page.values():
+        passages.sort(key=lambda p: (p.start is None, p.start or 0))
+        pending = passages
+        while pending:
+            current, rest = pending[0], []
+            for other in pending[1:]:
+                combined = _try_merge(current, other)
+                if combined is None:
+                    rest.append(other)
+                else:
+                    current = combined
+            merged.append(current)
+            pending = rest
+    merged.sort(key=lambda p: p.rank)
+    return merged
+
+
+# ---------------------------------------------------------------------------
+# Compression and packing
+# ---------------------------------------------------------------------------
+
+
+def split_sentences(text: str) -> List[str]:
+    return [s for s in (part.strip() for part in _SENTENCE.split(" ".join(text.split()))) if s]
+
+
+def compress_text(text: str, query: str, max_tokens: Optional[int] = None) -> str:
+    """Keep the sentences of ``text`` that share terms with ``query``, in their original order.
+
+    With ``max_tokens`` the best-scoring sentences that fit are kept. Returns
+    ``""`` when no sentence matches.
+    """
+    terms = set(tokenize(query))
+    sentences = split_sentences(text)
+    scored = []
+    for index, sentence in enumerate(sentences):
+        hits = len(terms & set(tokenize(sentence)))
+        if hits:
+            scored.append((hits, -index, index, sentence))
+    if max_tokens is None:
+        return " ".join(sentence for *_, sentence in scored)
+
+    chosen, used = [], 0
+    for _, _, index, sentence in sorted(scored, reverse=True):
+        tokens = count_tokens(sentence) + 1
+        if used + tokens <= max_tokens:
+            chosen.append((index, sentence))
+            used += tokens
+    return " ".join(sentence for _, sentence in sorted(chosen))
+
+
+def leading_sentences(text: str, max_tokens: int) -> str:
+    """The longest run of whole sentences from the start of ``text`` that fits in ``max_tokens``."""
+    kept, used = [], 0
+    for sentence in split_sentences(text):
+        used += count_tokens(sentence) + 1
+        if used > max_tokens:
+            break
+        kept.append(sentence)
+    return " ".join(kept)
+
+
+def _header(metadata: Dict[str, Any]) -> str:
+    page = metadata.get("page")
+    if isinstance(page, float) and page.is_integer():
+        page = int(page)
+    parts = [str(metadata["source"])] if metadata.get("source") else []
+    if page is not None:
+        parts.append(f"page {page}")
+    return f"[{', '.join(parts)}]\n" if parts else ""
+
+
+@dataclass
+class PackStats:
+    """What :func:`pack_context` did; ``shortened`` counts compressed or cut passages."""
+
+    chunks_in: int = 0
+    tokens_in: int = 0
+    passages: int = 0
+    tokens_out: int = 0
+    shortened: int = 0
+    dropped: int = 0
+
+
+def pack_context(docs: List[Document], max_tokens: int, query: str = "", compress: bool = False,
+                 stats: Optional[PackStats] = None) -> List[Document]:
+    """Return passages built from ``docs`` (relevance order) that fit in ``max_tokens``.
+
+    Each passage starts with a ``[source, page N]`` line so the model can
+    cite it, and keeps the metadata of its first chunk.
+    """
+    stats = stats if stats is not None else PackStats()
+    stats.chunks_in = len(docs)
+    stats.tokens_in = sum(count_tokens(doc.page_content) for doc in docs)
+
+    packed: List[Document] = []
+    used = 0
+    for passage in merge_chunks(docs):
+        header = _header(passage.metadata)
+        text = passage.text
+        if compress and query:
+            text = compress_text(text, query) or text
+        tokens = count_tokens(header + text)
+        remaining = max_tokens - used
+        if tokens > remaining:
+            space = remaining - count_tokens(header)
+            if space < 16:
+                stats.dropped += 1
+                continue
+            if compress and query:
+                text = compress_text(text, query, max_tokens=space)
+            else:
+                text = leading_sentences(text, space)
+            if not text:
+                stats.dropped += 1
+                continue
+            tokens = count_tokens(header + text)
+        if text != passage.text:
+            stats.shortened += 1
+        used += tokens
+        packed.append(Document(page_content=header + text, metadata=passage.metadata))
+
+    stats.passages = len(packed)
+    stats.tokens_out = used
+    return packed
+
+
+class PackedRetriever(BaseRetriever):
+    """Wrap a retriever so its results are merged, deduplicated and packed into a token budget."""
+
+    retriever: BaseRetriever
+    max_tokens: int = 800
+    compress: bool = False
+
+    def _pack(self, query: str, docs: List[Document]) -> List[Document]:
+        stats = PackStats()
+        with get_tracer().span("qa.pack_context", budget=self.max_tokens, compress=self.compress) as span:
+            packed = pack_context(docs, self.max_tokens, query=query, compress=self.compress, stats=stats)
+            span.set(chunks_in=stats.chunks_in, tokens_in=stats.tokens_in, passages=stats.passages,
+                     tokens_out=stats.tokens_out, shortened=stats.shortened, dropped=stats.dropped)
+        return packed
+
+    def _get_relevant_documents(self, query: str, *,
+                                run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        docs = self.retriever.get_relevant_documents(query, callbacks=run_manager.get_child())
+        return self._pack(query, docs)
+
+    async def _aget_relevant_documents(self, query: str, *,
+                                       run_manager: AsyncCallbackManagerForRetrieverRun) -> List[Document]:
+        docs = await self.retriever.aget_relevant_documents(query, callbacks=run_manager.get_child())
+        return self._pack(query, docs)
@@ -0,0 +1,230 @@
+"""Bounded conversation memory for the Document Q&A Chatbot.
+
+:class:`ConversationMemory` keeps the last ``window_turns`` question/answer
+pairs verbatim and folds older turns into a rolling summary. The summary is
+updated incrementally (old summary + newly evicted turns -> new summary) on
+a background thread after an answer is shown, and capped at
+``summary_tokens``, so neither memory use nor prompt size grows with the
+length of a session.
+
+Before retrieval, :meth:`ConversationMemory.condense` rewrites a follow-up
+question ("what about the second one?") into a standalone query using the
+summary and the window. The displayed transcript is a bounded deque of
+messages whose markdown is formatted once, when the message is added.
+"""
+from __future__ import annotations
+
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Deque, Dict, List, Optional
+
+from langchain.prompts import PromptTemplate
+
+from context_packing import count_tokens, leading_sentences
+
+import common_path  # noqa: F401
+from tracing import get_tracer, in_current_context
+
+CONDENSE_PROMPT = PromptTemplate(
+    template=(
+        "Rewrite the follow-up question so it can be understood without the conversation.\n"
+        "Resolve pronouns and references using the conversation. If the question is already "
+        "standalone, return it unchanged. Reply with the question only.\n\n"
+        "{history}\n\n"
+        "Follow-up question: {question}\n"
+        "Standalone question:"
+    ),
+    input_variables=["history", "question"],
+)
+
+SUMMARY_PROMPT = PromptTemplate(
+    template=(
+        "Update the summary of a conversation about some documents with the new exchanges.\n"
+        "Keep facts, names, numbers and open questions; drop pleasantries. "
+        "Use at most {max_words} words.\n\n"
+        "Current summary:\n{summary}\n\n"
+        "New exchanges:\n{turns}\n\n"
+        "Updated summary:"
+    ),
+    input_variables=["summary", "turns", "max_words"],
+)
+
+_summary_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="conversation-summary")
+
+
+@dataclass
+class Turn:
+    question: str
+    answer: str
+
+
+def _content(result: Any) -> str:
+    return (getattr(result, "content", result) or "").strip()
+
+
+class ConversationMemory:
+    """Window of recent turns plus a rolling summary of older ones.
+
+    Parameters
+    ----------
+    llm : BaseChatModel, optional
+        Model used to condense questions and update the summary. Without
+        one, questions are used as asked and evicted turns are dropped.
+    window_turns : int
+        Question/answer pairs kept verbatim.
+    summary_tokens : int
+        Upper bound on the summary length.
+    answer_tokens : int
+        Each windowed answer is cut to this many tokens in prompts.
+    transcript_limit : int
+        Messages kept for display.
+    """
+
+    def __init__(self, llm=None, window_turns: int = 4, summary_tokens: int = 256, answer_tokens: int = 200,
+                 transcript_limit: int = 200):
+        self.llm = llm
+        self.window_turns = window_turns
+        self.summary_tokens = summary_tokens
+        self.answer_tokens = answer_tokens
+        self.summary = ""
+        self.turns: Deque[Turn] = deque()
+        self.transcript: Deque[Dict[str, str]] = deque(maxlen=transcript_limit)
+        self.total_messages = 0
+        self._evicted: List[Turn] = []
+        self._lock = threading.Lock()
+        self._summarizing: Optional[Future] = None
+        self._running = False  # a background summary task is active (guarded by _lock)
+        self._generation = 0  # bumped by clear() so a late summary of old turns is discarded
+
+    # ------------------------------------------------------------------
+    # Transcript
+    # ------------------------------------------------------------------
+
+    def add_message(self, role: str, content: str) -> None:
+        """Append a message to the displayed transcript, formatting its markdown once."""
+        if role == "user":
+            markdown = f"**You:** {content}"
+        else:
+            # Convert line breaks to markdown paragraphs
+            markdown = "**AI:** " + content.replace("\n", "  \n\n")
+        self.transcript.append({"role": role, "content": content, "markdown": markdown})
+        self.total_messages += 1
+
+    @property
+    def hidden_messages(self) -> int:
+        """Messages that fell out of the transcript."""
+        return self.total_messages - len(self.transcript)
+
+    # ------------------------------------------------------------------
+    # Memory
+    # ------------------------------------------------------------------
+
+    def record(self, question: str, answer: str) -> None:
+        """Add a finished turn; turns leaving the window are summarised in the background."""
+        with self._lock:
+            self.turns.append(Turn(question, answer))
+            while len(self.turns) > self.window_turns:
+                self._evicted.append(self.turns.popleft())
+            if not self._evicted:
+                return
+            if self.llm is None:
+                self._evicted.clear()
+                return
+            if not self._running:
+                self._running = True
+                self._summarizing = _summary_pool.submit(in_current_context(self._summarize))
+
+    def _summarize(self) -> None:
+        """Background task: fold evicted turns into the summary until none are left."""
+        while True:
+            with self._lock:
+                evicted, self._evicted = self._evicted, []
+                summary, generation = self.summary, self._generation
+                if not evicted:
+                    self._running = False
+                    return
+            if not self._summarize_batch(summary, evicted, generation):
+                return
+
+    def _summarize_batch(self, summary: str, evicted: List[Turn], generation: int) -> bool:
+        max_words = max(20, int(self.summary_tokens * 0.7))
+        with get_tracer().span("qa.summarize", turns=len(evicted)) as span:
+            try:
+                result = self.llm.invoke(SUMMARY_PROMPT.format(
+                    summary=summary or "(none)", turns=self._format_turns(evicted), max_words=max_words,
+                ))
+                updated = _content(result)
+            except Exception as exc:  # noqa: BLE001 - keep the turns for the next attempt
+                span.set(error=str(exc))
+                with self._lock:
+                    # Retried after the next turn; bound the backlog if the model keeps failing.
+                    if generation == self._generation:
+                        self._evicted = (evicted + self._evicted)[-2 * self.window_turns:]
+                    self._running = False
+                return False
+            if count_tokens(updated) > self.summary_tokens:
+                updated = leading_sentences(updated, self.summary_tokens) or updated[:4 * self.summary_tokens]
+            span.set(summary_tokens=count_tokens(updated))
+        with self._lock:
+            if generation == self._generation:
+                self.summary = updated
+        return True
+
+    def wait(self, timeout: Optional[float] = None) -> None:
+        """Block until the running background summary task (if any) has finished."""
+        future = self._summarizing
+        if future is not None:
+            future.result(timeout=timeout)
+
+    def _format_turns(self, turns: List[Turn]) -> str:
+        lines = []
+        for turn in turns:
+            answer = turn.answer
+            if count_tokens(answer) > self.answer_tokens:
+                answer = leading_sentences(answer, self.answer_tokens) or answer[:4 * self.answer_tokens]
+            lines.append(f"User: {turn.question}\nAssistant: {answer}")
+        return "\n".join(lines)
+
+    def history_text(self) -> str:
+        """Summary and recent turns, bounded by ``summary_tokens`` and ``window_turns``."""
+        with self._lock:
+            summary, turns = self.summary, list(self.turns)
+        parts = []
+        if summary:
+            parts.append(f"Summary of earlier conversation:\n{summary}")
+        if turns:
+            parts.append(f"Recent conversation:\n{self._format_turns(turns)}")
+        return "\n\n".join(parts)
+
+    def condense(self, question: str) -> str:
+        """Rewrite ``question`` as a standalone query; returned unchanged when there is no history.
+
+        Uses the summary and window as they are now; turns still being
+        summarised in the background are not waited for.
+        """
+        if self.llm is None or not (self.turns or self.summary):
+            return question
+        with get_tracer().span("qa.condense", turns=len(self.turns)) as span:
+            try:
+                standalone = _content(self.llm.invoke(
+                    CONDENSE_PROMPT.format(history=self.history_text(), question=question)
+                ))
+            except Exception as exc:  # noqa: BLE001 - fall back to the question as asked
+                span.set(error=str(exc))
+                return question
+            # Guard against chatty replies; a rewrite should stay question-sized.
+            if not standalone or count_tokens(standalone) > 4 * count_tokens(question) + 64:
+                standalone = question
+            span.set(rewritten=standalone != question)
+        return standalone
+
+    def clear(self) -> None:
+        with self._lock:
+            self.summary = ""
+            self.turns.clear()
+            self.transcript.clear()
+            self._evicted.clear()
+            self.total_messages = 0
+            self._generation += 1
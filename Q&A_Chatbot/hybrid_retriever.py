@@ -0,0 +1,152 @@
+"""Hybrid dense + BM25 retrieval with reciprocal-rank fusion and reranking.
+
+:class:`HybridRetriever` runs the vector search and the :class:`BM25Index`
+keyword search concurrently, merges the two ranked lists with
+reciprocal-rank fusion (RRF) and, when a :class:`CrossEncoderReranker` is
+configured, reorders the head of the fused list with a small CPU
+cross-encoder. The reranker works under a latency budget: it scores
+candidates in batches and stops once the next batch would not fit, leaving
+the remaining candidates in fused order.
+"""
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Sequence
+
+from langchain.callbacks.manager import AsyncCallbackManagerForRetrieverRun, CallbackManagerForRetrieverRun
+from langchain.schema import BaseRetriever, Document
+
+from bm25_index import BM25Index, document_key
+
+import common_path  # noqa: F401
+from tracing import get_tracer, in_current_context
+
+DEFAULT_RERANKER_MODEL = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+
+_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="hybrid-search")
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[Document]], rrf_k: int = 60,
+                           weights: Optional[Sequence[float]] = None) -> List[Document]:
+    """Merge ranked lists; a chunk scores ``sum(weight / (rrf_k + rank))`` over the lists it appears in."""
+    weights = weights or [1.0] * len(rankings)
+    scores: Dict[str, float] = {}
+    docs: Dict[str, Document] = {}
+    for ranking, weight in zip(rankings, weights):
+        for rank, doc in enumerate(ranking, start=1):
+            key = document_key(doc)
+            docs.setdefault(key, doc)
+            scores[key] = scores.get(key, 0.0) + weight / (rrf_k + rank)
+    return [docs[key] for key in sorted(scores, key=scores.get, reverse=True)]
+
+
+class CrossEncoderReranker:
+    """Score ``(query, chunk)`` pairs with a sentence-transformers cross-encoder.
+
+    Parameters
+    ----------
+    model_name : str
+        Hugging Face id of the cross-encoder; the MiniLM default runs on CPU.
+    budget : float
+        Seconds one :meth:`rerank` call may spend scoring.
+    batch_size : int
+        Pairs scored per model call; the budget is checked between batches.
+    """
+
+    def __init__(self, model_name: str = DEFAULT_RERANKER_MODEL, budget: float = 0.3, batch_size: int = 8):
+        self.model_name = model_name
+        self.budget = budget
+        self.batch_size = batch_size
+        self._model = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        """Load the model now instead of on the first query."""
+        with self._lock:
+            if self._model is None:
+                from sentence_transformers import CrossEncoder
+
+                self._model = CrossEncoder(self.model_name, device="cpu")
+        return self._model
+
+    def rerank(self, query: str, docs: List[Document], budget: Optional[float] = None) -> List[Document]:
+        """Return ``docs`` reordered by relevance; unscored tail keeps its order."""
+        budget = self.budget if budget is None else budget
+        model = self.load()
+        scores: List[float] = []
+        started = time.perf_counter()
+        batch_seconds = 0.0
+        with get_tracer().span("qa.rerank", candidates=len(docs), budget_ms=round(budget * 1000)) as span:
+            for start in range(0, len(docs), self.batch_size):
+                if time.perf_counter() - started + batch_seconds > budget:
+                    break
+                batch = docs[start:start + self.batch_size]
+                batch_started = time.perf_counter()
+                scores.extend(float(s) for s in model.predict([(query, doc.page_content) for doc in batch]))
+                batch_seconds = time.perf_counter() - batch_started
+            span.set(scored=len(scores))
+        order = sorted(range(len(scores)), key=scores.__getitem__, reverse=True)
+        return [docs[i] for i in order] + docs[len(scores):]
+
+
+class HybridRetriever(BaseRetriever):
+    """Fuse dense vector search with BM25 keyword search.
+
+    ``fetch_k`` candidates come from each side; after fusion the top
+    ``rerank_candidates`` go through the reranker (if any), the rest of the
+    fused list follows in fused order, and the best ``k`` are returned.
+    ``dense_search_type`` is ``"similarity"`` or ``"mmr"``; ``filter``
+    restricts both sides by metadata (e.g. to a set of source documents).
+    """
+
+    vectorstore: Any
+    keyword_index: BM25Index
+    k: int = 4
+    fetch_k: int = 20
+    rrf_k: int = 60
+    dense_search_type: str = "similarity"
+    reranker: Optional[CrossEncoderReranker] = None
+    rerank_candidates: int = 16
+    filter: Optional[Dict[str, Any]] = None
+
+    class Config:
+        arbitrary_types_allowed = True
+
+    def _dense(self, query: str) -> List[Document]:
+        with get_tracer().span("qa.dense_search", search_type=self.dense_search_type) as span:
+            if self.dense_search_type == "mmr":
+                docs = self.vectorstore.max_marginal_relevance_search(query, k=self.fetch_k,
+                                                                      fetch_k=2 * self.fetch_k, filter=self.filter)
+            else:
+                docs = self.vectorstore.similarity_search(query, k=self.fetch_k, filter=self.filter)
+            span.set(results=len(docs))
+        return docs
+
+    def _sparse(self, query: str) -> List[Document]:
+        with get_tracer().span("qa.keyword_search") as span:
+            docs = self.keyword_index.search(query, k=self.fetch_k, filter=self.filter)
+            span.set(results=len(docs))
+        return docs
+
+    def _finish(self, query: str, dense: List[Document], sparse: List[Document]) -> List[Document]:
+        fused = reciprocal_rank_fusion([dense, sparse], rrf_k=self.rrf_k)
+        if self.reranker is not None:
+            head = self.reranker.rerank(query, fused[:self.rerank_candidates])
+            fused = head + fused[self.rerank_candidates:]
+        return fused[:self.k]
+
+    def _get_relevant_documents(self, query: str, *,
+                                run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        dense = _pool.submit(in_current_context(self._dense), query)
+        sparse = self._sparse(query)
+        return self._finish(query, dense.result(), sparse)
+
+    async def _aget_relevant_documents(self, query: str, *,
+                                       run_manager: AsyncCallbackManagerForRetrieverRun) -> List[Document]:
+        dense, sparse = await asyncio.gather(
+            asyncio.to_thread(self._dense, query), asyncio.to_thread(self._sparse, query)
+        )
+        return await asyncio.to_thread(self._finish, query, dense, sparse)
@@ -0,0 +1,270 @@
+"""Streaming PDF ingestion pipeline for the Document Q&A Chatbot.
+
+Pages flow through four stages without ever materialising the whole
+document::
+
+    extract (process pool) -> chunk -> embed (fixed-size batches) -> upsert
+
+Page text is extracted in worker processes a few pages at a time, with a
+bounded number of tasks in flight, so peak memory depends on the batch size
+rather than on the length of the PDF. Every chunk carries the page it came
+from in ``metadata["page"]`` for source citations.
+
+Chunks are identified by a content hash (:func:`bm25_index.document_key`),
+so writes are idempotent upserts. Given the ids a document produced last
+time, :func:`ingest_pdf` embeds and upserts only the chunks that are new;
+the caller deletes the ids that no longer occur (see
+``qa_pipeline.ingest_document``).
+"""
+from __future__ import annotations
+
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from itertools import islice
+from typing import AbstractSet, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import pdfplumber
+from langchain.schema import Document
+from langchain.schema.embeddings import Embeddings
+from langchain.text_splitter import RecursiveCharacterTextSplitter, TextSplitter
+
+from bm25_index import document_key
+
+import common_path  # noqa: F401
+from tracing import get_tracer
+
+Upserter = Callable[[List[Document], List[List[float]]], None]
+Deleter = Callable[[List[str]], None]
+
+
+@dataclass
+class IndexWriter:
+    """Upsert and delete-by-id callables for one vector index namespace."""
+
+    upsert: Upserter
+    delete: Deleter
+
+
+@dataclass
+class IngestStats:
+    """Counters and cumulative seconds spent in each pipeline stage.
+
+    ``chunks`` counts every distinct chunk of the document, ``skipped`` the
+    ones that were already indexed; ``chunk_ids`` lists all of them.
+    """
+
+    pages: int = 0
+    chunks: int = 0
+    skipped: int = 0
+    chunk_ids: List[str] = field(default_factory=list)
+    seconds: Dict[str, float] = field(
+        default_factory=lambda: {"extract": 0.0, "chunk": 0.0, "embed": 0.0, "upsert": 0.0}
+    )
+    wall_seconds: float = 0.0
+
+    def throughput(self) -> Dict[str, float]:
+        """Items per second for each stage and for the pipeline as a whole."""
+
+        def rate(count: int, seconds: float) -> float:
+            return count / seconds if seconds else 0.0
+
+        return {
+            "extract_pages_per_sec": rate(self.pages, self.seconds["extract"]),
+            "chunk_chunks_per_sec": rate(self.chunks, self.seconds["chunk"]),
+            "embed_chunks_per_sec": rate(self.chunks - self.skipped, self.seconds["embed"]),
+            "upsert_chunks_per_sec": rate(self.chunks - self.skipped, self.seconds["upsert"]),
+            "pages_per_sec": rate(self.pages, self.wall_seconds),
+            "chunks_per_sec": rate(self.chunks, self.wall_seconds),
+        }
+
+
+def default_splitter() -> TextSplitter:
+    # start_index lets context packing merge neighbouring chunks back together.
+    return RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=50, add_start_index=True)
+
+
+def _extract_pages(path: str, start: int, stop: int) -> List[Tuple[int, str]]:
+    """Worker: return ``(page_number, text)`` for pages ``[start, stop)``."""
+    with pdfplumber.open(path) as pdf:
+        return [(page.page_number, page.extract_text() or "") for page in pdf.pages[start:stop]]
+
+
+def iter_pages(path: str, workers: Optional[int] = None,
+               pages_per_task: int = 8) -> Iterator[Tuple[int, str]]:
+    """Yield ``(page_number, text)`` in page order, extracting in a process pool."""
+    with pdfplumber.open(path) as pdf:
+        n_pages = len(pdf.pages)
+    workers = workers or os.cpu_count() or 1
+    tasks = iter([(path, start, min(start + pages_per_task, n_pages))
+                  for start in range(0, n_pages, pages_per_task)])
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # Keep only a couple of tasks per worker in flight to bound memory.
+        pending = deque(pool.submit(_extract_pages, *task) for task in islice(tasks, 2 * workers))
+        while pending:
+            pages = pending.popleft().result()
+            task = next(tasks, None)
+            if task is not None:
+                pending.append(pool.submit(_extract_pages, *task))
+            yield from pages
+
+
+def iter_chunks(pages: Iterable[Tuple[int, str]], splitter: TextSplitter,
+                source: Optional[str] = None,
+                stats: Optional[IngestStats] = None) -> Iterator[Document]:
+    """Split each page on its own so every chunk keeps its page number."""
+    for page_number, text in pages:
+        if not text.strip():
+            continue
+        start = time.perf_counter()
+        metadata = {"page": page_number}
+        if source:
+            metadata["source"] = source
+        chunks = splitter.create_documents([text], metadatas=[metadata])
+        if stats is not None:
+            stats.seconds["chunk"] += time.perf_counter() - start
+        yield from chunks
+
+
+def batched(iterable: Iterable, size: int) -> Iterator[list]:
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def _timed_pages(pages: Iterator[Tuple[int, str]], stats: IngestStats) -> Iterator[Tuple[int, str]]:
+    while True:
+        start = time.perf_counter()
+        page = next(pages, None)
+        stats.seconds["extract"] += time.perf_counter() - start
+        if page is None:
+            return
+        stats.pages += 1
+        yield page
+
+
+def ingest_pdf(
+    path: str,
+    embedding: Embeddings,
+    upsert: Upserter,
+    *,
+    source: Optional[str] = None,
+    splitter: Optional[TextSplitter] = None,
+    batch_size: int = 64,
+    workers: Optional[int] = None,
+    existing: AbstractSet[str] = frozenset(),
+    progress: Optional[Callable[[IngestStats], None]] = None,
+) -> IngestStats:
+    """Stream ``path`` through extraction, chunking, embedding and upsert.
+
+    ``upsert`` receives each batch of new chunks together with their vectors;
+    see :func:`local_upserter` and :func:`pinecone_upserter`. Chunks whose
+    id is in ``existing`` (or repeats within the document) are not embedded
+    again. ``progress`` is called with the running stats after every batch.
+    """
+    tracer = get_tracer()
+    stats = IngestStats()
+    started = time.perf_counter()
+    pages = _timed_pages(iter_pages(path, workers=workers), stats)
+    chunks = iter_chunks(pages, splitter or default_splitter(), source=source, stats=stats)
+
+    seen = set()
+    with tracer.span("qa.ingest", source=source or os.path.basename(path)) as root:
+        for batch in batched(chunks, batch_size):
+            fresh = []
+            for doc in batch:
+                chunk_id = document_key(doc)
+                if chunk_id in seen:
+                    continue
+                seen.add(chunk_id)
+                stats.chunk_ids.append(chunk_id)
+                stats.chunks += 1
+                if chunk_id in existing:
+                    stats.skipped += 1
+                else:
+                    fresh.append(doc)
+            batch = fresh
+            if not batch:
+                continue
+
+            start = time.perf_counter()
+            with tracer.span("qa.embed", chunks=len(batch)):
+                vectors = embedding.embed_documents([doc.page_content for doc in batch])
+            stats.seconds["embed"] += time.perf_counter() - start
+
+            start = time.perf_counter()
+            with tracer.span("qa.upsert", chunks=len(batch)):
+                upsert(batch, vectors)
+            stats.seconds["upsert"] += time.perf_counter() - start
+
+            if progress is not None:
+                progress(stats)
+
+        stats.wall_seconds = time.perf_counter() - started
+        # Extraction and chunking interleave with the batches, so report their totals here.
+        root.set(pages=stats.pages, chunks=stats.chunks, skipped=stats.skipped,
+                 extract_s=round(stats.seconds["extract"], 4), chunk_s=round(stats.seconds["chunk"], 4))
+    return stats
+
+
+# ---------------------------------------------------------------------------
+# Index writers
+# ---------------------------------------------------------------------------
+
+
+def local_upserter(store) -> Upserter:
+    """Write batches into a :class:`local_vectorstore.LocalVectorStore`."""
+
+    def _upsert(docs: List[Document], vectors: List[List[float]]) -> None:
+        store.add_embeddings(
+            [doc.page_content for doc in docs], vectors, metadatas=[doc.metadata for doc in docs],
+            ids=[document_key(doc) for doc in docs],
+        )
+
+    return _upsert
+
+
+def pinecone_upserter(index, text_key: str = "text", namespace: Optional[str] = None) -> Upserter:
+    """Write batches into a Pinecone index in the layout LangChain's wrapper reads."""
+
+    def _upsert(docs: List[Document], vectors: List[List[float]]) -> None:
+        index.upsert(vectors=[
+            {
+                "id": document_key(doc),
+                "values": list(vector),
+                "metadata": {**doc.metadata, text_key: doc.page_content},
+            }
+            for doc, vector in zip(docs, vectors)
+        ], namespace=namespace)
+
+    return _upsert
+
+
+def local_writer(store) -> IndexWriter:
+    return IndexWriter(upsert=local_upserter(store), delete=lambda ids: store.delete(ids))
+
+
+def pinecone_writer(index, namespace: Optional[str] = None, text_key: str = "text") -> IndexWriter:
+    def _delete(ids: List[str]) -> None:
+        # Pinecone accepts at most 1000 ids per delete request.
+        for batch in batched(ids, 1000):
+            index.delete(ids=batch, namespace=namespace)
+
+    return IndexWriter(upsert=pinecone_upserter(index, text_key=text_key, namespace=namespace), delete=_delete)
+
+
+def keyword_indexing(writer: IndexWriter, keyword_index) -> IndexWriter:
+    """Mirror every upsert and delete of ``writer`` into a :class:`bm25_index.BM25Index`."""
+
+    def _upsert(docs: List[Document], vectors: List[List[float]]) -> None:
+        writer.upsert(docs, vectors)
+        keyword_index.add_documents(docs)
+
+    def _delete(ids: List[str]) -> None:
+        writer.delete(ids)
+        keyword_index.delete(ids)
+
+    return IndexWriter(upsert=_upsert, delete=_delete)
@@ -0,0 +1,548 @@
+"""Local, persistent vector store for the Document Q&A Chatbot.
+
+Embeddings live in a contiguous float32 matrix inside a memory-mapped file,
+so the index survives restarts and only the pages touched by a search are
+paged in. Vectors are L2-normalised on insert, which turns cosine similarity
+into a plain dot product and lets NumPy score whole batches of queries in one
+matrix multiply.
+
+For large corpora an IVF (inverted file) coarse quantiser can be built with
+:meth:`LocalVectorStore.build_ivf_index`; searches then only score the
+``nprobe`` closest clusters instead of every stored chunk.
+
+Chunks are addressed by id: adding an id that is already stored replaces
+it, and :meth:`LocalVectorStore.delete` removes chunks. Both leave a
+tombstone on the old row, which searches skip; once tombstones make up
+``compact_ratio`` of the rows the files are rewritten without them.
+Searches accept a Pinecone-style metadata ``filter`` such as
+``{"source": {"$in": ["a.pdf", "b.pdf"]}}``.
+
+The class implements LangChain's ``VectorStore`` interface, so
+``as_retriever(search_type="mmr", ...)`` and ``RetrievalQA`` work unchanged.
+"""
+from __future__ import annotations
+
+import json
+import os
+import threading
+import uuid
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+from langchain.schema import Document
+from langchain.schema.embeddings import Embeddings
+from langchain.schema.vectorstore import VectorStore
+
+VECTORS_FILE = "vectors.f32"
+DOCSTORE_FILE = "docstore.jsonl"
+INDEX_FILE = "index.json"
+IVF_FILE = "ivf.npz"
+TOMBSTONES_FILE = "tombstones.npy"
+
+_MIN_CAPACITY = 1024
+_SCAN_BLOCK = 65536
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def metadata_matches(metadata: dict, filter: Optional[dict]) -> bool:
+    """Evaluate a Pinecone-style filter (equality, ``$eq``, ``$ne``, ``$in``, ``$nin``)."""
+    for key, condition in (filter or {}).items():
+        value = metadata.get(key)
+        if not isinstance(condition, dict):
+            condition = {"$eq": condition}
+        for op, operand in condition.items():
+            if op == "$eq":
+                ok = value == operand
+            elif op == "$ne":
+                ok = value != operand
+            elif op == "$in":
+                ok = value in operand
+            elif op == "$nin":
+                ok = value not in operand
+            else:
+                raise ValueError(f"Unsupported filter operator {op!r}")
+            if not ok:
+                return False
+    return True
+
+
+def _topk(scores: np.ndarray, k: int) -> np.ndarray:
+    """Return the indices of the ``k`` largest scores per row, best first."""
+    k = min(k, scores.shape[-1])
+    if k == 0:
+        return np.empty(scores.shape[:-1] + (0,), dtype=np.int64)
+    part = np.argpartition(-scores, k - 1, axis=-1)[..., :k]
+    order = np.argsort(-np.take_along_axis(scores, part, axis=-1), axis=-1)
+    return np.take_along_axis(part, order, axis=-1)
+
+
+class LocalVectorStore(VectorStore):
+    """Memory-mapped cosine-similarity vector store with optional IVF index.
+
+    Parameters
+    ----------
+    persist_directory : str | Path
+        Directory holding the vector matrix, the document store and the
+        optional IVF index. Created on first write.
+    embedding : Embeddings
+        Model used to embed documents and queries.
+    nprobe : int
+        Number of IVF clusters scanned per query once an index is built.
+    compact_ratio : float
+        Fraction of tombstoned rows that triggers :meth:`compact`.
+    """
+
+    def __init__(self, persist_directory: str | Path, embedding: Embeddings, nprobe: int = 8,
+                 compact_ratio: float = 0.3):
+        self.persist_directory = Path(persist_directory)
+        self.persist_directory.mkdir(parents=True, exist_ok=True)
+        self._embedding = embedding
+        self.nprobe = nprobe
+        self.compact_ratio = compact_ratio
+        self._lock = threading.RLock()
+
+        self._dim: Optional[int] = None
+        self._count = 0
+        self._vectors: Optional[np.memmap] = None
+        self._offsets: List[int] = []
+        self._ids: List[str] = []
+        self._rows: Dict[str, int] = {}
+        self._dead = np.zeros(0, dtype=bool)
+        # Per-row metadata, read from the docstore on the first filtered search.
+        self._metadata: Optional[List[dict]] = None
+
+        self._centroids: Optional[np.ndarray] = None
+        self._list_offsets: Optional[np.ndarray] = None
+        self._list_rows: Optional[np.ndarray] = None
+        self._ivf_count = 0
+
+        self._load()
+
+    # ------------------------------------------------------------------
+    # Persistence
+    # ------------------------------------------------------------------
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self._embedding
+
+    def __len__(self) -> int:
+        """Number of live (not deleted) chunks."""
+        return self._count - int(self._dead[:self._count].sum())
+
+    def _path(self, name: str) -> Path:
+        return self.persist_directory / name
+
+    def _load(self) -> None:
+        index_path = self._path(INDEX_FILE)
+        if not index_path.exists():
+            return
+        meta = json.loads(index_path.read_text())
+        self._dim = meta["dim"]
+        self._count = meta["count"]
+        capacity = os.path.getsize(self._path(VECTORS_FILE)) // (4 * self._dim)
+        self._vectors = np.memmap(
+            self._path(VECTORS_FILE), dtype=np.float32, mode="r+", shape=(capacity, self._dim)
+        )
+
+        offset = 0
+        with open(self._path(DOCSTORE_FILE), "rb") as fh:
+            for line in fh:
+                if len(self._offsets) == self._count:
+                    break
+                self._offsets.append(offset)
+                self._ids.append(json.loads(line)["id"])
+                offset += len(line)
+
+        self._dead = np.zeros(self._count, dtype=bool)
+        if self._path(TOMBSTONES_FILE).exists():
+            dead = np.load(self._path(TOMBSTONES_FILE))
+            self._dead[dead[dead < self._count]] = True
+        self._rows = {doc_id: row for row, doc_id in enumerate(self._ids) if not self._dead[row]}
+
+        if self._path(IVF_FILE).exists():
+            ivf = np.load(self._path(IVF_FILE))
+            self._centroids = ivf["centroids"]
+            self._list_offsets = ivf["list_offsets"]
+            self._list_rows = ivf["list_rows"]
+            self._ivf_count = int(ivf["count"])
+
+    def _write_meta(self) -> None:
+        tmp = self._path(INDEX_FILE + ".tmp")
+        tmp.write_text(json.dumps({"dim": self._dim, "count": self._count}))
+        os.replace(tmp, self._path(INDEX_FILE))
+
+    def _write_tombstones(self) -> None:
+        tmp = self._path(TOMBSTONES_FILE + ".tmp.npy")
+        np.save(tmp, np.flatnonzero(self._dead[:self._count]))
+        os.replace(tmp, self._path(TOMBSTONES_FILE))
+
+    def _ensure_capacity(self, needed: int, dim: int) -> None:
+        if self._dim is None:
+            self._dim = dim
+        elif dim != self._dim:
+            raise ValueError(f"Embedding dimension {dim} does not match index dimension {self._dim}")
+
+        capacity = 0 if self._vectors is None else self._vectors.shape[0]
+        if needed <= capacity:
+            return
+        new_capacity = max(_MIN_CAPACITY, capacity * 2, needed)
+        if self._vectors is not None:
+            self._vectors.flush()
+            del self._vectors
+        with open(self._path(VECTORS_FILE), "ab") as fh:
+            fh.truncate(new_capacity * self._dim * 4)
+        self._vectors = np.memmap(
+            self._path(VECTORS_FILE), dtype=np.float32, mode="r+", shape=(new_capacity, self._dim)
+        )
+
+    def _read_records(self, rows: Iterable[int]) -> List[dict]:
+        records = []
+        with open(self._path(DOCSTORE_FILE), "rb") as fh:
+            for row in rows:
+                fh.seek(self._offsets[row])
+                records.append(json.loads(fh.readline()))
+        return records
+
+    def _to_documents(self, rows: Iterable[int]) -> List[Document]:
+        return [
+            Document(page_content=rec["text"], metadata=rec.get("metadata") or {})
+            for rec in self._read_records(rows)
+        ]
+
+    def iter_documents(self, batch_size: int = 512) -> Iterator[List[Document]]:
+        """Yield every live chunk, ``batch_size`` rows at a time."""
+        for start in range(0, self._count, batch_size):
+            rows = [row for row in range(start, min(start + batch_size, self._count)) if not self._dead[row]]
+            if rows:
+                yield self._to_documents(rows)
+
+    def _row_metadata(self) -> List[dict]:
+        if self._metadata is None:
+            self._metadata = [rec.get("metadata") or {} for rec in self._read_records(range(self._count))]
+        return self._metadata
+
+    def _allowed_rows(self, filter: Optional[dict]) -> Optional[np.ndarray]:
+        """Boolean mask of rows a search may return, or ``None`` when every row may."""
+        dead = self._dead[:self._count]
+        if not filter:
+            return ~dead if dead.any() else None
+        matches = np.fromiter((metadata_matches(meta, filter) for meta in self._row_metadata()),
+                              dtype=bool, count=self._count)
+        return matches & ~dead
+
+    # ------------------------------------------------------------------
+    # Writes
+    # ------------------------------------------------------------------
+
+    def add_embeddings(
+        self,
+        texts: List[str],
+        embeddings: List[List[float]] | np.ndarray,
+        metadatas: Optional[List[dict]] = None,
+        ids: Optional[List[str]] = None,
+    ) -> List[str]:
+        """Store pre-computed embeddings, skipping the embedding model.
+
+        Ids that are already stored are replaced; an id repeated within the
+        batch keeps only its last occurrence.
+        """
+        texts = list(texts)
+        if not texts:
+            return []
+        vectors = _normalize(np.asarray(embeddings, dtype=np.float32).reshape(len(texts), -1))
+        metadatas = metadatas or [{} for _ in texts]
+        ids = list(ids) if ids else [uuid.uuid4().hex for _ in texts]
+        returned_ids = ids
+
+        last = {doc_id: i for i, doc_id in enumerate(ids)}
+        if len(last) < len(ids):
+            keep = sorted(last.values())
+            texts = [texts[i] for i in keep]
+            metadatas = [metadatas[i] for i in keep]
+            ids = [ids[i] for i in keep]
+            vectors = vectors[keep]
+
+        with self._lock:
+            replaced = [self._rows[doc_id] for doc_id in ids if doc_id in self._rows]
+            start = self._count
+            self._ensure_capacity(start + len(texts), vectors.shape[1])
+            self._vectors[start:start + len(texts)] = vectors
+            self._vectors.flush()
+
+            # Drop any records past ``count`` left behind by an interrupted write.
+            offset = self._offsets[-1] + len(self._read_line(start - 1)) if start else 0
+            with open(self._path(DOCSTORE_FILE), "ab") as fh:
+                fh.truncate(offset)
+                for doc_id, text, metadata in zip(ids, texts, metadatas):
+                    line = (json.dumps({"id": doc_id, "text": text, "metadata": metadata}) + "\n").encode()
+                    fh.write(line)
+                    self._offsets.append(offset)
+                    self._ids.append(doc_id)
+                    offset += len(line)
+
+            self._count += len(texts)
+            self._dead = np.concatenate([self._dead[:start], np.zeros(len(texts), dtype=bool)])
+            self._dead[replaced] = True
+            self._rows.update((doc_id, start + i) for i, doc_id in enumerate(ids))
+            if self._metadata is not None:
+                self._metadata.extend(metadatas)
+            self._write_meta()
+            if replaced:
+                self._write_tombstones()
+        return returned_ids
+
+    def delete(self, ids: Optional[List[str]] = None, **kwargs: Any) -> Optional[bool]:
+        """Tombstone the chunks with the given ids; unknown ids are ignored."""
+        with self._lock:
+            rows = [self._rows.pop(doc_id) for doc_id in ids or [] if doc_id in self._rows]
+            if not rows:
+                return False
+            self._dead[rows] = True
+            self._write_tombstones()
+            if self._dead.sum() > self.compact_ratio * self._count:
+                self.compact()
+        return True
+
+    def get_by_ids(self, ids: Iterable[str]) -> List[Document]:
+        with self._lock:
+            return self._to_documents([self._rows[doc_id] for doc_id in ids if doc_id in self._rows])
+
+    def compact(self) -> None:
+        """Rewrite the vectors and docstore without tombstoned rows.
+
+        An IVF index is rebuilt afterwards if one existed.
+        """
+        with self._lock:
+            live = np.flatnonzero(~self._dead[:self._count])
+            if len(live) == self._count:
+                return
+            had_ivf = self._centroids is not None
+            records = self._read_records(live.tolist())
+            vectors = np.asarray(self._vectors[live]) if len(live) else None
+
+            self._vectors.flush()
+            self._vectors = None
+            for name in (VECTORS_FILE, DOCSTORE_FILE, INDEX_FILE, TOMBSTONES_FILE, IVF_FILE):
+                if self._path(name).exists():
+                    os.replace(self._path(name), self._path(name + ".old"))
+            dim = self._dim
+            self._dim, self._count = None, 0
+            self._offsets, self._ids, self._rows = [], [], {}
+            self._dead = np.zeros(0, dtype=bool)
+            self._metadata = None
+            self._centroids = self._list_offsets = self._list_rows = None
+            self._ivf_count = 0
+
+            if len(live):
+                self.add_embeddings([rec["text"] for rec in records], vectors,
+                                    metadatas=[rec.get("metadata") or {} for rec in records],
+                                    ids=[rec["id"] for rec in records])
+            else:
+                self._dim = dim
+            for name in (VECTORS_FILE, DOCSTORE_FILE, INDEX_FILE, TOMBSTONES_FILE, IVF_FILE):
+                self._path(name + ".old").unlink(missing_ok=True)
+            if had_ivf:
+                self.build_ivf_index()
+
+    def _read_line(self, row: int) -> bytes:
+        with open(self._path(DOCSTORE_FILE), "rb") as fh:
+            fh.seek(self._offsets[row])
+            return fh.readline()
+
+    def add_texts(
+        self,
+        texts: Iterable[str],
+        metadatas: Optional[List[dict]] = None,
+        **kwargs: Any,
+    ) -> List[str]:
+        texts = list(texts)
+        embeddings = self._embedding.embed_documents(texts)
+        return self.add_embeddings(texts, embeddings, metadatas=metadatas, ids=kwargs.get("ids"))
+
+    @classmethod
+    def from_texts(
+        cls,
+        texts: List[str],
+        embedding: Embeddings,
+        metadatas: Optional[List[dict]] = None,
+        persist_directory: str | Path = "local_index",
+        **kwargs: Any,
+    ) -> "LocalVectorStore":
+        store = cls(persist_directory, embedding, nprobe=kwargs.pop("nprobe", 8))
+        store.add_texts(texts, metadatas=metadatas, **kwargs)
+        return store
+
+    # ------------------------------------------------------------------
+    # IVF index
+    # ------------------------------------------------------------------
+
+    def build_ivf_index(self, n_lists: Optional[int] = None, n_iter: int = 10,
+                        sample_size: int = 100_000, seed: int = 0) -> None:
+        """Cluster stored vectors with spherical k-means and persist an IVF index.
+
+        Vectors added after the build are kept in an exhaustively-scanned
+        tail until the index is rebuilt.
+        """
+        with self._lock:
+            n = self._count
+            if n == 0:
+                return
+            n_lists = n_lists or max(1, int(4 * np.sqrt(n)))
+            n_lists = min(n_lists, n)
+            rng = np.random.default_rng(seed)
+            sample_rows = np.sort(rng.choice(n, size=min(sample_size, n), replace=False))
+            sample = np.asarray(self._vectors[sample_rows])
+
+            centroids = sample[rng.choice(len(sample), size=n_lists, replace=False)].copy()
+            for _ in range(n_iter):
+                assign = np.argmax(sample @ centroids.T, axis=1)
+                sums = np.zeros_like(centroids)
+                np.add.at(sums, assign, sample)
+                empty = np.bincount(assign, minlength=n_lists) == 0
+                sums[empty] = centroids[empty]
+                centroids = _normalize(sums)
+
+            assignments = np.empty(n, dtype=np.int64)
+            for start in range(0, n, _SCAN_BLOCK):
+                block = np.asarray(self._vectors[start:min(start + _SCAN_BLOCK, n)])
+                assignments[start:start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+
+            list_rows = np.argsort(assignments, kind="stable")
+            list_offsets = np.zeros(n_lists + 1, dtype=np.int64)
+            np.cumsum(np.bincount(assignments, minlength=n_lists), out=list_offsets[1:])
+
+            np.savez(self._path(IVF_FILE), centroids=centroids, list_offsets=list_offsets,
+                     list_rows=list_rows, count=n)
+            self._centroids, self._list_offsets, self._list_rows, self._ivf_count = (
+                centroids, list_offsets, list_rows, n
+            )
+
+    def _candidate_rows(self, query: np.ndarray) -> np.ndarray:
+        probes = _topk(self._centroids @ query, self.nprobe)
+        rows = [self._list_rows[self._list_offsets[p]:self._list_offsets[p + 1]] for p in probes]
+        rows.append(np.arange(self._ivf_count, self._count))
+        return np.sort(np.concatenate(rows))
+
+    # ------------------------------------------------------------------
+    # Search
+    # ------------------------------------------------------------------
+
+    def _search_vectors(self, queries: np.ndarray, k: int,
+                        allowed: Optional[np.ndarray] = None) -> Tuple[List[np.ndarray], List[np.ndarray]]:
+        """Return ``(rows, scores)``: one array of at most ``k`` hits per normalised query.
+
+        Queries may get different numbers of hits (IVF probes lists of
+        different sizes). ``allowed`` is a boolean row mask (see
+        :meth:`_allowed_rows`).
+        """
+        n = self._count
+        if n == 0 or k <= 0:
+            return ([np.empty(0, dtype=np.int64) for _ in queries],
+                    [np.empty(0, dtype=np.float32) for _ in queries])
+        if allowed is not None:
+            k = min(k, int(allowed.sum()))
+
+        if self._centroids is not None:
+            all_rows, all_scores = [], []
+            for query in queries:
+                candidates = self._candidate_rows(query)
+                if allowed is not None:
+                    candidates = candidates[allowed[candidates]]
+                scores = np.asarray(self._vectors[candidates]) @ query
+                best = _topk(scores, k)
+                all_rows.append(candidates[best])
+                all_scores.append(scores[best])
+            return all_rows, all_scores
+
+        best_rows = np.empty((len(queries), 0), dtype=np.int64)
+        best_scores = np.empty((len(queries), 0), dtype=np.float32)
+        for start in range(0, n, _SCAN_BLOCK):
+            block = np.asarray(self._vectors[start:min(start + _SCAN_BLOCK, n)])
+            block_scores = queries @ block.T
+            if allowed is not None:
+                block_scores[:, ~allowed[start:start + len(block)]] = -np.inf
+            scores = np.concatenate([best_scores, block_scores], axis=1)
+            rows = np.concatenate(
+                [best_rows, np.broadcast_to(np.arange(start, start + len(block)), (len(queries), len(block)))],
+                axis=1,
+            )
+            keep = _topk(scores, k)
+            best_rows = np.take_along_axis(rows, keep, axis=1)
+            best_scores = np.take_along_axis(scores, keep, axis=1)
+        return list(best_rows), list(best_scores)
+
+    def similarity_search_by_vectors(
+        self, embeddings: List[List[float]] | np.ndarray, k: int = 4, filter: Optional[dict] = None
+    ) -> List[List[Tuple[Document, float]]]:
+        """Batched search: one result list per query embedding."""
+        queries = _normalize(np.atleast_2d(np.asarray(embeddings, dtype=np.float32)))
+        with self._lock:
+            rows, scores = self._search_vectors(queries, k, self._allowed_rows(filter))
+            return [
+                list(zip(self._to_documents(r.tolist()), s.tolist()))
+                for r, s in zip(rows, scores)
+            ]
+
+    def similarity_search_with_score(self, query: str, k: int = 4, filter: Optional[dict] = None,
+                                     **kwargs: Any) -> List[Tuple[Document, float]]:
+        return self.similarity_search_by_vectors([self._embedding.embed_query(query)], k=k, filter=filter)[0]
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4, filter: Optional[dict] = None,
+                                    **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_by_vectors([embedding], k=k, filter=filter)[0]]
+
+    def similarity_search(self, query: str, k: int = 4, filter: Optional[dict] = None,
+                          **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k=k, filter=filter)]
+
+    def _select_relevance_score_fn(self):
+        # Scores are cosine similarities in [-1, 1]; map them onto [0, 1].
+        return lambda score: (score + 1.0) / 2.0
+
+    def max_marginal_relevance_search_by_vector(
+        self,
+        embedding: List[float],
+        k: int = 4,
+        fetch_k: int = 20,
+        lambda_mult: float = 0.5,
+        filter: Optional[dict] = None,
+        **kwargs: Any,
+    ) -> List[Document]:
+        query = _normalize(np.asarray(embedding, dtype=np.float32)[None, :])
+        with self._lock:
+            rows, scores = self._search_vectors(query, max(fetch_k, k), self._allowed_rows(filter))
+            rows, relevance = rows[0], scores[0]
+            if len(rows) == 0:
+                return []
+            candidates = np.asarray(self._vectors[rows])
+            pairwise = candidates @ candidates.T
+
+            selected = [0]
+            max_sim = pairwise[0].copy()
+            while len(selected) < min(k, len(rows)):
+                mmr = lambda_mult * relevance - (1 - lambda_mult) * max_sim
+                mmr[selected] = -np.inf
+                choice = int(np.argmax(mmr))
+                selected.append(choice)
+                max_sim = np.maximum(max_sim, pairwise[choice])
+            return self._to_documents(rows[selected].tolist())
+
+    def max_marginal_relevance_search(
+        self,
+        query: str,
+        k: int = 4,
+        fetch_k: int = 20,
+        lambda_mult: float = 0.5,
+        **kwargs: Any,
+    ) -> List[Document]:
+        return self.max_marginal_relevance_search_by_vector(
+            self._embedding.embed_query(query), k=k, fetch_k=fetch_k, lambda_mult=lambda_mult, **kwargs
+        )
@@ -0,0 +1,80 @@
+"""Per-namespace manifest of ingested documents and their chunk ids.
+
+The manifest is what makes re-ingestion incremental: it remembers, for
+every source document in a namespace, the content hash of the file and the
+content-hash ids of the chunks it produced. Re-uploading an unchanged file
+is a no-op, a changed file only embeds and upserts chunks whose ids are new,
+and ids that disappeared are deleted from the vector and keyword indexes.
+"""
+from __future__ import annotations
+
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+
+class IngestManifest:
+    """SQLite record of ``source -> (file hash, chunk ids)`` for one namespace.
+
+    Parameters
+    ----------
+    path : str | Path
+        SQLite database file; created if missing.
+    """
+
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            "CREATE TABLE IF NOT EXISTS documents ("
+            " source TEXT PRIMARY KEY, doc_id TEXT NOT NULL, pages INTEGER NOT NULL,"
+            " chunks INTEGER NOT NULL, updated_at REAL NOT NULL);"
+            "CREATE TABLE IF NOT EXISTS chunks ("
+            " source TEXT NOT NULL, chunk_id TEXT NOT NULL, PRIMARY KEY (source, chunk_id)) WITHOUT ROWID;"
+        )
+        self._conn.commit()
+
+    def document(self, source: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT source, doc_id, pages, chunks, updated_at FROM documents WHERE source = ?", (source,)
+            ).fetchone()
+        return None if row is None else dict(zip(("source", "doc_id", "pages", "chunks", "updated_at"), row))
+
+    def documents(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT source, doc_id, pages, chunks, updated_at FROM documents ORDER BY source"
+            ).fetchall()
+        return [dict(zip(("source", "doc_id", "pages", "chunks", "updated_at"), row)) for row in rows]
+
+    def chunk_ids(self, source: str) -> Set[str]:
+        with self._lock:
+            return {row[0] for row in self._conn.execute("SELECT chunk_id FROM chunks WHERE source = ?", (source,))}
+
+    def record(self, source: str, doc_id: str, chunk_ids: Iterable[str], pages: int) -> None:
+        """Replace the entry for ``source`` with its current file hash and chunk ids."""
+        chunk_ids = set(chunk_ids)
+        with self._lock:
+            self._conn.execute("DELETE FROM chunks WHERE source = ?", (source,))
+            self._conn.executemany("INSERT INTO chunks VALUES (?, ?)", [(source, cid) for cid in chunk_ids])
+            self._conn.execute(
+                "INSERT OR REPLACE INTO documents VALUES (?, ?, ?, ?, ?)",
+                (source, doc_id, pages, len(chunk_ids), time.time()),
+            )
+            self._conn.commit()
+
+    def remove(self, source: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM chunks WHERE source = ?", (source,))
+            self._conn.execute("DELETE FROM documents WHERE source = ?", (source,))
+            self._conn.commit()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
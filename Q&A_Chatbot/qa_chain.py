@@ -0,0 +1,155 @@
+"""RetrievalQA chain construction, caching and per-query latency tracking."""
+from __future__ import annotations
+
+import json
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from langchain.callbacks.base import BaseCallbackHandler
+from langchain.chains import RetrievalQA
+from langchain.prompts import PromptTemplate
+
+from context_packing import PackedRetriever
+from hybrid_retriever import HybridRetriever
+
+QA_PROMPT = PromptTemplate(
+    template=(
+        "You are an expert assistant that helps answer questions based on the provided context.\n\n"
+        "Context:\n{context}\n\n"
+        "Question: {question}\n\n"
+        "Instructions:\n"
+        "1. Answer the question based on the context provided.\n"
+        "2. If the answer is not in the context, say \"I don't have enough information to answer this question.\"\n"
+        "3. Be concise but thorough in your response.\n"
+        "4. If relevant, include the source document name and page number in your answer.\n"
+        "5. Format your answer in clear, easy-to-read paragraphs.\n"
+        "6. Use bullet points or numbered lists when appropriate.\n\n"
+        "Answer:"
+    ),
+    input_variables=["context", "question"],
+)
+
+
+def build_qa_chain(vectorstore, llm, search_type: str = "mmr", k: int = 5, keyword_index=None, reranker=None,
+                   context_tokens: Optional[int] = None, compress: bool = False,
+                   **search_kwargs: Any) -> RetrievalQA:
+    """RetrievalQA over ``vectorstore``; hybrid dense + BM25 retrieval when ``keyword_index`` is given.
+
+    In hybrid mode ``search_type`` selects the dense side and ``search_kwargs``
+    are passed to :class:`HybridRetriever` (e.g. ``fetch_k``). With
+    ``context_tokens`` the ``k`` retrieved chunks are deduplicated, merged and
+    packed into that many prompt tokens (see :mod:`context_packing`).
+    """
+    if keyword_index is not None:
+        retriever = HybridRetriever(vectorstore=vectorstore, keyword_index=keyword_index, k=k,
+                                    dense_search_type=search_type, reranker=reranker, **search_kwargs)
+    else:
+        retriever = vectorstore.as_retriever(search_type=search_type, search_kwargs={"k": k, **search_kwargs})
+    if context_tokens:
+        retriever = PackedRetriever(retriever=retriever, max_tokens=context_tokens, compress=compress)
+    return RetrievalQA.from_chain_type(
+        llm=llm,
+        chain_type="stuff",
+        retriever=retriever,
+        return_source_documents=True,
+        chain_type_kwargs={"prompt": QA_PROMPT},
+    )
+
+
+def _ordered_pages(pages) -> list:
+    return sorted(p for p in pages if isinstance(p, int)) + sorted(str(p) for p in pages if not isinstance(p, int))
+
+
+def format_sources(source_documents) -> str:
+    """Return a ``Sources: Page 3, Page 7`` footer for the given documents, or ``""``.
+
+    When the documents come from several files the pages are grouped by
+    file: ``Sources: a.pdf (Page 3), b.pdf (Page 1, Page 4)``.
+    """
+    by_source: Dict[str, set] = {}
+    for doc in source_documents or []:
+        page = doc.metadata.get("page", "N/A")
+        if isinstance(page, float) and page.is_integer():
+            page = int(page)
+        by_source.setdefault(doc.metadata.get("source", ""), set()).add(page)
+    if not by_source:
+        return ""
+    if len(by_source) == 1:
+        pages = next(iter(by_source.values()))
+        return "\n\nSources: " + ", ".join(f"Page {page}" for page in _ordered_pages(pages))
+    return "\n\nSources: " + ", ".join(
+        f"{source or 'unknown'} ({', '.join(f'Page {page}' for page in _ordered_pages(pages))})"
+        for source, pages in sorted(by_source.items())
+    )
+
+
+class ChainCache:
+    """Build each RetrievalQA chain once per (vectorstore, llm, keyword index, reranker, retriever parameters).
+
+    Chains search their stores live, so adding or deleting documents needs no
+    invalidation; a different store, model or parameter set gets its own chain.
+    """
+
+    def __init__(self):
+        self._chains: Dict[Tuple, Tuple[Any, Any, Any, Any, RetrievalQA]] = {}
+
+    def get(self, vectorstore, llm, search_type: str = "mmr", k: int = 5, keyword_index=None, reranker=None,
+            context_tokens: Optional[int] = None, compress: bool = False, **search_kwargs: Any) -> RetrievalQA:
+        params = json.dumps(search_kwargs, sort_keys=True, default=str)
+        key = (id(vectorstore), id(llm), id(keyword_index), id(reranker), search_type, k, context_tokens, compress,
+               params)
+        entry = self._chains.get(key)
+        # Guard against a recycled id() after the original object was collected.
+        if entry is None or any(a is not b for a, b in zip(entry, (vectorstore, llm, keyword_index, reranker))):
+            chain = build_qa_chain(vectorstore, llm, search_type=search_type, k=k, keyword_index=keyword_index,
+                                   reranker=reranker, context_tokens=context_tokens, compress=compress,
+                                   **search_kwargs)
+            entry = self._chains[key] = (vectorstore, llm, keyword_index, reranker, chain)
+        return entry[4]
+
+    def __len__(self) -> int:
+        return len(self._chains)
+
+
+class LatencyTracker(BaseCallbackHandler):
+    """Callback handler that splits one chain run into retrieval, prompt and LLM time.
+
+    Pass a fresh instance per query via ``chain.invoke(..., config={"callbacks": [tracker]})``
+    and read :meth:`timings` afterwards.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.marks: Dict[str, float] = {}
+
+    def _mark(self, name: str) -> None:
+        self.marks.setdefault(name, time.perf_counter())
+
+    def on_retriever_start(self, serialized, query, **kwargs: Any) -> None:
+        self._mark("retriever_start")
+
+    def on_retriever_end(self, documents, **kwargs: Any) -> None:
+        self._mark("retriever_end")
+
+    def on_llm_start(self, serialized, prompts, **kwargs: Any) -> None:
+        self._mark("llm_start")
+
+    def on_chat_model_start(self, serialized, messages, **kwargs: Any) -> None:
+        self._mark("llm_start")
+
+    def on_llm_end(self, response, **kwargs: Any) -> None:
+        self._mark("llm_end")
+
+    def _span(self, start: str, end: str) -> Optional[float]:
+        if start in self.marks and end in self.marks:
+            return self.marks[end] - self.marks[start]
+        return None
+
+    def timings(self) -> Dict[str, Optional[float]]:
+        """Seconds spent in each stage; ``None`` for stages that did not run."""
+        return {
+            "retrieval": self._span("retriever_start", "retriever_end"),
+            "prompt": self._span("retriever_end", "llm_start"),
+            "llm": self._span("llm_start", "llm_end"),
+            "total": self.marks.get("llm_end", time.perf_counter()) - self.started,
+        }
@@ -0,0 +1,366 @@
+"""Streamlit-free entry points for the Document Q&A Chatbot.
+
+Everything the app does per interaction -- building the embedding model,
+LLM and vector index, ingesting a PDF and answering a question -- lives
+here so that ``app.py`` and the headless ``cli.py`` share one code path.
+Settings come from the environment (see :meth:`Settings.from_env`).
+
+Documents live in namespaces (one per user or collection). Each namespace
+has its own vectors (a Pinecone namespace or a local index directory), BM25
+index and :class:`manifest.IngestManifest`, so re-ingesting a document only
+touches the chunks that changed and documents can be deleted.
+"""
+from __future__ import annotations
+
+import hashlib
+import os
+import re
+import time
+from dataclasses import dataclass, replace
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+import numpy as np
+
+from langchain.embeddings import HuggingFaceEmbeddings
+from langchain.schema.embeddings import Embeddings
+
+from bm25_index import BM25Index
+from conversation import ConversationMemory
+from embedding_cache import CachedEmbeddings, EmbeddingCache
+from hybrid_retriever import DEFAULT_RERANKER_MODEL, CrossEncoderReranker
+from ingest import IndexWriter, IngestStats, ingest_pdf, keyword_indexing, local_writer, pinecone_writer
+from local_vectorstore import LocalVectorStore
+from manifest import IngestManifest
+from qa_chain import ChainCache, LatencyTracker, build_qa_chain, format_sources
+from semantic_cache import CachedAnswer, SemanticAnswerCache
+
+import common_path  # noqa: F401
+from chat_model import PooledChatModel
+from llm_client import LLMSettings, get_client
+from tracing import TracingCallbackHandler, get_tracer
+
+EMBEDDING_DIMENSION = 384  # all-MiniLM-L6-v2
+
+_NAMESPACE = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_.-]{0,63}$")
+
+
+@dataclass
+class Settings:
+    groq_api_key: Optional[str] = None
+    pinecone_api_key: Optional[str] = None
+    # "pinecone" or "local" for the on-disk memory-mapped index
+    vector_backend: str = "pinecone"
+    local_index_dir: str = "local_index"
+    embedding_cache_path: str = ".cache/embeddings.sqlite"
+    embedding_model_name: str = "sentence-transformers/all-MiniLM-L6-v2"
+    llm_model_name: str = "llama3-8b-8192"
+    pinecone_index_name: str = "doc-qa-index"
+    # Per-user or per-collection partition of the index
+    namespace: str = "default"
+    # Manifests and BM25 indexes of Pinecone namespaces (local namespaces keep them next to the vectors)
+    pinecone_state_dir: str = ".cache/pinecone"
+    # "hybrid" (dense + BM25 with rank fusion) or "dense"
+    retrieval_mode: str = "hybrid"
+    # Chunks retrieved per question; context packing then keeps what fits in context_max_tokens
+    retrieval_k: int = 8
+    retrieval_fetch_k: int = 20
+    context_max_tokens: int = 800
+    context_compress: bool = False
+    # Conversation memory: recent turns kept verbatim, older ones summarised
+    memory_window_turns: int = 4
+    memory_summary_tokens: int = 256
+    condense_questions: bool = True
+    rerank: bool = False
+    reranker_model_name: str = DEFAULT_RERANKER_MODEL
+    rerank_budget_ms: int = 300
+
+    @classmethod
+    def from_env(cls) -> "Settings":
+        return cls(
+            groq_api_key=os.getenv("GROQ_API_KEY"),
+            pinecone_api_key=os.getenv("PINECONE_API_KEY"),
+            vector_backend=os.getenv("VECTOR_BACKEND", "pinecone").lower(),
+            local_index_dir=os.getenv("LOCAL_INDEX_DIR", "local_index"),
+            embedding_cache_path=os.getenv("EMBEDDING_CACHE_PATH", ".cache/embeddings.sqlite"),
+            llm_model_name=os.getenv("LLM_MODEL", "llama3-8b-8192"),
+            namespace=os.getenv("INDEX_NAMESPACE", "default"),
+            pinecone_state_dir=os.getenv("PINECONE_STATE_DIR", ".cache/pinecone"),
+            retrieval_mode=os.getenv("RETRIEVAL_MODE", "hybrid").lower(),
+            retrieval_k=int(os.getenv("RETRIEVAL_K", "8")),
+            retrieval_fetch_k=int(os.getenv("RETRIEVAL_FETCH_K", "20")),
+            context_max_tokens=int(os.getenv("CONTEXT_MAX_TOKENS", "800")),
+            context_compress=os.getenv("CONTEXT_COMPRESS", "0").lower() in ("1", "true", "yes"),
+            memory_window_turns=int(os.getenv("MEMORY_WINDOW_TURNS", "4")),
+            memory_summary_tokens=int(os.getenv("MEMORY_SUMMARY_TOKENS", "256")),
+            condense_questions=os.getenv("CONDENSE_QUESTIONS", "1").lower() in ("1", "true", "yes"),
+            rerank=os.getenv("RERANK", "0").lower() in ("1", "true", "yes"),
+            reranker_model_name=os.getenv("RERANKER_MODEL", DEFAULT_RERANKER_MODEL),
+            rerank_budget_ms=int(os.getenv("RERANK_BUDGET_MS", "300")),
+        )
+
+    def for_namespace(self, namespace: str) -> "Settings":
+        return replace(self, namespace=namespace)
+
+    @property
+    def namespace_dir(self) -> Path:
+        """Directory holding this namespace's local index, BM25 index and manifest."""
+        if not _NAMESPACE.match(self.namespace):
+            raise ValueError(f"Invalid namespace {self.namespace!r}: use letters, digits, '_', '-' and '.'")
+        if self.vector_backend == "local":
+            return Path(self.local_index_dir) / self.namespace
+        return Path(self.pinecone_state_dir) / self.pinecone_index_name / self.namespace
+
+
+# ---------------------------------------------------------------------------
+# Resources
+# ---------------------------------------------------------------------------
+
+
+def make_embedding_model(settings: Settings) -> CachedEmbeddings:
+    """Sentence-transformer embeddings served through the on-disk embedding cache."""
+    return CachedEmbeddings(
+        HuggingFaceEmbeddings(model_name=settings.embedding_model_name),
+        EmbeddingCache(settings.embedding_cache_path),
+        model_name=settings.embedding_model_name,
+    )
+
+
+def make_answer_cache(embedding: Embeddings) -> SemanticAnswerCache:
+    return SemanticAnswerCache(embedding, threshold=0.92, ttl=24 * 3600, max_entries=2000)
+
+
+def make_llm(settings: Settings) -> PooledChatModel:
+    """Chat model on the shared, rate-limited LLM client (quotas from ``LLM_RPM``/``LLM_TPM``)."""
+    llm_settings = LLMSettings.from_env(settings.llm_model_name)
+    llm_settings = replace(llm_settings, api_key=settings.groq_api_key or llm_settings.api_key,
+                           model=settings.llm_model_name)
+    return PooledChatModel(
+        client=get_client(llm_settings),
+        temperature=0.2,
+        top_p=0.9,
+        max_tokens=1024,
+    )
+
+
+def make_memory(settings: Settings, llm: Optional[PooledChatModel] = None) -> ConversationMemory:
+    """Conversation memory whose condensing and summaries run on a deterministic copy of ``llm``."""
+    memory_llm = None
+    if settings.condense_questions:
+        base = llm or make_llm(settings)
+        memory_llm = PooledChatModel(client=base.client, temperature=0, max_tokens=settings.memory_summary_tokens)
+    return ConversationMemory(memory_llm, window_turns=settings.memory_window_turns,
+                              summary_tokens=settings.memory_summary_tokens)
+
+
+def init_pinecone(settings: Settings):
+    """Return ``(client, index_name)``, creating the serverless index on first use."""
+    from pinecone import Pinecone, ServerlessSpec
+
+    pc = Pinecone(api_key=settings.pinecone_api_key)
+    if settings.pinecone_index_name not in pc.list_indexes().names():
+        pc.create_index(
+            name=settings.pinecone_index_name,
+            dimension=EMBEDDING_DIMENSION,
+            metric="cosine",
+            spec=ServerlessSpec(cloud="aws", region="us-east-1"),
+        )
+    return pc, settings.pinecone_index_name
+
+
+def open_local_store(settings: Settings, embedding: Embeddings) -> LocalVectorStore:
+    return LocalVectorStore(settings.namespace_dir, embedding)
+
+
+def open_manifest(settings: Settings) -> IngestManifest:
+    return IngestManifest(settings.namespace_dir / "manifest.sqlite")
+
+
+def open_keyword_index(settings: Settings, local_store: Optional[LocalVectorStore] = None) -> Optional[BM25Index]:
+    """The namespace's BM25 index, or ``None`` when ``retrieval_mode`` is ``"dense"``.
+
+    A local vector index built before hybrid retrieval existed is indexed
+    once from its docstore.
+    """
+    if settings.retrieval_mode != "hybrid":
+        return None
+    index = BM25Index(settings.namespace_dir / "bm25.sqlite")
+    if local_store is not None and len(local_store) and not len(index):
+        for docs in local_store.iter_documents():
+            index.add_documents(docs)
+    return index
+
+
+def make_reranker(settings: Settings) -> Optional[CrossEncoderReranker]:
+    if not settings.rerank:
+        return None
+    return CrossEncoderReranker(settings.reranker_model_name, budget=settings.rerank_budget_ms / 1000)
+
+
+def open_index(settings: Settings, embedding: Embeddings, local_store: Optional[LocalVectorStore] = None,
+               pinecone_client: Optional[Tuple[Any, str]] = None,
+               keyword_index: Optional[BM25Index] = None) -> Tuple[Any, IndexWriter]:
+    """Return ``(vectorstore, writer)`` for the configured backend and namespace.
+
+    Already-open resources can be passed in (the app keeps them in
+    ``st.cache_resource``); otherwise they are created here. With a
+    ``keyword_index`` every upsert and delete is mirrored into it.
+    """
+    if settings.vector_backend == "local":
+        vectorstore = local_store if local_store is not None else open_local_store(settings, embedding)
+        writer = local_writer(vectorstore)
+    else:
+        from langchain_community.vectorstores import Pinecone as LangPinecone
+
+        pc, index_name = pinecone_client or init_pinecone(settings)
+        vectorstore = LangPinecone.from_existing_index(index_name=index_name, embedding=embedding,
+                                                       namespace=settings.namespace)
+        writer = pinecone_writer(pc.Index(index_name), namespace=settings.namespace)
+    if keyword_index is not None:
+        writer = keyword_indexing(writer, keyword_index)
+    return vectorstore, writer
+
+
+def build_chain(settings: Settings, vectorstore, llm, keyword_index: Optional[BM25Index] = None,
+                reranker: Optional[CrossEncoderReranker] = None, chain_cache: Optional[ChainCache] = None,
+                search_type: str = "mmr", sources: Optional[Iterable[str]] = None):
+    """QA chain with the retriever chosen by ``settings`` (hybrid when a keyword index is given).
+
+    ``sources`` restricts retrieval to those documents of the namespace.
+    Retrieved chunks are packed into ``settings.context_max_tokens`` (0 sends them as they are).
+    """
+    kwargs: Dict[str, Any] = {"search_type": search_type, "k": settings.retrieval_k,
+                              "keyword_index": keyword_index, "reranker": reranker,
+                              "context_tokens": settings.context_max_tokens or None,
+                              "compress": settings.context_compress}
+    if keyword_index is not None:
+        kwargs["fetch_k"] = settings.retrieval_fetch_k
+    if sources:
+        kwargs["filter"] = {"source": {"$in": sorted(sources)}}
+    if chain_cache is not None:
+        return chain_cache.get(vectorstore, llm, **kwargs)
+    return build_qa_chain(vectorstore, llm, **kwargs)
+
+
+def document_id(data: bytes) -> str:
+    """Content hash of a document file, recorded in the manifest."""
+    return hashlib.sha256(data).hexdigest()
+
+
+def collection_id(settings: Settings, manifest: IngestManifest, sources: Optional[Iterable[str]] = None) -> str:
+    """Semantic answer cache scope: the namespace and the current content of the searched documents.
+
+    Any ingest or delete changes the id, so stale answers are never served.
+    """
+    selected = set(sources or ())
+    docs = [doc for doc in manifest.documents() if not selected or doc["source"] in selected]
+    raw = "\0".join([settings.namespace] + [f"{doc['source']}={doc['doc_id']}" for doc in docs])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+# ---------------------------------------------------------------------------
+# Ingest and answer
+# ---------------------------------------------------------------------------
+
+
+def ingest_document(path: str, embedding: Embeddings, writer: IndexWriter,
+                    manifest: Optional[IngestManifest] = None, *, source: Optional[str] = None,
+                    workers: Optional[int] = None, force: bool = False,
+                    progress: Optional[Callable[[IngestStats], None]] = None) -> Dict[str, Any]:
+    """Ingest one PDF and return a JSON-serialisable report.
+
+    With a ``manifest`` the document is diffed against its previous version
+    under the same ``source`` name: an unchanged file is skipped (unless
+    ``force``), only new chunks are embedded and upserted, and chunks that
+    disappeared are deleted. ``status`` is ``new``, ``updated`` or
+    ``unchanged``.
+    """
+    source = source or os.path.basename(path)
+    with open(path, "rb") as fh:
+        doc_id = document_id(fh.read())
+    previous = manifest.document(source) if manifest is not None else None
+    report = {"source": source, "doc_id": doc_id}
+    if previous is not None and previous["doc_id"] == doc_id and not force:
+        return {**report, "status": "unchanged", "pages": previous["pages"], "chunks": previous["chunks"],
+                "added": 0, "deleted": 0, "wall_seconds": 0.0}
+
+    existing = manifest.chunk_ids(source) if manifest is not None else set()
+    stats = ingest_pdf(path, embedding, writer.upsert, source=source, workers=workers,
+                       existing=existing, progress=progress)
+    stale = sorted(existing - set(stats.chunk_ids))
+    if stale:
+        with get_tracer().span("qa.delete", chunks=len(stale)):
+            writer.delete(stale)
+    if manifest is not None:
+        manifest.record(source, doc_id, stats.chunk_ids, stats.pages)
+    return {
+        **report,
+        "status": "new" if previous is None else "updated",
+        "pages": stats.pages,
+        "chunks": stats.chunks,
+        "added": stats.chunks - stats.skipped,
+        "deleted": len(stale),
+        "wall_seconds": stats.wall_seconds,
+        "throughput": stats.throughput(),
+    }
+
+
+def delete_document(source: str, writer: IndexWriter, manifest: IngestManifest) -> int:
+    """Remove every chunk of ``source`` from the namespace; return how many were deleted."""
+    chunk_ids = sorted(manifest.chunk_ids(source))
+    if chunk_ids:
+        writer.delete(chunk_ids)
+    manifest.remove(source)
+    return len(chunk_ids)
+
+
+def run_chain(qa_chain, query: str) -> Tuple[str, Dict[str, Optional[float]]]:
+    """Answer ``query`` in one blocking call; return the answer with sources and stage timings."""
+    tracker = LatencyTracker()
+    result = qa_chain.invoke({"query": query}, config={"callbacks": [tracker, TracingCallbackHandler()]})
+    return result["result"] + format_sources(result.get("source_documents")), tracker.timings()
+
+
+def lookup_answer(answer_cache: SemanticAnswerCache, doc_id: Optional[str],
+                  query: str) -> Tuple[Optional[CachedAnswer], np.ndarray]:
+    """:meth:`SemanticAnswerCache.lookup`, recorded as a ``qa.answer_cache`` span."""
+    with get_tracer().span("qa.answer_cache") as span:
+        cached, vector = answer_cache.lookup(doc_id, query)
+        span.set(cache_hit=cached is not None)
+    return cached, vector
+
+
+def answer_question(qa_chain, query: str, answer_cache: Optional[SemanticAnswerCache] = None,
+                    doc_id: Optional[str] = None, memory: Optional[ConversationMemory] = None) -> Dict[str, Any]:
+    """Answer ``query``, consulting and filling the semantic answer cache when given.
+
+    With ``memory`` a follow-up question is first rewritten into a standalone
+    one, which is what the cache and the chain see; the turn is then recorded.
+    """
+    with get_tracer().span("qa.question") as root:
+        result: Dict[str, Any] = {"query": query}
+        standalone = query
+        if memory is not None:
+            started = time.perf_counter()
+            standalone = memory.condense(query)
+            condense_seconds = time.perf_counter() - started
+            if standalone != query:
+                result["standalone_query"] = standalone
+
+        vector = None
+        cached = None
+        if answer_cache is not None:
+            started = time.perf_counter()
+            cached, vector = lookup_answer(answer_cache, doc_id, standalone)
+            if cached is not None:
+                answer = cached.answer
+                timings = {"cache": time.perf_counter() - started}
+        if cached is None:
+            answer, timings = run_chain(qa_chain, standalone)
+            if answer_cache is not None:
+                answer_cache.store(doc_id, standalone, answer, latency=timings["total"], vector=vector)
+        if memory is not None:
+            timings["condense"] = condense_seconds
+            memory.record(query, answer)
+        return {**result, "answer": answer, "cached": cached is not None, "timings": timings,
+                "trace_id": root.trace_id}
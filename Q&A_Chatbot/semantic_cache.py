@@ -0,0 +1,121 @@
+"""Semantic answer cache for repeated questions about the same document.
+
+Questions are embedded and compared by cosine similarity with earlier
+questions asked against the same document; above ``threshold`` the stored
+answer is returned without retrieval or an LLM call. Entries expire after
+``ttl`` seconds, the least-recently-used ones are evicted beyond
+``max_entries``, and all entries of a document are dropped when it is
+re-processed.
+"""
+from __future__ import annotations
+
+import itertools
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+from langchain.schema.embeddings import Embeddings
+
+
+@dataclass
+class CachedAnswer:
+    question: str
+    answer: str
+    vector: np.ndarray
+    created: float
+    latency: float
+    similarity: float = 1.0
+
+
+class SemanticAnswerCache:
+    """Per-document cache of answers, looked up by question similarity.
+
+    Parameters
+    ----------
+    embedding : Embeddings
+        Model used to embed questions (``embed_query``).
+    threshold : float
+        Minimum cosine similarity for a hit.
+    ttl : float | None
+        Seconds an answer stays valid; ``None`` disables expiry.
+    max_entries : int
+        Total answers kept across all documents.
+    """
+
+    def __init__(self, embedding: Embeddings, threshold: float = 0.92,
+                 ttl: Optional[float] = 24 * 3600, max_entries: int = 2000):
+        self.embedding = embedding
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[str, int], CachedAnswer]" = OrderedDict()
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+        self.lookups = 0
+        self.hits = 0
+        self.seconds_saved = 0.0
+
+    def embed(self, question: str) -> np.ndarray:
+        vector = np.asarray(self.embedding.embed_query(question), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _expire(self, now: float) -> None:
+        if self.ttl is None:
+            return
+        for key in [k for k, e in self._entries.items() if now - e.created > self.ttl]:
+            del self._entries[key]
+
+    def lookup(self, doc_id: str, question: str) -> Tuple[Optional[CachedAnswer], np.ndarray]:
+        """Return ``(hit or None, question vector)``; pass the vector on to :meth:`store`."""
+        started = time.perf_counter()
+        vector = self.embed(question)
+        with self._lock:
+            self.lookups += 1
+            self._expire(time.time())
+            keys = [key for key in self._entries if key[0] == doc_id]
+            if not keys:
+                return None, vector
+            matrix = np.stack([self._entries[key].vector for key in keys])
+            scores = matrix @ vector
+            best = int(np.argmax(scores))
+            if scores[best] < self.threshold:
+                return None, vector
+
+            self._entries.move_to_end(keys[best])
+            entry = self._entries[keys[best]]
+            self.hits += 1
+            self.seconds_saved += max(0.0, entry.latency - (time.perf_counter() - started))
+            hit = CachedAnswer(entry.question, entry.answer, entry.vector, entry.created,
+                               entry.latency, similarity=float(scores[best]))
+            return hit, vector
+
+    def store(self, doc_id: str, question: str, answer: str, latency: float,
+              vector: Optional[np.ndarray] = None) -> None:
+        """Remember ``answer``; ``latency`` is what a later hit is credited as saving."""
+        if vector is None:
+            vector = self.embed(question)
+        with self._lock:
+            self._entries[(doc_id, next(self._ids))] = CachedAnswer(
+                question, answer, vector, time.time(), latency
+            )
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, doc_id: str) -> None:
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == doc_id]:
+                del self._entries[key]
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "lookups": self.lookups,
+                "hits": self.hits,
+                "hit_rate": self.hits / self.lookups if self.lookups else 0.0,
+                "seconds_saved": self.seconds_saved,
+            }
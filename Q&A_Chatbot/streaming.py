@@ -0,0 +1,161 @@
+"""Token-streaming answers for the Document Q&A Chatbot.
+
+Retrieval starts on a background event loop the moment a question is
+submitted, while Streamlit is still re-running the script; the answer is
+then streamed from the chat model token by token. Time-to-first-token is
+recorded next to the usual per-stage timings.
+"""
+from __future__ import annotations
+
+import asyncio
+import concurrent.futures
+import threading
+import time
+from typing import AsyncIterator, Dict, Iterator, List, Optional
+
+from langchain.prompts import PromptTemplate
+from langchain.schema import Document
+
+from qa_chain import QA_PROMPT
+
+import common_path  # noqa: F401
+from tracing import Span, TracingCallbackHandler, get_tracer
+
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_lock = threading.Lock()
+
+
+def background_loop() -> asyncio.AbstractEventLoop:
+    """Return the process-wide event loop used for async retrieval and streaming."""
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="qa-stream-loop", daemon=True).start()
+    return _loop
+
+
+class PendingAnswer:
+    """An answer whose retrieval is already running; iterate it to stream tokens.
+
+    Parameters
+    ----------
+    query : str
+        The user's question.
+    retriever : BaseRetriever
+        Retriever whose ``ainvoke`` is started immediately.
+    llm : BaseChatModel
+        Chat model whose ``astream`` produces the answer tokens.
+    prompt : PromptTemplate
+        Template with ``context`` and ``question`` variables.
+    root : Span, optional
+        Span of the whole question, left open by the caller and finished
+        together with the stream, so it covers every streamed token.
+    """
+
+    def __init__(self, query: str, retriever, llm, prompt: PromptTemplate = QA_PROMPT,
+                 root: Optional[Span] = None):
+        self.query = query
+        self.answer = ""
+        self.source_documents: List[Document] = []
+        self.timings: Dict[str, float] = {}
+        self._llm = llm
+        self._prompt = prompt
+        self._retriever = retriever
+        self._loop = background_loop()
+        # The coroutines run on the background loop's thread, so spans are
+        # parented explicitly rather than through the caller's context.
+        self._tracer = get_tracer()
+        self.root = root
+        self.span = self._tracer.start_span("qa.stream_answer", parent=root)
+        self._stream: Optional[AsyncIterator[str]] = None
+        # The in-flight ``__anext__`` of :meth:`__iter__`, cancelled before the stream is closed.
+        self._step: Optional[asyncio.Task] = None
+        self._cancelled = False
+        self._callbacks = [TracingCallbackHandler(self._tracer, parent=self.span)]
+        self._started = time.perf_counter()
+        self._retrieval = asyncio.run_coroutine_threadsafe(self._retrieve(), self._loop)
+
+    async def _retrieve(self) -> List[Document]:
+        docs = await self._retriever.ainvoke(self.query, config={"callbacks": self._callbacks})
+        self.timings["retrieval"] = time.perf_counter() - self._started
+        return docs
+
+    async def astream(self) -> AsyncIterator[str]:
+        try:
+            self.source_documents = await asyncio.wrap_future(self._retrieval)
+
+            prompt_start = time.perf_counter()
+            prompt_value = self._prompt.format_prompt(
+                context="\n\n".join(doc.page_content for doc in self.source_documents),
+                question=self.query,
+            )
+            llm_start = time.perf_counter()
+            self.timings["prompt"] = llm_start - prompt_start
+
+            async for chunk in self._llm.astream(prompt_value, config={"callbacks": self._callbacks}):
+                token = chunk.content if hasattr(chunk, "content") else str(chunk)
+                if "ttft" not in self.timings:
+                    self.timings["ttft"] = time.perf_counter() - self._started
+                self.answer += token
+                yield token
+        except Exception as exc:
+            self._finish(error=exc)
+            raise
+
+        finished = time.perf_counter()
+        self.timings["llm"] = finished - llm_start
+        self.timings["total"] = finished - self._started
+        self.span.set(ttft=self.timings.get("ttft"), sources=len(self.source_documents))
+        self._finish()
+
+    def cancel(self) -> None:
+        """Stop retrieval and streaming, keeping the tokens received so far in :attr:`answer`.
+
+        Safe to call from any thread, also while a token is being awaited.
+        """
+        self._cancelled = True
+        self._retrieval.cancel()
+        try:
+            asyncio.run_coroutine_threadsafe(self._aclose(), self._loop).result()
+        except RuntimeError:
+            pass  # the generator could not be closed; the spans are still finished below
+        finally:
+            self.timings["total"] = time.perf_counter() - self._started
+            self.span.set(answer_chars=len(self.answer))
+            self._finish(error="cancelled")
+
+    async def _next_token(self) -> str:
+        if self._cancelled:
+            raise StopAsyncIteration
+        self._step = asyncio.current_task()
+        try:
+            return await self._stream.__anext__()
+        finally:
+            self._step = None
+
+    async def _aclose(self) -> None:
+        # Runs on the loop, so no new step can start in between: stop the
+        # running one first, otherwise aclose() finds the generator busy.
+        step = self._step
+        if step is not None:
+            step.cancel()
+            await asyncio.gather(step, return_exceptions=True)
+        if self._stream is not None:
+            await self._stream.aclose()
+
+    def _finish(self, error: Optional[BaseException | str] = None) -> None:
+        if self.span.duration is not None:
+            return
+        self._tracer.finish(self.span, error=error)
+        if self.root is not None:
+            self._tracer.finish(self.root, error=error)
+
+    def __iter__(self) -> Iterator[str]:
+        """Drive :meth:`astream` from synchronous code such as a Streamlit script."""
+        self._stream = self.astream()
+        while True:
+            try:
+                yield asyncio.run_coroutine_threadsafe(self._next_token(), self._loop).result()
+            except (StopAsyncIteration, concurrent.futures.CancelledError):
+                return
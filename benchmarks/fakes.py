@@ -0,0 +1,371 @@
+"""Deterministic local stand-ins for the external services the apps call.
+
+* :class:`FakeChatServer` -- OpenAI-compatible ``/chat/completions`` endpoint
+  (plain JSON and SSE streaming) with configurable latency. Any path ending
+  in ``/chat/completions`` is accepted, so it serves the shared
+  ``common/llm_client.py`` (``base_url=<url>/v1``) as well as ``ChatGroq``
+  (``groq_api_base=<url>``, which posts to ``/openai/v1/chat/completions``).
+* :class:`FakeArxivServer` -- arXiv ``/api/query`` Atom feed with paging,
+  and optionally the same PDF for every ``/pdf/<id>`` link.
+* :class:`InMemoryPineconeIndex` -- the subset of the Pinecone ``Index``
+  data plane the Q&A upserter uses (``upsert``/``query``), kept in NumPy.
+* :class:`HashEmbeddings` -- hashed bag-of-words embeddings, so no model
+  download is needed and similar texts still get similar vectors.
+* :class:`FakeHFEngine` -- the ``submit`` interface of the math assistant's
+  ``HFLLM``, answering every ReAct step directly without loading weights.
+
+Replies depend only on the request, so repeated runs are comparable.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import socket
+import threading
+import time
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+from urllib.parse import parse_qs, urlparse
+from xml.sax.saxutils import escape
+
+import numpy as np
+from langchain.schema.embeddings import Embeddings
+
+WORDS = (
+    "model data training results method performance network learning analysis approach "
+    "system graph attention retrieval language evaluation benchmark latency throughput "
+    "optimization gradient sparse dense vector index query document context answer"
+).split()
+
+
+def _digest(text: str) -> int:
+    return int(hashlib.sha256(text.encode("utf-8")).hexdigest()[:16], 16)
+
+
+def deterministic_text(seed: str, n_words: int) -> str:
+    rng = np.random.default_rng(_digest(seed))
+    return " ".join(WORDS[i] for i in rng.integers(0, len(WORDS), n_words))
+
+
+class _Server:
+    """Run a ``ThreadingHTTPServer`` on a background thread (port 0 = any free port)."""
+
+    handler_class: type = BaseHTTPRequestHandler
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0):
+        handler = type("Handler", (self.handler_class,), {"fake": self})
+        self.httpd = ThreadingHTTPServer((host, port), handler)
+        self.httpd.daemon_threads = True
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _count(self) -> None:
+        with self._lock:
+            self.requests += 1
+
+    def start(self) -> "_Server":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def setup(self) -> None:
+        super().setup()
+        # Headers and body go out in separate writes; without this, Nagle plus
+        # the client's delayed ACK add ~40 ms to every response.
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def log_message(self, *args: Any) -> None:  # keep benchmark output clean
+        pass
+
+
+# ---------------------------------------------------------------------------
+# OpenAI-compatible chat completions
+# ---------------------------------------------------------------------------
+
+
+class _ChatHandler(_Handler):
+    def do_POST(self) -> None:
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self.send_error(404)
+            return
+        self.fake._count()
+        prompt = "\n".join(str(m.get("content", "")) for m in body.get("messages", []))
+        reply = self.fake.reply(prompt)
+        time.sleep(self.fake.latency)
+        if body.get("stream"):
+            self._stream(body, reply)
+        else:
+            self._json(body, prompt, reply)
+
+    def _json(self, body: Dict[str, Any], prompt: str, reply: str) -> None:
+        time.sleep(self.fake.token_delay * len(reply.split()))
+        payload = json.dumps({
+            "id": f"chatcmpl-{_digest(prompt) % 10**12}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "fake"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": reply},
+                "finish_reason": "stop",
+            }],
+            "usage": {
+                "prompt_tokens": len(prompt.split()),
+                "completion_tokens": len(reply.split()),
+                "total_tokens": len(prompt.split()) + len(reply.split()),
+            },
+        }).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _stream(self, body: Dict[str, Any], reply: str) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+        def event(delta: Dict[str, str], finish: Optional[str] = None) -> None:
+            chunk = {
+                "id": "chatcmpl-stream",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": body.get("model", "fake"),
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish}],
+            }
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+
+        event({"role": "assistant", "content": ""})
+        for i, word in enumerate(reply.split(" ")):
+            time.sleep(self.fake.token_delay)
+            event({"content": word if i == 0 else " " + word})
+        event({}, finish="stop")
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+
+class FakeChatServer(_Server):
+    """OpenAI-compatible chat endpoint.
+
+    Parameters
+    ----------
+    latency : float
+        Seconds before the first byte of every response.
+    token_delay : float
+        Extra seconds per generated word (between SSE chunks when streaming).
+    reply_words : int
+        Length of every reply.
+    """
+
+    handler_class = _ChatHandler
+
+    def __init__(self, latency: float = 0.05, token_delay: float = 0.0, reply_words: int = 60, **kwargs: Any):
+        super().__init__(**kwargs)
+        self.latency = latency
+        self.token_delay = token_delay
+        self.reply_words = reply_words
+
+    def reply(self, prompt: str) -> str:
+        return deterministic_text(prompt, self.reply_words)
+
+
+# ---------------------------------------------------------------------------
+# arXiv Atom API
+# ---------------------------------------------------------------------------
+
+
+class _ArxivHandler(_Handler):
+    def do_GET(self) -> None:
+        url = urlparse(self.path)
+        if url.path.startswith("/pdf/") and self.fake.pdf is not None:
+            self.fake._count()
+            time.sleep(self.fake.latency)
+            self.send_response(200)
+            self.send_header("Content-Type", "application/pdf")
+            self.send_header("Content-Length", str(len(self.fake.pdf)))
+            self.end_headers()
+            self.wfile.write(self.fake.pdf)
+            return
+        if not url.path.rstrip("/").endswith("/api/query"):
+            self.send_error(404)
+            return
+        self.fake._count()
+        params = {k: v[0] for k, v in parse_qs(url.query).items()}
+        time.sleep(self.fake.latency)
+        payload = self.fake.feed(
+            params.get("search_query", ""), int(params.get("start", 0)), int(params.get("max_results", 10))
+        ).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/atom+xml")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+class FakeArxivServer(_Server):
+    """arXiv query API returning ``total_results`` deterministic papers per query.
+
+    With ``pdf`` (file contents) the papers' PDF links point at this server,
+    which answers every one of them with those bytes.
+    """
+
+    handler_class = _ArxivHandler
+
+    def __init__(self, total_results: int = 500, abstract_words: int = 180, latency: float = 0.0,
+                 pdf: Optional[bytes] = None, **kwargs: Any):
+        super().__init__(**kwargs)
+        self.total_results = total_results
+        self.abstract_words = abstract_words
+        self.latency = latency
+        self.pdf = pdf
+
+    @property
+    def api_url(self) -> str:
+        return self.url + "/api/query"
+
+    def feed(self, query: str, start: int, size: int) -> str:
+        stop = min(start + size, self.total_results)
+        pdf_base = self.url + "/pdf" if self.pdf is not None else "http://arxiv.org/pdf"
+        entries = []
+        for i in range(start, stop):
+            paper_id = f"{2400 + _digest(query) % 100}.{i:05d}"
+            seed = f"{query}|{i}"
+            entries.append(
+                "<entry>"
+                f"<id>http://arxiv.org/abs/{paper_id}v1</id>"
+                f"<published>2024-01-{1 + i % 28:02d}T00:00:00Z</published>"
+                f"<title>{escape(deterministic_text(seed + 'title', 8).title())}</title>"
+                f"<summary>{escape(deterministic_text(seed, self.abstract_words))}</summary>"
+                f"<author><name>Author {i % 97}</name></author>"
+                f"<author><name>Author {(i * 7) % 97}</name></author>"
+                f'<link href="http://arxiv.org/abs/{paper_id}v1" rel="alternate" type="text/html"/>'
+                f'<link title="pdf" href="{pdf_base}/{paper_id}v1" rel="related" type="application/pdf"/>'
+                "</entry>"
+            )
+        return (
+            '<?xml version="1.0" encoding="UTF-8"?>'
+            '<feed xmlns="http://www.w3.org/2005/Atom" xmlns:opensearch="http://a9.com/-/spec/opensearch/1.1/">'
+            f"<title>ArXiv Query: {escape(query)}</title>"
+            f"<opensearch:totalResults>{self.total_results}</opensearch:totalResults>"
+            f"<opensearch:startIndex>{start}</opensearch:startIndex>"
+            f"<opensearch:itemsPerPage>{size}</opensearch:itemsPerPage>"
+            + "".join(entries)
+            + "</feed>"
+        )
+
+
+# ---------------------------------------------------------------------------
+# Vector index and embeddings
+# ---------------------------------------------------------------------------
+
+
+class InMemoryPineconeIndex:
+    """Pinecone ``Index`` stand-in: ``upsert`` and cosine ``query`` over NumPy arrays."""
+
+    def __init__(self, dimension: int):
+        self.dimension = dimension
+        self._ids: List[str] = []
+        self._rows: Dict[str, int] = {}
+        self._metadata: List[Dict[str, Any]] = []
+        self._vectors = np.zeros((0, dimension), dtype=np.float32)
+        self._lock = threading.Lock()
+
+    def upsert(self, vectors: List[Dict[str, Any]], namespace: str = "", **kwargs: Any) -> Dict[str, int]:
+        with self._lock:
+            new_rows = []
+            for record in vectors:
+                values = np.asarray(record["values"], dtype=np.float32)
+                values /= np.linalg.norm(values) or 1.0
+                row = self._rows.get(record["id"])
+                if row is None:
+                    self._rows[record["id"]] = len(self._ids) + len(new_rows)
+                    new_rows.append(values)
+                    self._ids.append(record["id"])
+                    self._metadata.append(record.get("metadata", {}))
+                else:
+                    self._vectors[row] = values
+                    self._metadata[row] = record.get("metadata", {})
+            if new_rows:
+                self._vectors = np.vstack([self._vectors, np.stack(new_rows)])
+        return {"upserted_count": len(vectors)}
+
+    def query(self, vector: List[float], top_k: int = 10, include_metadata: bool = True,
+              namespace: str = "", **kwargs: Any) -> Dict[str, Any]:
+        query = np.asarray(vector, dtype=np.float32)
+        query /= np.linalg.norm(query) or 1.0
+        with self._lock:
+            scores = self._vectors @ query
+            top = np.argsort(-scores)[:top_k]
+            return {"matches": [
+                {"id": self._ids[i], "score": float(scores[i]),
+                 "metadata": self._metadata[i] if include_metadata else {}}
+                for i in top
+            ]}
+
+    def describe_index_stats(self) -> Dict[str, Any]:
+        return {"dimension": self.dimension, "total_vector_count": len(self._ids)}
+
+
+class FakeHFEngine:
+    """Stand-in for ``hf_llm.HFLLM``: ``submit`` returns a resolved future after ``latency`` seconds."""
+
+    def __init__(self, latency: float = 0.0):
+        self.model_id = "fake-hf"
+        self.latency = latency
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    def submit(self, prompt: str, stop: Optional[List[str]] = None) -> Future:
+        with self._lock:
+            self.requests += 1
+        time.sleep(self.latency)
+        future: Future = Future()
+        future.set_result(f" I can answer directly.\nFinal Answer: {_digest(prompt) % 1000}")
+        return future
+
+
+class HashEmbeddings(Embeddings):
+    """Signed feature hashing of lower-cased words into ``dimension`` dims."""
+
+    def __init__(self, dimension: int = 384):
+        self.dimension = dimension
+
+    def _embed(self, text: str) -> List[float]:
+        vector = np.zeros(self.dimension, dtype=np.float32)
+        for word in text.lower().split():
+            h = _digest(word)
+            vector[h % self.dimension] += 1.0 if (h >> 32) & 1 else -1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text)
@@ -0,0 +1,382 @@
+"""End-to-end benchmarks for the apps in this repository, fully offline.
+
+External services are replaced by the deterministic fakes in ``fakes.py``;
+everything else (ingest pipeline, vector store, chains, arXiv client and
+parser, summarizer, SymPy engine) is the real code. Results are printed and
+written as JSON so runs can be compared::
+
+    python benchmarks/run.py --out bench.json
+    python benchmarks/run.py --suite qa --suite sympy --baseline bench.json
+
+Metric names end in ``_per_sec`` (higher is better) or ``_ms`` (lower is
+better); ``--baseline`` fails when any of them regress beyond ``--tolerance``.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+import numpy as np
+
+from fakes import (FakeArxivServer, FakeChatServer, FakeHFEngine, HashEmbeddings, InMemoryPineconeIndex,
+                   deterministic_text)
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+APP_DIRS = {
+    "qa": REPO_ROOT / "Q&A_Chatbot",
+    "math": REPO_ROOT / "math_assistant",
+    "research": REPO_ROOT / "research-agent" / "autonomous_agent",
+}
+
+
+def use_app(name: str) -> None:
+    """Make the flat modules of one app importable (the apps are not packages)."""
+    path = str(APP_DIRS[name])
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+
+def percentiles_ms(samples: List[float], prefix: str) -> Dict[str, float]:
+    ms = np.asarray(samples) * 1000.0
+    return {
+        f"{prefix}_p50_ms": float(np.percentile(ms, 50)),
+        f"{prefix}_p99_ms": float(np.percentile(ms, 99)),
+        f"{prefix}_mean_ms": float(ms.mean()),
+    }
+
+
+def make_pdf(path: Path, pages: int, words_per_page: int = 350) -> Path:
+    from reportlab.lib.pagesizes import letter
+    from reportlab.pdfgen import canvas
+
+    pdf = canvas.Canvas(str(path), pagesize=letter)
+    for page in range(pages):
+        text = pdf.beginText(40, 750)
+        words = deterministic_text(f"page{page}", words_per_page).split()
+        for start in range(0, len(words), 12):
+            text.textLine(" ".join(words[start:start + 12]))
+        pdf.drawText(text)
+        pdf.showPage()
+    pdf.save()
+    return path
+
+
+# ---------------------------------------------------------------------------
+# Suites
+# ---------------------------------------------------------------------------
+
+
+def bench_ingest(args: argparse.Namespace, workdir: Path) -> Dict[str, Any]:
+    """PDF -> chunks -> embeddings -> index, into the local store and the Pinecone upserter."""
+    use_app("qa")
+    from ingest import ingest_pdf, local_upserter, pinecone_upserter
+    from local_vectorstore import LocalVectorStore
+
+    pdf = make_pdf(workdir / "ingest.pdf", args.pages)
+    embedding = HashEmbeddings()
+    targets = {
+        "local": local_upserter(LocalVectorStore(workdir / "ingest_index", embedding)),
+        "pinecone": pinecone_upserter(InMemoryPineconeIndex(embedding.dimension)),
+    }
+    results = {}
+    for name, upsert in targets.items():
+        stats = ingest_pdf(str(pdf), embedding, upsert, source=pdf.name, workers=args.workers)
+        throughput = stats.throughput()
+        # Same file again with the chunk ids from the manifest: nothing is embedded or upserted.
+        again = ingest_pdf(str(pdf), embedding, upsert, source=pdf.name, workers=args.workers,
+                           existing=set(stats.chunk_ids))
+        results[name] = {
+            "pages": stats.pages,
+            "chunks": stats.chunks,
+            "pages_per_sec": throughput["pages_per_sec"],
+            "chunks_per_sec": throughput["chunks_per_sec"],
+            "stage_seconds": dict(stats.seconds),
+            "reingest_unchanged_seconds": again.wall_seconds,
+            "reingest_skipped_chunks": again.skipped,
+        }
+    return results
+
+
+def bench_qa(args: argparse.Namespace, workdir: Path) -> Dict[str, Any]:
+    """Blocking and streaming RetrievalQA latency against the fake chat server."""
+    use_app("qa")
+    from bm25_index import BM25Index
+    from context_packing import PackStats, pack_context
+    from hybrid_retriever import HybridRetriever
+    from ingest import ingest_pdf, keyword_indexing, local_writer
+    from local_vectorstore import LocalVectorStore
+    from qa_chain import build_qa_chain
+    from qa_pipeline import run_chain
+    from streaming import PendingAnswer
+    from chat_model import PooledChatModel  # common/, importable once the app modules are
+    from llm_client import LLMClient, LLMSettings
+
+    embedding = HashEmbeddings()
+    store = LocalVectorStore(workdir / "qa_index", embedding)
+    keyword_index = BM25Index(workdir / "qa_index" / "bm25.sqlite")
+    ingest_pdf(str(make_pdf(workdir / "qa.pdf", args.pages)), embedding,
+               keyword_indexing(local_writer(store), keyword_index).upsert, workers=args.workers)
+    questions = [deterministic_text(f"question{i}", 10) + "?" for i in range(args.queries)]
+
+    with FakeChatServer(latency=args.llm_latency, token_delay=args.token_delay) as chat:
+        client = LLMClient(LLMSettings(api_key="benchmark", base_url=chat.url + "/v1",
+                                       requests_per_minute=0, tokens_per_minute=0))
+        llm = PooledChatModel(client=client, temperature=0.2, max_tokens=1024)
+        qa_chain = build_qa_chain(store, llm, search_type="mmr", k=5)
+        run_chain(qa_chain, questions[0])  # warm-up: client pool, lazy imports
+
+        totals, retrieval = [], []
+        for question in questions:
+            _, timings = run_chain(qa_chain, question)
+            totals.append(timings["total"])
+            retrieval.append(timings["retrieval"])
+
+        hybrid = HybridRetriever(vectorstore=store, keyword_index=keyword_index, k=8)
+        hybrid_retrieval, packing, pack_stats = [], [], []
+        for question in questions:
+            start = time.perf_counter()
+            docs = hybrid.get_relevant_documents(question)
+            hybrid_retrieval.append(time.perf_counter() - start)
+            stats = PackStats()
+            start = time.perf_counter()
+            pack_context(docs, 800, query=question, stats=stats)
+            packing.append(time.perf_counter() - start)
+            pack_stats.append(stats)
+
+        ttft, stream_totals = [], []
+        for question in questions:
+            pending = PendingAnswer(question, qa_chain.retriever, llm)
+            for _ in pending:
+                pass
+            ttft.append(pending.timings["ttft"])
+            stream_totals.append(pending.timings["total"])
+
+    return {
+        "queries": len(questions),
+        "chunks_indexed": len(store),
+        "fake_llm_latency_s": args.llm_latency,
+        **percentiles_ms(totals, "latency"),
+        **percentiles_ms(retrieval, "retrieval"),
+        **percentiles_ms(hybrid_retrieval, "hybrid_retrieval"),
+        **percentiles_ms(packing, "context_packing"),
+        "context_tokens_in_mean": statistics.mean(s.tokens_in for s in pack_stats),
+        "context_tokens_out_mean": statistics.mean(s.tokens_out for s in pack_stats),
+        **percentiles_ms(ttft, "stream_ttft"),
+        **percentiles_ms(stream_totals, "stream_latency"),
+    }
+
+
+def bench_research(args: argparse.Namespace, workdir: Path) -> Dict[str, Any]:
+    """arXiv search + concurrent summarization, and deep research over fixture PDFs, against the fakes."""
+    use_app("research")
+    import utils
+    from arxiv_client import ArxivClient
+    from deep_research import DeepResearchConfig, deep_research
+    from research_pipeline import find_papers, research_topic
+
+    pdf = make_pdf(workdir / "paper.pdf", pages=args.paper_pages).read_bytes()
+    with FakeArxivServer(total_results=args.search_results, pdf=pdf) as arxiv, \
+            FakeChatServer(latency=args.llm_latency, token_delay=args.token_delay) as chat:
+        utils._arxiv_client = ArxivClient(base_url=arxiv.api_url, page_delay=0.0)
+        llm = utils._make_openai_like_llm(api_key="benchmark", base_url=chat.url + "/v1", model="fake-model")
+        research_topic("warm-up", llm, max_results=1)  # client pool, lazy imports
+
+        start = time.perf_counter()
+        found = find_papers("search throughput", max_results=args.search_results)
+        search_seconds = time.perf_counter() - start
+
+        topics = [f"topic {i}" for i in range(args.topics)]
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            reports = list(pool.map(
+                lambda topic: research_topic(topic, llm, max_results=args.papers, max_concurrency=args.concurrency),
+                topics,
+            ))
+        seconds = time.perf_counter() - start
+        utils._arxiv_client = None
+
+        # No cache, so every section is summarized; the fake planner's reply is one long line,
+        # so only the question itself is searched.
+        config = DeepResearchConfig(max_papers=args.papers, results_per_query=args.papers,
+                                    llm_concurrency=args.concurrency, pdf_dir=workdir / "pdfs",
+                                    arxiv_url=arxiv.api_url)
+        chat_before = chat.requests
+        deep = deep_research("deep research benchmark", llm, config=config)
+        deep_requests = chat.requests - chat_before
+
+    papers = sum(len(report["papers"]) for report in reports)
+    errors = sum(1 for report in reports for paper in report["papers"] if paper.get("error"))
+    return {
+        "search_papers": len(found),
+        "search_papers_per_sec": len(found) / search_seconds,
+        "topics": len(topics),
+        "papers": papers,
+        "errors": errors,
+        "fake_llm_latency_s": args.llm_latency,
+        "llm_concurrency": args.concurrency,
+        "papers_per_sec": papers / seconds,
+        "llm_requests": chat.requests - 1 - deep_requests,
+        "deep_papers": len(deep["papers"]),
+        "deep_from_pdf": sum(paper.get("source") == "pdf" for paper in deep["papers"]),
+        "deep_llm_requests": deep_requests,
+        "deep_first_summary_ms": deep["timings"]["first_summary"] * 1000,
+        "deep_total_ms": deep["timings"]["total"] * 1000,
+    }
+
+
+def bench_sympy(args: argparse.Namespace, workdir: Path) -> Dict[str, Any]:
+    """Throughput of the SymPy tools (cold/warm, batch, vectorized) and of the agent on the HF backend."""
+    use_app("math")
+    import math_pipeline
+    from hf_llm import HFAgentLLM
+    from model_registry import ModelRegistry
+    from sympy_engine import get_engine
+    from sympy_tools1 import SympyBatchTool, SympyDerivativeTool, SympyIntegralTool
+
+    n = args.expressions
+    run_id = int(time.time())  # fresh expressions, so "cold" really misses the cache
+    expressions = [f"x**{i % 7 + 2}*sin({i + run_id}*x) + exp({i % 5 + 1}*x)" for i in range(n)]
+    integrands = [f"x**{i % 4 + 1}*exp({i + run_id}*x)" for i in range(n)]
+    derivative, integral, batch = SympyDerivativeTool(), SympyIntegralTool(), SympyBatchTool()
+
+    def rate(fn: Callable[[], Any], count: int) -> float:
+        start = time.perf_counter()
+        fn()
+        return count / (time.perf_counter() - start)
+
+    results = {
+        "expressions": n,
+        "derivative_cold_per_sec": rate(lambda: [derivative.run(e) for e in expressions], n),
+        "derivative_warm_per_sec": rate(lambda: [derivative.run(e) for e in expressions], n),
+        "integral_cold_per_sec": rate(lambda: [integral.run(e) for e in integrands], n),
+        "integral_warm_per_sec": rate(lambda: [integral.run(e) for e in integrands], n),
+    }
+    fresh = [f"{e} + {run_id + 1}*x" for e in integrands]
+    results["batch_integral_cold_per_sec"] = rate(
+        lambda: batch.run({"expressions": fresh, "operation": "integral"}), n
+    )
+    points = np.linspace(-5, 5, args.points)
+    get_engine().evaluate(expressions[0], points[:10])  # compile once
+    results["evaluate_points_per_sec"] = rate(lambda: get_engine().evaluate(expressions[0], points), len(points))
+    results["engine"] = get_engine().stats()
+
+    # The HF backend must build a LangChain agent; the fake engine stands in for the weights.
+    registry = ModelRegistry()
+    registry.register("hf_llm", lambda: HFAgentLLM(engine=FakeHFEngine()))
+    agent = math_pipeline.build_agent(math_pipeline.make_llm(math_pipeline.HF, registry), verbose=False)
+    queries = [f"what is {i} squared" for i in range(n)]
+    solved = []
+    results["hf_agent_solves_per_sec"] = rate(
+        lambda: solved.extend(result for _, result in math_pipeline.solve_many(agent, queries)), n
+    )
+    results["hf_agent_errors"] = sum("error" in result for result in solved)
+    results["hf_agent_calls"] = registry.stats()["hf_llm"]["calls"]
+    return results
+
+
+SUITES = {"ingest": bench_ingest, "qa": bench_qa, "research": bench_research, "sympy": bench_sympy}
+
+
+# ---------------------------------------------------------------------------
+# Reporting
+# ---------------------------------------------------------------------------
+
+
+def _flatten(tree: Dict[str, Any], prefix: str = "") -> Dict[str, float]:
+    flat = {}
+    for key, value in tree.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(_flatten(value, name + "."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = float(value)
+    return flat
+
+
+def regressions(baseline: Dict[str, Any], current: Dict[str, Any], tolerance: float) -> List[str]:
+    """Describe every ``_per_sec`` metric that dropped, or ``_ms`` metric that rose, beyond ``tolerance``."""
+    old, new = _flatten(baseline["results"]), _flatten(current["results"])
+    found = []
+    for name in sorted(old.keys() & new.keys()):
+        before, after = old[name], new[name]
+        if name.endswith("_per_sec") and after < before * (1 - tolerance):
+            found.append(f"{name}: {before:.4g} -> {after:.4g}")
+        elif name.endswith("_ms") and after > before * (1 + tolerance):
+            found.append(f"{name}: {before:.4g} -> {after:.4g}")
+    return found
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def main(argv: List[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--suite", action="append", choices=sorted(SUITES), help="Repeatable; default: all")
+    parser.add_argument("--out", help="Write the JSON report here")
+    parser.add_argument("--baseline", help="Earlier JSON report to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative regression")
+    parser.add_argument("--pages", type=int, default=40, help="Pages in the synthetic PDF")
+    parser.add_argument("--workers", type=int, default=None, help="Page-extraction processes")
+    parser.add_argument("--queries", type=int, default=50, help="Q&A questions")
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="Fake LLM time to first byte (s)")
+    parser.add_argument("--token-delay", type=float, default=0.0, help="Fake LLM seconds per word")
+    parser.add_argument("--topics", type=int, default=4, help="Research topics")
+    parser.add_argument("--papers", type=int, default=10, help="Papers per research topic")
+    parser.add_argument("--concurrency", type=int, default=4, help="Parallel summaries per topic")
+    parser.add_argument("--paper-pages", type=int, default=8, help="Pages in the deep-research fixture PDF")
+    parser.add_argument("--search-results", type=int, default=300, help="Papers in the paged search run")
+    parser.add_argument("--expressions", type=int, default=50, help="SymPy expressions per measurement")
+    parser.add_argument("--points", type=int, default=1_000_000, help="Points for vectorized evaluation")
+    args = parser.parse_args(argv)
+    # The fakes have no quota; measure the apps, not the client-side rate limiter.
+    os.environ.setdefault("LLM_RPM", "0")
+    os.environ.setdefault("LLM_TPM", "0")
+
+    report: Dict[str, Any] = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "config": {k: v for k, v in vars(args).items() if k not in ("out", "baseline")},
+        },
+        "results": {},
+    }
+    with tempfile.TemporaryDirectory(prefix="bench-") as tmp:
+        for name in args.suite or list(SUITES):
+            print(f"running {name}...", file=sys.stderr)
+            started = time.perf_counter()
+            report["results"][name] = SUITES[name](args, Path(tmp))
+            report["results"][name]["wall_seconds"] = time.perf_counter() - started
+
+    text = json.dumps(report, indent=2, default=str)
+    print(text)
+    if args.out:
+        Path(args.out).write_text(text + "\n", encoding="utf-8")
+
+    if args.baseline:
+        found = regressions(json.loads(Path(args.baseline).read_text(encoding="utf-8")), report, args.tolerance)
+        for line in found:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        return 1 if found else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
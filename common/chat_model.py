@@ -0,0 +1,87 @@
+"""LangChain chat model backed by the shared :class:`llm_client.LLMClient`.
+
+Drop-in replacement for ``ChatGroq`` in chains, agents and ``astream``:
+requests go through the process-wide client, so they share its connection
+pool, rate limits, retries and request coalescing. Token usage is reported
+in ``llm_output["token_usage"]`` like the provider integrations do.
+"""
+from __future__ import annotations
+
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional
+
+from langchain.callbacks.manager import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain.chat_models.base import BaseChatModel
+from langchain.schema import AIMessage, BaseMessage, ChatGeneration, ChatResult
+from langchain.schema.messages import AIMessageChunk
+from langchain.schema.output import ChatGenerationChunk
+
+from llm_client import Completion, LLMClient, get_client
+
+_ROLES = {"human": "user", "ai": "assistant", "system": "system"}
+
+
+def to_openai_messages(messages: List[BaseMessage]) -> List[Dict[str, str]]:
+    return [
+        {"role": _ROLES.get(m.type) or getattr(m, "role", "user"), "content": str(m.content)}
+        for m in messages
+    ]
+
+
+class PooledChatModel(BaseChatModel):
+    """Chat model whose calls go through a shared :class:`LLMClient`."""
+
+    client: Any = None
+    temperature: float = 0.7
+    max_tokens: Optional[int] = None
+    top_p: Optional[float] = None
+
+    @classmethod
+    def from_env(cls, default_model: str, **kwargs: Any) -> "PooledChatModel":
+        """Use the process-wide client configured by the ``LLM_*`` environment variables."""
+        return cls(client=get_client(default_model=default_model), **kwargs)
+
+    @property
+    def _llm_type(self) -> str:
+        return "pooled-openai-compatible"
+
+    @property
+    def _identifying_params(self) -> Dict[str, Any]:
+        return {"model": self.client.model, "base_url": self.client.settings.base_url, **self._params(None)}
+
+    def _params(self, stop: Optional[List[str]], **kwargs: Any) -> Dict[str, Any]:
+        params = {"temperature": self.temperature, "max_tokens": self.max_tokens, "top_p": self.top_p, "stop": stop}
+        params.update(kwargs)
+        return params
+
+    def _result(self, completion: Completion) -> ChatResult:
+        return ChatResult(
+            generations=[ChatGeneration(message=AIMessage(content=completion.text))],
+            llm_output={"token_usage": completion.usage, "model_name": completion.model or self.client.model},
+        )
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> ChatResult:
+        client: LLMClient = self.client
+        return self._result(client.chat(to_openai_messages(messages), **self._params(stop, **kwargs)))
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager: Optional[AsyncCallbackManagerForLLMRun] = None, **kwargs: Any) -> ChatResult:
+        client: LLMClient = self.client
+        return self._result(await client.achat(to_openai_messages(messages), **self._params(stop, **kwargs)))
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        for token in self.client.stream(to_openai_messages(messages), **self._params(stop, **kwargs)):
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            yield chunk
+            if run_manager is not None:
+                run_manager.on_llm_new_token(token, chunk=chunk)
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                       run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+                       **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        async for token in self.client.astream(to_openai_messages(messages), **self._params(stop, **kwargs)):
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            yield chunk
+            if run_manager is not None:
+                await run_manager.on_llm_new_token(token, chunk=chunk)
@@ -0,0 +1,484 @@
+"""Shared client for OpenAI-compatible chat completion APIs (Groq by default).
+
+One :class:`LLMClient` per ``(base_url, api_key, model)`` is shared by every
+caller in the process (:func:`get_client`), so all Streamlit sessions, batch
+workers and async tasks draw on the same:
+
+* pooled ``httpx`` connections (one sync client, one async client per event
+  loop);
+* token buckets for the provider's requests-per-minute and
+  tokens-per-minute quotas -- callers wait for capacity instead of being
+  answered with 429s, and a ``retry-after`` from the server pauses everyone;
+* retries of 429/5xx responses and connection errors with jittered
+  exponential backoff;
+* coalescing: identical requests already in flight share one HTTP call.
+
+Settings come from ``LLM_*`` environment variables (see
+:meth:`LLMSettings.from_env`); ``LLM_RPM=0`` / ``LLM_TPM=0`` disable the
+limiter. :mod:`chat_model` wraps a client as a LangChain chat model.
+"""
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+import weakref
+from concurrent.futures import Future
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Tuple
+
+import httpx
+
+from tracing import get_tracer
+
+DEFAULT_BASE_URL = "https://api.groq.com/openai/v1"
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+Message = Dict[str, str]
+
+
+class LLMError(RuntimeError):
+    """A request that failed for good; ``status_code`` is ``None`` for transport errors."""
+
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+@dataclass
+class LLMSettings:
+    """Endpoint, model and quota of one client.
+
+    ``requests_per_minute`` and ``tokens_per_minute`` should match the
+    provider's limits for the model (Groq lists them per model and plan);
+    ``0`` disables that bucket.
+    """
+
+    api_key: Optional[str] = None
+    base_url: str = DEFAULT_BASE_URL
+    model: str = "llama3-8b-8192"
+    requests_per_minute: float = 30
+    tokens_per_minute: float = 6000
+    max_retries: int = 5
+    timeout: float = 60.0
+    max_connections: int = 20
+
+    @classmethod
+    def from_env(cls, default_model: str = "llama3-8b-8192") -> "LLMSettings":
+        """Read ``LLM_API_KEY`` (or ``GROQ_API_KEY``), ``LLM_BASE_URL``, ``LLM_MODEL``,
+        ``LLM_RPM``, ``LLM_TPM``, ``LLM_MAX_RETRIES`` and ``LLM_MAX_CONNECTIONS``."""
+        return cls(
+            api_key=os.getenv("LLM_API_KEY") or os.getenv("GROQ_API_KEY"),
+            base_url=os.getenv("LLM_BASE_URL", DEFAULT_BASE_URL),
+            model=os.getenv("LLM_MODEL") or default_model,
+            requests_per_minute=float(os.getenv("LLM_RPM", "30")),
+            tokens_per_minute=float(os.getenv("LLM_TPM", "6000")),
+            max_retries=int(os.getenv("LLM_MAX_RETRIES", "5")),
+            max_connections=int(os.getenv("LLM_MAX_CONNECTIONS", "20")),
+        )
+
+
+@dataclass
+class Completion:
+    text: str
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    model: str = ""
+
+    @property
+    def usage(self) -> Dict[str, int]:
+        return {
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "total_tokens": self.prompt_tokens + self.completion_tokens,
+        }
+
+
+# ---------------------------------------------------------------------------
+# Rate limiting
+# ---------------------------------------------------------------------------
+
+
+class TokenBucket:
+    """Thread-safe token bucket refilled continuously at ``per_minute`` units per minute.
+
+    :meth:`reserve` takes the units immediately -- the balance may go
+    negative -- and returns how long the caller must wait before using
+    them, so waiters are served in arrival order and the same bucket works
+    for threads (:meth:`acquire`) and coroutines (:meth:`aacquire`).
+    """
+
+    def __init__(self, per_minute: float, burst: Optional[float] = None):
+        self.rate = per_minute / 60.0
+        self.capacity = burst if burst is not None else per_minute
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self, amount: float = 1.0) -> float:
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self._tokens -= min(amount, self.capacity)
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+            return max(wait, self._paused_until - now)
+
+    def adjust(self, amount: float) -> None:
+        """Return (``amount`` > 0) or take more (< 0) units once the real cost is known."""
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens = min(self.capacity, self._tokens + amount)
+
+    def pause(self, seconds: float) -> None:
+        """Make every caller wait at least ``seconds`` (e.g. after a server ``retry-after``)."""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def acquire(self, amount: float = 1.0) -> None:
+        wait = self.reserve(amount)
+        if wait > 0:
+            time.sleep(wait)
+
+    async def aacquire(self, amount: float = 1.0) -> None:
+        wait = self.reserve(amount)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+def estimate_tokens(messages: List[Message], max_tokens: Optional[int]) -> int:
+    """Rough request cost for the token bucket (~4 characters per token plus the reply)."""
+    prompt = sum(len(m.get("content") or "") for m in messages) // 4 + 4 * len(messages)
+    return prompt + min(max_tokens or 512, 512)
+
+
+def _retry_after(response: httpx.Response) -> Optional[float]:
+    try:
+        return float(response.headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(attempt: int, base: float = 0.5, cap: float = 20.0) -> float:
+    """Full-jitter exponential backoff."""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+# ---------------------------------------------------------------------------
+# Client
+# ---------------------------------------------------------------------------
+
+
+class _LoopState:
+    """Async HTTP client and in-flight requests belonging to one event loop."""
+
+    def __init__(self, client: httpx.AsyncClient):
+        self.client = client
+        self.inflight: Dict[str, asyncio.Future] = {}
+
+
+class LLMClient:
+    """Pooled, rate-limited, retrying chat completions client.
+
+    Parameters
+    ----------
+    settings : LLMSettings
+        Endpoint, model, quotas and retry budget.
+    coalesce : bool
+        Share one HTTP call between identical concurrent requests.
+    """
+
+    def __init__(self, settings: LLMSettings, coalesce: bool = True):
+        self.settings = settings
+        self.model = settings.model
+        self.coalesce = coalesce
+        self.requests = TokenBucket(settings.requests_per_minute) if settings.requests_per_minute > 0 else None
+        self.tokens = TokenBucket(settings.tokens_per_minute) if settings.tokens_per_minute > 0 else None
+        self.stats = {"requests": 0, "retries": 0, "coalesced": 0, "prompt_tokens": 0, "completion_tokens": 0}
+        self._limits = httpx.Limits(max_connections=settings.max_connections,
+                                    max_keepalive_connections=settings.max_connections)
+        self._headers = {"Authorization": f"Bearer {settings.api_key or ''}"}
+        self._base_url = settings.base_url.rstrip("/") + "/"
+        self._http = httpx.Client(base_url=self._base_url, headers=self._headers,
+                                  timeout=settings.timeout, limits=self._limits)
+        self._loops: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, _LoopState]" = weakref.WeakKeyDictionary()
+        self._inflight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    # ------------------------------------------------------------------
+    # Helpers
+    # ------------------------------------------------------------------
+
+    def _payload(self, messages: List[Message], params: Dict[str, Any]) -> Dict[str, Any]:
+        payload = {"model": self.model, "messages": messages}
+        payload.update({k: v for k, v in params.items() if v is not None})
+        return payload
+
+    @staticmethod
+    def _key(payload: Dict[str, Any]) -> str:
+        return hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
+
+    def _count(self, **counts: int) -> None:
+        with self._lock:
+            for name, value in counts.items():
+                self.stats[name] += value
+
+    def _settle(self, estimate: int, completion: Completion) -> None:
+        """Correct the token bucket with the usage the server reported."""
+        if self.tokens is not None and completion.prompt_tokens + completion.completion_tokens:
+            self.tokens.adjust(estimate - completion.prompt_tokens - completion.completion_tokens)
+        self._count(prompt_tokens=completion.prompt_tokens, completion_tokens=completion.completion_tokens)
+
+    def _failure(self, response: Optional[httpx.Response], error: Optional[Exception]) -> Tuple[LLMError, Optional[float]]:
+        """Classify a failed attempt; return the error and the server's ``retry-after``, if any."""
+        if response is None:
+            return LLMError(f"{type(error).__name__}: {error}"), None
+        failure = LLMError(f"HTTP {response.status_code}: {response.text[:500]}", response.status_code)
+        retry_after = _retry_after(response)
+        if response.status_code == 429 and retry_after:
+            for bucket in (self.requests, self.tokens):
+                if bucket is not None:
+                    bucket.pause(retry_after)
+        return failure, retry_after
+
+    @staticmethod
+    def _parse(body: Dict[str, Any]) -> Completion:
+        usage = body.get("usage") or {}
+        return Completion(
+            text=body["choices"][0]["message"].get("content") or "",
+            prompt_tokens=usage.get("prompt_tokens", 0),
+            completion_tokens=usage.get("completion_tokens", 0),
+            model=body.get("model", ""),
+        )
+
+    # ------------------------------------------------------------------
+    # Sync interface
+    # ------------------------------------------------------------------
+
+    def _send(self, payload: Dict[str, Any], stream: bool = False) -> httpx.Response:
+        """POST with rate limiting and retries; return the first successful response."""
+        estimate = estimate_tokens(payload["messages"], payload.get("max_tokens"))
+        for attempt in range(self.settings.max_retries + 1):
+            if self.requests is not None:
+                self.requests.acquire()
+            if self.tokens is not None:
+                self.tokens.acquire(estimate)
+            self._count(requests=1)
+            response, error = None, None
+            try:
+                request = self._http.build_request("POST", "chat/completions", json=payload)
+                response = self._http.send(request, stream=stream)
+                if response.status_code < 400:
+                    return response
+                if stream:
+                    response.read()
+            except httpx.TransportError as exc:
+                error = exc
+            failure, retry_after = self._failure(response, error)
+            retryable = response is None or response.status_code in RETRY_STATUSES
+            if not retryable or attempt == self.settings.max_retries:
+                raise failure
+            self._count(retries=1)
+            time.sleep(retry_after * random.uniform(1.0, 1.2) if retry_after else backoff_delay(attempt))
+        raise AssertionError("unreachable")
+
+    def _request(self, payload: Dict[str, Any]) -> Completion:
+        with get_tracer().span("llm.request", model=self.model) as span:
+            completion = self._parse(self._send(payload).json())
+            self._settle(estimate_tokens(payload["messages"], payload.get("max_tokens")), completion)
+            span.set(**completion.usage)
+            return completion
+
+    def chat(self, messages: List[Message], **params: Any) -> Completion:
+        """One chat completion; ``params`` are passed through (``temperature``, ``max_tokens``, ``stop`` ...)."""
+        payload = self._payload(messages, params)
+        if not self.coalesce:
+            return self._request(payload)
+
+        key = self._key(payload)
+        with self._lock:
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self._inflight[key] = Future()
+        if not leader:
+            self._count(coalesced=1)
+            return future.result()
+        try:
+            completion = self._request(payload)
+        except BaseException as exc:
+            future.set_exception(exc)
+            raise
+        else:
+            future.set_result(completion)
+            return completion
+        finally:
+            with self._lock:
+                del self._inflight[key]
+
+    def complete(self, prompt: str, **params: Any) -> Completion:
+        return self.chat([{"role": "user", "content": prompt}], **params)
+
+    def stream(self, messages: List[Message], **params: Any) -> Iterator[str]:
+        """Yield the reply's text deltas as the server sends them (no coalescing)."""
+        payload = self._payload(messages, {**params, "stream": True})
+        # Not made the current span: a generator may be resumed from other contexts.
+        tracer = get_tracer()
+        span = tracer.start_span("llm.stream", model=self.model)
+        error = None
+        try:
+            response = self._send(payload, stream=True)
+            try:
+                for line in response.iter_lines():
+                    delta = _sse_delta(line)
+                    if delta is None:
+                        break
+                    if delta:
+                        yield delta
+            finally:
+                response.close()
+        except Exception as exc:
+            error = exc
+            raise
+        finally:
+            tracer.finish(span, error=error)
+
+    # ------------------------------------------------------------------
+    # Async interface
+    # ------------------------------------------------------------------
+
+    def _loop_state(self) -> _LoopState:
+        loop = asyncio.get_running_loop()
+        state = self._loops.get(loop)
+        if state is None:
+            state = self._loops[loop] = _LoopState(httpx.AsyncClient(
+                base_url=self._base_url, headers=self._headers,
+                timeout=self.settings.timeout, limits=self._limits,
+            ))
+        return state
+
+    async def _asend(self, payload: Dict[str, Any], stream: bool = False) -> httpx.Response:
+        client = self._loop_state().client
+        estimate = estimate_tokens(payload["messages"], payload.get("max_tokens"))
+        for attempt in range(self.settings.max_retries + 1):
+            if self.requests is not None:
+                await self.requests.aacquire()
+            if self.tokens is not None:
+                await self.tokens.aacquire(estimate)
+            self._count(requests=1)
+            response, error = None, None
+            try:
+                request = client.build_request("POST", "chat/completions", json=payload)
+                response = await client.send(request, stream=stream)
+                if response.status_code < 400:
+                    return response
+                if stream:
+                    await response.aread()
+            except httpx.TransportError as exc:
+                error = exc
+            failure, retry_after = self._failure(response, error)
+            retryable = response is None or response.status_code in RETRY_STATUSES
+            if not retryable or attempt == self.settings.max_retries:
+                raise failure
+            self._count(retries=1)
+            await asyncio.sleep(retry_after * random.uniform(1.0, 1.2) if retry_after else backoff_delay(attempt))
+        raise AssertionError("unreachable")
+
+    async def _arequest(self, payload: Dict[str, Any]) -> Completion:
+        with get_tracer().span("llm.request", model=self.model) as span:
+            completion = self._parse((await self._asend(payload)).json())
+            self._settle(estimate_tokens(payload["messages"], payload.get("max_tokens")), completion)
+            span.set(**completion.usage)
+            return completion
+
+    async def achat(self, messages: List[Message], **params: Any) -> Completion:
+        payload = self._payload(messages, params)
+        if not self.coalesce:
+            return await self._arequest(payload)
+
+        inflight = self._loop_state().inflight
+        key = self._key(payload)
+        if key in inflight:
+            self._count(coalesced=1)
+            return await asyncio.shield(inflight[key])
+        future = inflight[key] = asyncio.get_running_loop().create_future()
+        try:
+            completion = await self._arequest(payload)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as exc:
+            future.set_exception(exc)
+            future.exception()  # retrieved by the waiters, if any; don't warn otherwise
+            raise
+        else:
+            future.set_result(completion)
+            return completion
+        finally:
+            del inflight[key]
+
+    async def acomplete(self, prompt: str, **params: Any) -> Completion:
+        return await self.achat([{"role": "user", "content": prompt}], **params)
+
+    async def astream(self, messages: List[Message], **params: Any) -> AsyncIterator[str]:
+        payload = self._payload(messages, {**params, "stream": True})
+        tracer = get_tracer()
+        span = tracer.start_span("llm.stream", model=self.model)
+        error = None
+        try:
+            response = await self._asend(payload, stream=True)
+            try:
+                async for line in response.aiter_lines():
+                    delta = _sse_delta(line)
+                    if delta is None:
+                        break
+                    if delta:
+                        yield delta
+            finally:
+                await response.aclose()
+        except Exception as exc:
+            error = exc
+            raise
+        finally:
+            tracer.finish(span, error=error)
+
+    def close(self) -> None:
+        self._http.close()
+
+
+def _sse_delta(line: str) -> Optional[str]:
+    """Text delta carried by one SSE line; ``""`` for other lines, ``None`` at ``[DONE]``."""
+    if not line.startswith("data:"):
+        return ""
+    data = line[5:].strip()
+    if data == "[DONE]":
+        return None
+    choices = json.loads(data).get("choices") or [{}]
+    return choices[0].get("delta", {}).get("content") or ""
+
+
+_clients: Dict[Tuple[str, Optional[str], str], LLMClient] = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(settings: Optional[LLMSettings] = None, default_model: str = "llama3-8b-8192") -> LLMClient:
+    """Return the process-wide client for ``settings`` (default: :meth:`LLMSettings.from_env`).
+
+    Clients are shared per endpoint, key and model -- the unit provider
+    quotas apply to -- so every caller draws on the same buckets and pool.
+    """
+    settings = settings or LLMSettings.from_env(default_model)
+    key = (settings.base_url.rstrip("/"), settings.api_key, settings.model)
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            client = _clients[key] = LLMClient(settings)
+    return client
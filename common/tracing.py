@@ -0,0 +1,394 @@
+"""Lightweight per-stage tracing shared by every app in the repository.
+
+A *span* records one stage of a request -- PDF extraction, an embedding
+batch, a vector search, an LLM call, a SymPy tool call -- with its duration,
+its parent span and free-form attributes such as token counts or cache
+hit/miss. Spans are collected in two ways:
+
+* :class:`TracingCallbackHandler` turns LangChain chain/retriever/LLM/tool
+  callbacks into spans (pass it in ``config={"callbacks": [...]}``);
+* :meth:`Tracer.span` and :func:`traced` wrap code that does not go through
+  LangChain.
+
+Nesting follows the call stack through a ``ContextVar``, so a span opened
+inside another one becomes its child. The most recent spans are kept in
+memory for the optional Streamlit debug panel (:func:`render_debug_panel`);
+finished spans are also handed to exporters, configured with
+``TRACE_EXPORT`` (``jsonl`` or ``otlp``) and ``TRACE_PATH``:
+
+* ``jsonl`` writes one flat span per line;
+* ``otlp`` writes OTLP/JSON ``ExportTraceServiceRequest`` lines, the format
+  read by the OpenTelemetry collector's ``otlpjsonfile`` receiver.
+"""
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import functools
+import json
+import os
+import secrets
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional
+from uuid import UUID
+
+try:
+    from langchain.callbacks.base import BaseCallbackHandler
+except ImportError:  # the research agent does not depend on LangChain
+    BaseCallbackHandler = object  # type: ignore[misc,assignment]
+
+
+@dataclass
+class Span:
+    name: str
+    trace_id: str
+    span_id: str
+    parent_id: Optional[str] = None
+    start: float = field(default_factory=time.time)
+    duration: Optional[float] = None
+    attributes: Dict[str, Any] = field(default_factory=dict)
+    error: Optional[str] = None
+    _started: float = field(default_factory=time.perf_counter, repr=False)
+
+    def set(self, **attributes: Any) -> "Span":
+        self.attributes.update(attributes)
+        return self
+
+    def end(self, error: Optional[BaseException | str] = None) -> None:
+        if self.duration is None:
+            self.duration = time.perf_counter() - self._started
+        if error is not None:
+            self.error = str(error)
+
+    def to_dict(self) -> Dict[str, Any]:
+        record = asdict(self)
+        record.pop("_started")
+        return record
+
+
+_current: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar("current_span", default=None)
+
+
+def current_span() -> Optional[Span]:
+    return _current.get()
+
+
+def annotate(**attributes: Any) -> None:
+    """Add attributes to the innermost open span, if there is one."""
+    span = _current.get()
+    if span is not None:
+        span.set(**attributes)
+
+
+def in_current_context(fn: Callable) -> Callable:
+    """Bind ``fn`` to the caller's context so spans opened in a worker thread nest correctly."""
+    return functools.partial(contextvars.copy_context().run, fn)
+
+
+# ---------------------------------------------------------------------------
+# Exporters
+# ---------------------------------------------------------------------------
+
+
+class JsonlExporter:
+    """Append one JSON object per finished span."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def export(self, span: Span) -> None:
+        line = json.dumps(span.to_dict(), default=str)
+        with self._lock, open(self.path, "a", encoding="utf-8") as fh:
+            fh.write(line + "\n")
+
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+class OtlpJsonExporter:
+    """Append one OTLP/JSON ``ExportTraceServiceRequest`` per finished span."""
+
+    def __init__(self, path: str, service_name: str = "langchain-projects"):
+        self.path = path
+        self.service_name = service_name
+        self._lock = threading.Lock()
+
+    def encode(self, span: Span) -> Dict[str, Any]:
+        start_ns = int(span.start * 1e9)
+        otlp_span = {
+            "traceId": span.trace_id,
+            "spanId": span.span_id,
+            "name": span.name,
+            "kind": 1,  # SPAN_KIND_INTERNAL
+            "startTimeUnixNano": str(start_ns),
+            "endTimeUnixNano": str(start_ns + int((span.duration or 0.0) * 1e9)),
+            "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in span.attributes.items()],
+            "status": {"code": 2, "message": span.error} if span.error else {"code": 1},
+        }
+        if span.parent_id:
+            otlp_span["parentSpanId"] = span.parent_id
+        return {"resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": self.service_name}}]},
+            "scopeSpans": [{"scope": {"name": "tracing"}, "spans": [otlp_span]}],
+        }]}
+
+    def export(self, span: Span) -> None:
+        line = json.dumps(self.encode(span))
+        with self._lock, open(self.path, "a", encoding="utf-8") as fh:
+            fh.write(line + "\n")
+
+
+# ---------------------------------------------------------------------------
+# Tracer
+# ---------------------------------------------------------------------------
+
+
+class Tracer:
+    """Creates spans, keeps the most recent ``max_spans`` and forwards finished ones to exporters."""
+
+    def __init__(self, max_spans: int = 5000):
+        self._spans: Deque[Span] = deque(maxlen=max_spans)
+        self._lock = threading.Lock()
+        self.exporters: List[Any] = []
+
+    def start_span(self, name: str, parent: Optional[Span] = None, **attributes: Any) -> Span:
+        """Open a span without making it current (for callback-driven spans)."""
+        parent = parent if parent is not None else _current.get()
+        return Span(
+            name=name,
+            trace_id=parent.trace_id if parent else secrets.token_hex(16),
+            span_id=secrets.token_hex(8),
+            parent_id=parent.span_id if parent else None,
+            attributes=dict(attributes),
+        )
+
+    def finish(self, span: Span, error: Optional[BaseException | str] = None) -> None:
+        span.end(error)
+        with self._lock:
+            self._spans.append(span)
+        for exporter in self.exporters:
+            try:
+                exporter.export(span)
+            except OSError:
+                pass  # tracing must never break the request
+
+    @contextmanager
+    def span(self, name: str, **attributes: Any) -> Iterator[Span]:
+        """Time the ``with`` block as a child of the current span."""
+        span = self.start_span(name, **attributes)
+        token = _current.set(span)
+        try:
+            yield span
+        except BaseException as exc:
+            self.finish(span, error=exc)
+            raise
+        else:
+            self.finish(span)
+        finally:
+            _current.reset(token)
+
+    @contextmanager
+    def use_span(self, span: Span) -> Iterator[Span]:
+        """Make an open ``span`` current for the ``with`` block without finishing it."""
+        token = _current.set(span)
+        try:
+            yield span
+        finally:
+            _current.reset(token)
+
+    def spans(self, trace_id: Optional[str] = None) -> List[Span]:
+        """Finished spans, oldest first, optionally for one trace only."""
+        with self._lock:
+            spans = list(self._spans)
+        return [s for s in spans if trace_id is None or s.trace_id == trace_id]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._spans.clear()
+
+
+def traced(name: Optional[str] = None, tracer: Optional[Tracer] = None) -> Callable:
+    """Decorator recording every call of a (sync or async) function as a span."""
+
+    def decorate(fn: Callable) -> Callable:
+        span_name = name or fn.__qualname__
+
+        if asyncio.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args: Any, **kwargs: Any) -> Any:
+                with (tracer or get_tracer()).span(span_name):
+                    return await fn(*args, **kwargs)
+
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            with (tracer or get_tracer()).span(span_name):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorate
+
+
+_tracer: Optional[Tracer] = None
+_tracer_lock = threading.Lock()
+
+
+def get_tracer() -> Tracer:
+    """Return the process-wide tracer, with exporters from ``TRACE_EXPORT``/``TRACE_PATH``."""
+    global _tracer
+    with _tracer_lock:
+        if _tracer is None:
+            _tracer = Tracer()
+            export = os.getenv("TRACE_EXPORT", "").lower()
+            if export == "jsonl":
+                _tracer.exporters.append(JsonlExporter(os.getenv("TRACE_PATH", "traces.jsonl")))
+            elif export == "otlp":
+                _tracer.exporters.append(OtlpJsonExporter(os.getenv("TRACE_PATH", "traces.otlp.jsonl")))
+    return _tracer
+
+
+# ---------------------------------------------------------------------------
+# LangChain callbacks
+# ---------------------------------------------------------------------------
+
+
+def _run_name(serialized: Optional[Dict[str, Any]], kwargs: Dict[str, Any], default: str) -> str:
+    if kwargs.get("name"):
+        return kwargs["name"]
+    serialized = serialized or {}
+    if serialized.get("name"):
+        return serialized["name"]
+    if serialized.get("id"):
+        return serialized["id"][-1]
+    return default
+
+
+class TracingCallbackHandler(BaseCallbackHandler):
+    """Record LangChain chain, retriever, LLM and tool runs as spans.
+
+    Runs nest under their LangChain parent run; top-level runs nest under
+    ``parent``, or the span that is current when the handler is created.
+    """
+
+    def __init__(self, tracer: Optional[Tracer] = None, parent: Optional[Span] = None):
+        self.tracer = tracer or get_tracer()
+        self.root = parent or current_span()
+        self._runs: Dict[UUID, Span] = {}
+        self._lock = threading.Lock()
+
+    def _start(self, kind: str, name: str, run_id: UUID, parent_run_id: Optional[UUID], **attributes: Any) -> None:
+        with self._lock:
+            parent = self._runs.get(parent_run_id) if parent_run_id else None
+            self._runs[run_id] = self.tracer.start_span(
+                f"{kind}.{name}", parent=parent or self.root, kind=kind, **attributes
+            )
+
+    def _end(self, run_id: UUID, error: Optional[BaseException] = None, **attributes: Any) -> None:
+        with self._lock:
+            span = self._runs.pop(run_id, None)
+        if span is not None:
+            span.set(**attributes)
+            self.tracer.finish(span, error=error)
+
+    # Chains
+    def on_chain_start(self, serialized, inputs, *, run_id, parent_run_id=None, **kwargs: Any) -> None:
+        self._start("chain", _run_name(serialized, kwargs, "chain"), run_id, parent_run_id)
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs: Any) -> None:
+        self._end(run_id)
+
+    def on_chain_error(self, error, *, run_id, **kwargs: Any) -> None:
+        self._end(run_id, error=error)
+
+    # Retrievers
+    def on_retriever_start(self, serialized, query, *, run_id, parent_run_id=None, **kwargs: Any) -> None:
+        self._start("retriever", _run_name(serialized, kwargs, "retriever"), run_id, parent_run_id)
+
+    def on_retriever_end(self, documents, *, run_id, **kwargs: Any) -> None:
+        self._end(run_id, documents=len(documents))
+
+    def on_retriever_error(self, error, *, run_id, **kwargs: Any) -> None:
+        self._end(run_id, error=error)
+
+    # LLMs and chat models
+    def on_llm_start(self, serialized, prompts, *, run_id, parent_run_id=None, **kwargs: Any) -> None:
+        self._start("llm", _run_name(serialized, kwargs, "llm"), run_id, parent_run_id,
+                    prompt_chars=sum(len(p) for p in prompts))
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, parent_run_id=None, **kwargs: Any) -> None:
+        chars = sum(len(str(m.content)) for batch in messages for m in batch)
+        self._start("llm", _run_name(serialized, kwargs, "chat_model"), run_id, parent_run_id, prompt_chars=chars)
+
+    def on_llm_new_token(self, token, *, run_id, **kwargs: Any) -> None:
+        span = self._runs.get(run_id)
+        if span is not None:
+            if "ttft" not in span.attributes:
+                span.attributes["ttft"] = time.perf_counter() - span._started
+            span.attributes["streamed_chunks"] = span.attributes.get("streamed_chunks", 0) + 1
+
+    def on_llm_end(self, response, *, run_id, **kwargs: Any) -> None:
+        usage = (response.llm_output or {}).get("token_usage") or {}
+        self._end(run_id, **{key: usage[key] for key in ("prompt_tokens", "completion_tokens", "total_tokens")
+                             if key in usage})
+
+    def on_llm_error(self, error, *, run_id, **kwargs: Any) -> None:
+        self._end(run_id, error=error)
+
+    # Tools
+    def on_tool_start(self, serialized, input_str, *, run_id, parent_run_id=None, **kwargs: Any) -> None:
+        self._start("tool", _run_name(serialized, kwargs, "tool"), run_id, parent_run_id)
+
+    def on_tool_end(self, output, *, run_id, **kwargs: Any) -> None:
+        self._end(run_id)
+
+    def on_tool_error(self, error, *, run_id, **kwargs: Any) -> None:
+        self._end(run_id, error=error)
+
+
+# ---------------------------------------------------------------------------
+# Streamlit debug panel
+# ---------------------------------------------------------------------------
+
+
+def render_debug_panel(trace_id: Optional[str], tracer: Optional[Tracer] = None,
+                       title: str = "🔬 Trace") -> None:
+    """Show the spans of one trace as an indented table of per-stage timings."""
+    import streamlit as st
+
+    spans = (tracer or get_tracer()).spans(trace_id) if trace_id else []
+    with st.expander(title, expanded=False):
+        if not spans:
+            st.caption("No trace recorded yet.")
+            return
+        by_id = {span.span_id: span for span in spans}
+
+        def depth(span: Span) -> int:
+            level = 0
+            while span.parent_id in by_id:
+                span = by_id[span.parent_id]
+                level += 1
+            return level
+
+        rows = []
+        for span in sorted(spans, key=lambda s: s.start):
+            rows.append({
+                "stage": " " * depth(span) + span.name,
+                "ms": round((span.duration or 0.0) * 1000, 1),
+                "details": ", ".join(f"{k}={v}" for k, v in span.attributes.items() if k != "kind"),
+                "error": span.error or "",
+            })
+        st.dataframe(rows, use_container_width=True, hide_index=True)
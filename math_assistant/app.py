@@ -4,37 +4,29 @@ import streamlit as st
 from dotenv import load_dotenv
 from PIL import Image
 
-# LangChain & SymPy Tools
-from langchain.agents import initialize_agent, AgentType
-from sympy_tools import sympy_derivative_tool, sympy_integral_tool
-from transformers import pipeline, AutoTokenizer, AutoModelForCausalLM
-from langchain_groq import ChatGroq
+# LLM, LangChain agent with SymPy tools, OCR cache
+import math_pipeline
 
-# LaTeX-OCR (pix2tex)
-from pix2tex.cli import LatexOCR
+# Lazily loaded, process-wide models (LaTeX-OCR, DeepSeek)
+from model_registry import get_registry
+
+# Per-stage spans of agent steps, LLM calls and SymPy tools
+import common_path  # noqa: F401
+from tracing import render_debug_panel
 
 # --- Load environment variables ---
 load_dotenv()
-hf_token = os.getenv("HF_TOKEN")
 groq_api_key = os.getenv("GROQ_API_KEY")
 
-# --- Initialize LaTeX-OCR model ---
-ocr_model = LatexOCR()
-
-def extract_latex_from_image(image):
-    return ocr_model(image)
+registry = get_registry()
 
-# --- Hugging Face model wrapper ---
-class HFLLM:
-    def __init__(self):
-        model_id = "deepseek-ai/deepseek-llm-7b-base"
-        self.tokenizer = AutoTokenizer.from_pretrained(model_id, token=hf_token)
-        self.model = AutoModelForCausalLM.from_pretrained(model_id, token=hf_token)
-        self.pipe = pipeline("text-generation", model=self.model, tokenizer=self.tokenizer, max_new_tokens=200)
+# --- LaTeX-OCR (loaded on first image, results cached by image hash) ---
+@st.cache_resource
+def get_ocr_cache():
+    return math_pipeline.make_ocr_cache(registry)
 
-    def __call__(self, prompt, stop=None):
-        result = self.pipe(prompt)[0]['generated_text']
-        return result[len(prompt):]
+def extract_latex_from_images(uploads):
+    return get_ocr_cache().extract_many(uploads)
 
 # --- Streamlit UI ---
 st.title("🧠 Math Assistant with LLaMA3 + LaTeX-OCR")
@@ -43,47 +35,61 @@ model_option = st.radio("Choose Model Backend", ["Groq (LLaMA3 8B)", "HuggingFac
 
 # LLM initialization
 if model_option == "Groq (LLaMA3 8B)":
-    llm = ChatGroq(temperature=0, model_name="llama3-8b-8192")
+    llm = math_pipeline.make_llm(math_pipeline.GROQ)
     st.success("✅ Using LLaMA3 8B via Groq")
 else:
-    llm = HFLLM()
+    with st.spinner("Loading DeepSeek 7B (first use only)..."):
+        llm = math_pipeline.make_llm(math_pipeline.HF, registry)
     st.success("✅ Using DeepSeek 7B via Hugging Face")
 
 # LangChain Agent setup
-tools = [sympy_derivative_tool, sympy_integral_tool]
-agent = initialize_agent(
-    tools=tools,
-    llm=llm,
-    agent=AgentType.ZERO_SHOT_REACT_DESCRIPTION,
-    verbose=True,
-    handle_parsing_errors=True
-)
+agent = math_pipeline.build_agent(llm)
+show_trace = st.toggle("🔬 Show trace", value=False)
 
 # Input method
 query_mode = st.radio("Select Input Type", ["Text", "Image"])
-query = ""
+queries = []
 
 if query_mode == "Text":
-    query = st.text_input("🔢 Enter a math expression (e.g., 'differentiate sin(x)*x^2')")
+    queries = [st.text_input("🔢 Enter a math expression (e.g., 'differentiate sin(x)*x^2')")]
 else:
-    uploaded_image = st.file_uploader("📤 Upload a math image", type=["jpg", "jpeg", "png"])
-    if uploaded_image:
-        image = Image.open(uploaded_image)
-        st.image(image, caption="🖼 Uploaded Image", use_column_width=True)
+    uploaded_images = st.file_uploader(
+        "📤 Upload math images", type=["jpg", "jpeg", "png"], accept_multiple_files=True
+    )
+    if uploaded_images:
+        for uploaded_image in uploaded_images:
+            st.image(Image.open(uploaded_image), caption=f"🖼 {uploaded_image.name}", use_column_width=True)
         try:
             with st.spinner("🤖 Running LaTeX-OCR..."):
-                query = extract_latex_from_image(image)
-            st.info(f"🧾 Extracted LaTeX: `{query.strip()}`")
-            st.latex(query.strip())
+                queries = extract_latex_from_images([f.getvalue() for f in uploaded_images])
+            for query in queries:
+                st.info(f"🧾 Extracted LaTeX: `{query.strip()}`")
+                st.latex(query.strip())
         except Exception as e:
             st.error(f"❌ OCR failed: {str(e)}")
 
 # Run Agent
-if query.strip():
+queries = [query for query in queries if query.strip()]
+if queries:
+    # One slot per query; several queries (images) are solved concurrently
+    slots = [st.empty() for _ in queries]
     with st.spinner("🧠 Solving..."):
-        try:
-            answer = agent.run(query)
-            st.success("✅ Answer Ready")
-            st.markdown(f"**Response:** {answer}")
-        except Exception as e:
-            st.error(f"❌ LangChain Error: {str(e)}")
+        for index, result in math_pipeline.solve_many(agent, queries):
+            if "error" in result:
+                slots[index].error(f"❌ LangChain Error: {result['error']}")
+            else:
+                slots[index].markdown(f"✅ **Response:** {result['answer']}")
+            if show_trace:
+                render_debug_panel(result["trace_id"], title=f"🔬 Trace: {queries[index].strip()}")
+
+# --- Model load/call timings ---
+with st.sidebar:
+    st.subheader("⏱️ Model Timings")
+    for name, timing in registry.stats().items():
+        if not timing["loaded"]:
+            st.caption(f"{name}: not loaded")
+            continue
+        avg = f"{timing['avg_call_s']:.2f}s" if timing["avg_call_s"] is not None else "n/a"
+        st.caption(f"{name}: cold start {timing['cold_start_s']:.1f}s, {timing['calls']} calls, avg {avg}")
+    ocr_stats = get_ocr_cache().stats()
+    st.caption(f"OCR cache: {ocr_stats['hits']} hits, {ocr_stats['misses']} misses")
@@ -0,0 +1,71 @@
+# cli.py
+"""Headless batch runner for the Math Assistant.
+
+Solve a JSONL file of problems without Streamlit::
+
+    python cli.py problems.jsonl --out answers.jsonl --backend groq --workers 8
+
+Each input line is a JSON object with either ``query`` (text) or ``image``
+(path to a picture of the formula; LaTeX-OCR turns it into the query), or a
+plain line of text. Other fields are copied to the output. Input and output
+default to stdin/stdout (``-``).
+"""
+import argparse
+import json
+import sys
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+import math_pipeline
+
+
+def read_jsonl(path):
+    stream = sys.stdin if path == "-" else open(path, encoding="utf-8")
+    with stream:
+        for line in stream:
+            line = line.strip()
+            if line:
+                yield json.loads(line) if line.startswith("{") else {"query": line}
+
+
+def resolve_images(records, ocr_cache):
+    """Fill in ``query`` from LaTeX-OCR for every record with an ``image``, in one batch."""
+    pending = [record for record in records if not record.get("query") and record.get("image")]
+    if pending:
+        latex = ocr_cache.extract_many([Path(record["image"]).read_bytes() for record in pending])
+        for record, text in zip(pending, latex):
+            record["query"] = text.strip()
+            record["latex"] = text.strip()
+    return records
+
+
+def main(argv=None):
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Math Assistant batch runner")
+    parser.add_argument("input", nargs="?", default="-")
+    parser.add_argument("--out", default="-")
+    parser.add_argument("--backend", choices=[math_pipeline.GROQ, math_pipeline.HF], default=math_pipeline.GROQ)
+    parser.add_argument("--workers", type=int, default=4, help="Problems solved concurrently")
+    parser.add_argument("--verbose", action="store_true", help="Print the agent's reasoning (use with --out)")
+    args = parser.parse_args(argv)
+
+    records = list(read_jsonl(args.input))
+    if any(record.get("image") for record in records):
+        resolve_images(records, math_pipeline.make_ocr_cache())
+    agent = math_pipeline.build_agent(math_pipeline.make_llm(args.backend), verbose=args.verbose)
+
+    out = sys.stdout if args.out == "-" else open(args.out, "w", encoding="utf-8")
+    failures = 0
+    queries = [record.get("query", "") for record in records]
+    for index, result in math_pipeline.solve_many(agent, queries, workers=args.workers):
+        failures += "error" in result
+        out.write(json.dumps({**records[index], **result, "index": index}, ensure_ascii=False) + "\n")
+        out.flush()
+    if out is not sys.stdout:
+        out.close()
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,12 @@
+# common_path.py
+"""Put the repository's shared ``common/`` modules on ``sys.path``.
+
+The apps are plain script directories rather than packages, so modules that
+need ``common/`` import this first (``import common_path  # noqa: F401``).
+"""
+import sys
+from pathlib import Path
+
+COMMON_DIR = str(Path(__file__).resolve().parents[1] / "common")
+if COMMON_DIR not in sys.path:
+    sys.path.append(COMMON_DIR)
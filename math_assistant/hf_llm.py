@@ -0,0 +1,249 @@
+# hf_llm.py
+"""Hugging Face causal-LM backend used as the math agent's local LLM.
+
+Per agent step this backend:
+
+* honours ``stop`` sequences, ending generation as soon as one appears
+  instead of always producing ``max_new_tokens``;
+* returns only the newly generated text (the prompt is never echoed);
+* reuses the KV cache of the previous prompt for the shared prefix, so a
+  ReAct step only pre-fills the tokens appended since the last step;
+* groups prompts that arrive concurrently into one padded batch.
+
+:class:`HFAgentLLM` exposes an :class:`HFLLM` as a LangChain ``LLM`` so it
+can drive the agent; ``stop`` from the agent reaches the batcher unchanged.
+"""
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, List, Optional
+
+import torch
+from langchain.callbacks.manager import CallbackManagerForLLMRun
+from langchain.llms.base import LLM
+from transformers import AutoModelForCausalLM, AutoTokenizer, StoppingCriteria, StoppingCriteriaList
+
+DEFAULT_MODEL_ID = "deepseek-ai/deepseek-llm-7b-base"
+
+_DTYPES = {
+    "auto": "auto",
+    "float32": torch.float32,
+    "float16": torch.float16,
+    "bfloat16": torch.bfloat16,
+}
+
+
+class StopOnSequences(StoppingCriteria):
+    """Stop each row once its generated text contains one of its stop strings."""
+
+    def __init__(self, tokenizer, stops, prompt_length):
+        self.tokenizer = tokenizer
+        self.stops = stops
+        self.prompt_length = prompt_length
+        # Enough trailing tokens to contain the longest stop string.
+        self.window = max((len(s) for row in stops for s in row), default=0) + 8
+
+    def __call__(self, input_ids, scores, **kwargs):
+        done = []
+        for row, stops in zip(input_ids, self.stops):
+            tail = self.tokenizer.decode(row[self.prompt_length:][-self.window:], skip_special_tokens=True)
+            done.append(bool(stops) and any(stop in tail for stop in stops))
+        return torch.tensor(done, dtype=torch.bool, device=input_ids.device)
+
+
+def truncate_at_stop(text, stop):
+    """Cut ``text`` at the earliest occurrence of any stop sequence."""
+    cut = len(text)
+    for s in stop or ():
+        index = text.find(s)
+        if index != -1:
+            cut = min(cut, index)
+    return text[:cut]
+
+
+class HFLLM:
+    """Callable ``prompt -> completion`` around a Hugging Face causal LM.
+
+    Parameters
+    ----------
+    model_id : str
+        Hub id or local path of the checkpoint.
+    dtype : str
+        ``"auto"``, ``"float32"``, ``"float16"``, ``"bfloat16"`` or ``"int8"``.
+        ``"int8"`` loads float32 weights and applies dynamic int8 quantization
+        to the linear layers, which suits CPU inference.
+    low_cpu_mem_usage : bool
+        Load weights shard by shard instead of materialising a random-init
+        copy first, roughly halving peak RAM while loading.
+    max_batch_size : int
+        Most prompts generated together in one padded batch.
+    batch_window : float
+        Seconds to wait for more concurrent prompts before starting a batch.
+    min_prefix_tokens : int
+        Shortest shared prefix worth reusing from the KV cache.
+    """
+
+    def __init__(self, model_id=DEFAULT_MODEL_ID, dtype="auto", low_cpu_mem_usage=True,
+                 max_new_tokens=200, token=None, max_batch_size=8, batch_window=0.01,
+                 min_prefix_tokens=16):
+        token = token or os.getenv("HF_TOKEN")
+        self.model_id = model_id
+        self.max_new_tokens = max_new_tokens
+        self.max_batch_size = max_batch_size
+        self.batch_window = batch_window
+        self.min_prefix_tokens = min_prefix_tokens
+
+        self.tokenizer = AutoTokenizer.from_pretrained(model_id, token=token)
+        self.tokenizer.padding_side = "left"
+        if self.tokenizer.pad_token is None:
+            self.tokenizer.pad_token = self.tokenizer.eos_token
+        self.model = AutoModelForCausalLM.from_pretrained(
+            model_id,
+            token=token,
+            torch_dtype=torch.float32 if dtype == "int8" else _DTYPES[dtype],
+            low_cpu_mem_usage=low_cpu_mem_usage,
+        )
+        if dtype == "int8":
+            self.model = torch.quantization.quantize_dynamic(self.model, {torch.nn.Linear}, dtype=torch.qint8)
+        self.model.eval()
+
+        # KV cache of the last single-prompt generation and the token ids it covers.
+        self._prefix_cache = None
+        self._prefix_ids = None
+        self.prefix_tokens_reused = 0
+
+        self._requests = queue.Queue()
+        self._worker = threading.Thread(target=self._serve, name="hf-llm-batcher", daemon=True)
+        self._worker.start()
+
+    # ------------------------------------------------------------------
+    # Public interface
+    # ------------------------------------------------------------------
+
+    def __call__(self, prompt, stop=None):
+        return self.submit(prompt, stop).result()
+
+    def submit(self, prompt, stop=None):
+        """Queue ``prompt`` for generation; concurrent submissions are batched."""
+        future = Future()
+        self._requests.put((prompt, list(stop or ()), future))
+        return future
+
+    def generate_batch(self, prompts, stop=None):
+        """Generate completions for ``prompts`` concurrently and return them in order."""
+        futures = [self.submit(prompt, stop) for prompt in prompts]
+        return [future.result() for future in futures]
+
+    # ------------------------------------------------------------------
+    # Batching worker
+    # ------------------------------------------------------------------
+
+    def _serve(self):
+        while True:
+            batch = [self._requests.get()]
+            try:
+                while len(batch) < self.max_batch_size:
+                    batch.append(self._requests.get(timeout=self.batch_window))
+            except queue.Empty:
+                pass
+
+            prompts = [prompt for prompt, _, _ in batch]
+            stops = [stop for _, stop, _ in batch]
+            try:
+                if len(batch) == 1:
+                    outputs = [self._generate_with_prefix_cache(prompts[0], stops[0])]
+                else:
+                    outputs = self._generate_padded(prompts, stops)
+            except Exception as exc:  # noqa: BLE001 - delivered to every caller
+                for _, _, future in batch:
+                    future.set_exception(exc)
+                continue
+            for (_, _, future), output in zip(batch, outputs):
+                future.set_result(output)
+
+    def _generation_kwargs(self, stops, prompt_length):
+        return dict(
+            max_new_tokens=self.max_new_tokens,
+            do_sample=False,
+            pad_token_id=self.tokenizer.pad_token_id,
+            stopping_criteria=StoppingCriteriaList([StopOnSequences(self.tokenizer, stops, prompt_length)]),
+        )
+
+    def _decode_new(self, sequence, prompt_length, stop):
+        text = self.tokenizer.decode(sequence[prompt_length:], skip_special_tokens=True)
+        return truncate_at_stop(text, stop)
+
+    @torch.inference_mode()
+    def _generate_padded(self, prompts, stops):
+        inputs = self.tokenizer(prompts, return_tensors="pt", padding=True)
+        prompt_length = inputs["input_ids"].shape[1]
+        sequences = self.model.generate(**inputs, **self._generation_kwargs(stops, prompt_length))
+        return [self._decode_new(seq, prompt_length, stop) for seq, stop in zip(sequences, stops)]
+
+    @torch.inference_mode()
+    def _generate_with_prefix_cache(self, prompt, stop):
+        input_ids = self.tokenizer(prompt, return_tensors="pt")["input_ids"]
+        prompt_length = input_ids.shape[1]
+
+        past = None
+        reused = self._shared_prefix_length(input_ids[0])
+        if reused >= self.min_prefix_tokens:
+            past = self._prefix_cache
+            past.crop(reused)
+        self.prefix_tokens_reused = reused if past is not None else 0
+        self._prefix_cache = self._prefix_ids = None
+
+        output = self.model.generate(
+            input_ids=input_ids,
+            attention_mask=torch.ones_like(input_ids),
+            past_key_values=past,
+            return_dict_in_generate=True,
+            **self._generation_kwargs([stop], prompt_length),
+        )
+        cache = output.past_key_values
+        if hasattr(cache, "crop"):
+            self._prefix_cache = cache
+            self._prefix_ids = output.sequences[0, :cache.get_seq_length()]
+        return self._decode_new(output.sequences[0], prompt_length, stop)
+
+    def _shared_prefix_length(self, input_ids):
+        if self._prefix_ids is None:
+            return 0
+        # Leave at least one prompt token uncached so generate has an input to run on.
+        n = min(len(self._prefix_ids), len(input_ids) - 1)
+        if n <= 0:
+            return 0
+        mismatch = (self._prefix_ids[:n] != input_ids[:n]).nonzero()
+        return int(mismatch[0]) if len(mismatch) else n
+
+
+class HFAgentLLM(LLM):
+    """LangChain ``LLM`` backed by a shared :class:`HFLLM`.
+
+    ``initialize_agent`` only accepts LangChain runnables, so the registry
+    hands this wrapper to the agent. Calls go through :meth:`HFLLM.submit`,
+    so concurrent agent steps are still batched. ``record_call`` receives
+    the seconds spent in each call (the registry's timings).
+    """
+
+    engine: Any
+    record_call: Optional[Callable[[float], None]] = None
+
+    @property
+    def _llm_type(self) -> str:
+        return "hf-local"
+
+    @property
+    def _identifying_params(self):
+        return {"model_id": getattr(self.engine, "model_id", None)}
+
+    def _call(self, prompt: str, stop: Optional[List[str]] = None,
+              run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> str:
+        start = time.perf_counter()
+        try:
+            return self.engine.submit(prompt, stop).result()
+        finally:
+            if self.record_call is not None:
+                self.record_call(time.perf_counter() - start)
@@ -0,0 +1,79 @@
+# math_pipeline.py
+"""Streamlit-free entry points for the Math Assistant.
+
+``app.py`` and the headless ``cli.py`` both build the LLM, the agent and the
+OCR cache through these functions, so a batch job solves problems exactly
+the way the UI does.
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from langchain.agents import AgentType, initialize_agent
+
+from model_registry import get_registry
+from ocr_cache import OCRCache
+from sympy_tools import sympy_derivative_tool, sympy_integral_tool
+
+import common_path  # noqa: F401
+from chat_model import PooledChatModel
+from tracing import TracingCallbackHandler, get_tracer
+
+GROQ = "groq"
+HF = "hf"
+GROQ_MODEL_NAME = "llama3-8b-8192"
+
+
+def make_llm(backend=GROQ, registry=None):
+    """Return the agent LLM: LLaMA3 via Groq, or the registry's shared HF model.
+
+    The Groq model goes through the shared LLM client; ``LLM_MODEL`` overrides
+    the model and ``LLM_RPM``/``LLM_TPM`` set the rate limits.
+    """
+    if backend == HF:
+        return (registry or get_registry()).get("hf_llm")
+    return PooledChatModel.from_env(GROQ_MODEL_NAME, temperature=0)
+
+
+def build_agent(llm, verbose=True):
+    return initialize_agent(
+        tools=[sympy_derivative_tool, sympy_integral_tool],
+        llm=llm,
+        agent=AgentType.ZERO_SHOT_REACT_DESCRIPTION,
+        verbose=verbose,
+        handle_parsing_errors=True,
+    )
+
+
+def make_ocr_cache(registry=None):
+    registry = registry or get_registry()
+    return OCRCache(lambda: registry.get("latex_ocr"))
+
+
+def solve(agent, query):
+    """Run the agent on one query and return a JSON-serialisable result.
+
+    Agent steps, LLM calls and SymPy tool calls are traced under one
+    ``math.solve`` span whose ``trace_id`` is part of the result.
+    """
+    started = time.perf_counter()
+    with get_tracer().span("math.solve") as root:
+        result = {"query": query, "trace_id": root.trace_id}
+        try:
+            result["answer"] = agent.run(query, callbacks=[TracingCallbackHandler()])
+        except Exception as e:  # noqa: BLE001 - reported per query
+            root.error = str(e)
+            result["error"] = str(e)
+    result["seconds"] = time.perf_counter() - started
+    return result
+
+
+def solve_many(agent, queries, workers=4):
+    """Solve ``queries`` on a thread pool, yielding ``(index, result)`` as each finishes.
+
+    The ReAct agent keeps no state between runs, so one instance is shared.
+    With the HF backend, concurrent agent steps are batched by ``HFLLM``.
+    """
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(solve, agent, query): index for index, query in enumerate(queries)}
+        for future in as_completed(futures):
+            yield futures[future], future.result()
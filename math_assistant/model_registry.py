@@ -0,0 +1,130 @@
+# model_registry.py
+"""Process-wide registry of lazily loaded models.
+
+Streamlit re-runs ``app.py`` on every interaction and each browser session
+gets its own script run, but imported modules are loaded once per process.
+Keeping the models here means LaTeX-OCR and the DeepSeek weights are loaded
+on first use only and then shared by every session.
+"""
+import os
+import threading
+import time
+
+
+class TimedModel:
+    """Transparent proxy that records the latency of every call to the model."""
+
+    def __init__(self, model, record):
+        self._model = model
+        self._record = record
+
+    def __call__(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return self._model(*args, **kwargs)
+        finally:
+            self._record(time.perf_counter() - start)
+
+    def __getattr__(self, name):
+        return getattr(self._model, name)
+
+
+class ModelRegistry:
+    """Load each registered model on first :meth:`get` and share it afterwards.
+
+    Models are wrapped in :class:`TimedModel`, except those with a
+    ``record_call`` hook (LangChain models, which must stay runnables); the
+    hook is pointed at the registry's timings instead.
+    """
+
+    def __init__(self):
+        self._factories = {}
+        self._models = {}
+        self._locks = {}
+        self._timings = {}
+        self._lock = threading.Lock()
+
+    def register(self, name, factory):
+        """Register ``factory`` (a zero-argument callable) under ``name``."""
+        with self._lock:
+            self._factories[name] = factory
+            self._locks[name] = threading.Lock()
+            self._timings[name] = {"cold_start_s": None, "calls": 0, "total_call_s": 0.0, "last_call_s": None}
+
+    def get(self, name):
+        """Return the shared instance, loading it under a per-model lock on first use."""
+        model = self._models.get(name)
+        if model is not None:
+            return model
+        with self._locks[name]:
+            if name not in self._models:
+                start = time.perf_counter()
+                instance = self._factories[name]()
+                self._timings[name]["cold_start_s"] = time.perf_counter() - start
+                record = lambda seconds, name=name: self._record(name, seconds)  # noqa: E731
+                if hasattr(instance, "record_call"):
+                    instance.record_call = record
+                    self._models[name] = instance
+                else:
+                    self._models[name] = TimedModel(instance, record)
+        return self._models[name]
+
+    def _record(self, name, seconds):
+        with self._lock:
+            timings = self._timings[name]
+            timings["calls"] += 1
+            timings["total_call_s"] += seconds
+            timings["last_call_s"] = seconds
+
+    def is_loaded(self, name):
+        return name in self._models
+
+    def unload(self, name):
+        with self._locks[name]:
+            self._models.pop(name, None)
+
+    def stats(self):
+        """Cold-start and warm-call timings per model."""
+        with self._lock:
+            report = {}
+            for name, timings in self._timings.items():
+                calls = timings["calls"]
+                report[name] = {
+                    "loaded": name in self._models,
+                    "cold_start_s": timings["cold_start_s"],
+                    "calls": calls,
+                    "avg_call_s": timings["total_call_s"] / calls if calls else None,
+                    "last_call_s": timings["last_call_s"],
+                }
+            return report
+
+
+def _load_latex_ocr():
+    from pix2tex.cli import LatexOCR
+
+    return LatexOCR()
+
+
+def _load_hf_llm():
+    from hf_llm import DEFAULT_MODEL_ID, HFLLM, HFAgentLLM
+
+    return HFAgentLLM(engine=HFLLM(
+        model_id=os.getenv("HF_MODEL_ID", DEFAULT_MODEL_ID),
+        dtype=os.getenv("HF_TORCH_DTYPE", "auto"),
+        low_cpu_mem_usage=os.getenv("HF_LOW_CPU_MEM_USAGE", "1") != "0",
+    ))
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_registry():
+    """Return the process-wide registry with the app's default models registered."""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = ModelRegistry()
+            _registry.register("latex_ocr", _load_latex_ocr)
+            _registry.register("hf_llm", _load_hf_llm)
+    return _registry
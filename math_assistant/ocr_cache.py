@@ -0,0 +1,160 @@
+# ocr_cache.py
+"""Cached, preprocessed and batched LaTeX-OCR.
+
+Streamlit re-runs the script on every widget interaction, which used to send
+the same uploaded image through LaTeX-OCR again and again. Results here are
+keyed by the SHA-256 of the uploaded bytes, so an identical upload is
+answered from memory. Cache misses are downsampled and cropped to their
+content before reaching the model (large phone photos dominated OCR time),
+and several new images go through the model in one batched forward pass.
+"""
+import hashlib
+import io
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from PIL import Image, ImageOps
+
+
+def image_digest(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def preprocess_image(image, max_side=1024, crop=True, margin=16, threshold=60):
+    """Crop ``image`` to its dark content and downsample its longest side to ``max_side``."""
+    image = ImageOps.exif_transpose(image).convert("L")
+    if crop:
+        # Ink is darker than the page: invert, threshold and take the bounding box.
+        mask = ImageOps.autocontrast(ImageOps.invert(image)).point(lambda p: 255 if p > threshold else 0)
+        box = mask.getbbox()
+        if box is not None:
+            left, top, right, bottom = box
+            image = image.crop((max(left - margin, 0), max(top - margin, 0),
+                                min(right + margin, image.width), min(bottom + margin, image.height)))
+    if max(image.size) > max_side:
+        image.thumbnail((max_side, max_side), Image.Resampling.LANCZOS)
+    return image.convert("RGB")
+
+
+def _model_input(ocr, img):
+    """Return the image ``LatexOCR.__call__`` would decode, after its ResNet resizer."""
+    import torch
+    from pix2tex.cli import minmax_size
+    from pix2tex.dataset.transforms import test_transform
+    from pix2tex.utils import pad
+
+    args = ocr.args
+    img = minmax_size(pad(img), args.max_dimensions, args.min_dimensions)
+    if ocr.image_resizer is None or args.no_resize:
+        return pad(img).convert("RGB")
+
+    # The resizer predicts the width the decoder reads best; iterate until it agrees.
+    source = img.convert("RGB").copy()
+    ratio, width, height = 1, source.size[0], source.size[1]
+    with torch.no_grad():
+        for _ in range(10):
+            height = int(height * ratio)
+            resample = Image.Resampling.BILINEAR if ratio > 1 else Image.Resampling.LANCZOS
+            img = pad(minmax_size(source.resize((width, height), resample), args.max_dimensions, args.min_dimensions))
+            tensor = test_transform(image=np.array(img.convert("RGB")))["image"][:1].unsqueeze(0)
+            width = (ocr.image_resizer(tensor.to(args.device)).argmax(-1).item() + 1) * 32
+            if width == img.size[0]:
+                break
+            ratio = width / img.size[0]
+    return img.convert("RGB")
+
+
+def batch_latex_ocr(ocr, images):
+    """Run pix2tex ``LatexOCR`` on several images in a single forward pass.
+
+    Mirrors ``LatexOCR.__call__``: each image first goes through the ResNet
+    resizer on its own (a small model), then every image is padded onto a
+    common white canvas so the decoder runs once for the whole batch.
+    """
+    if len(images) == 1:
+        return [ocr(images[0])]
+
+    import torch
+    from pix2tex.dataset.transforms import test_transform
+    from pix2tex.utils import post_process, token2str
+
+    args = ocr.args
+    prepared = [_model_input(ocr, img) for img in images]
+    width = max(img.width for img in prepared)
+    height = max(img.height for img in prepared)
+    tensors = []
+    for img in prepared:
+        canvas = Image.new("RGB", (width, height), (255, 255, 255))
+        canvas.paste(img, (0, 0))
+        tensors.append(test_transform(image=np.array(canvas))["image"][:1].unsqueeze(0))
+
+    with torch.no_grad():
+        decoded = ocr.model.generate(torch.cat(tensors).to(args.device),
+                                     temperature=args.get("temperature", .25))
+    return [post_process(text) for text in token2str(decoded, ocr.tokenizer)]
+
+
+class OCRCache:
+    """LRU cache of LaTeX-OCR results keyed by image content hash.
+
+    Parameters
+    ----------
+    load_model : Callable[[], LatexOCR]
+        Returns the (shared) OCR model; only called on a cache miss.
+    max_entries : int
+        Most results kept in memory.
+    max_side : int
+        Longest image side after preprocessing.
+    """
+
+    def __init__(self, load_model, max_entries=512, max_side=1024):
+        self.load_model = load_model
+        self.max_entries = max_entries
+        self.max_side = max_side
+        self.hits = 0
+        self.misses = 0
+        self._results = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _lookup(self, digest):
+        with self._lock:
+            if digest in self._results:
+                self._results.move_to_end(digest)
+                self.hits += 1
+                return self._results[digest]
+            self.misses += 1
+            return None
+
+    def _store(self, digest, latex):
+        with self._lock:
+            self._results[digest] = latex
+            self._results.move_to_end(digest)
+            while len(self._results) > self.max_entries:
+                self._results.popitem(last=False)
+
+    def extract(self, data):
+        """Return the LaTeX for one uploaded image (raw file bytes)."""
+        return self.extract_many([data])[0]
+
+    def extract_many(self, uploads):
+        """Return the LaTeX for each upload, sending only cache misses to the model, in one batch."""
+        digests = [image_digest(data) for data in uploads]
+        results = [self._lookup(digest) for digest in digests]
+
+        pending = {}
+        for index, (digest, result) in enumerate(zip(digests, results)):
+            if result is None:
+                pending.setdefault(digest, []).append(index)
+        if pending:
+            images = [preprocess_image(Image.open(io.BytesIO(uploads[indices[0]])), max_side=self.max_side)
+                      for indices in pending.values()]
+            for (digest, indices), latex in zip(pending.items(), batch_latex_ocr(self.load_model(), images)):
+                self._store(digest, latex)
+                for index in indices:
+                    results[index] = latex
+        return results
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._results), "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,254 @@
+# sympy_engine.py
+"""Shared symbolic engine behind the SymPy tools.
+
+* Expressions are parsed once and results are memoized on the canonical
+  ``srepr`` of the parsed expression, so ``x**2*sin(x)`` and ``sin(x)*x**2``
+  share a cache entry. The cache is a bounded LRU.
+* ``integrate`` runs in a small pool of worker processes with a per-call
+  timeout. A worker that overruns is killed and replaced, and the caller gets
+  a structured ``{"status": "timeout", ...}`` result instead of a hung
+  Streamlit worker.
+* Batch helpers differentiate or integrate many expressions in one call, and
+  :meth:`SymbolicEngine.evaluate` tabulates an expression over an array of
+  points through a cached ``lambdify`` to vectorized NumPy.
+"""
+from __future__ import annotations
+
+import atexit
+import multiprocessing as mp
+import queue
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from sympy import Symbol, diff, integrate, lambdify, latex, srepr, sympify
+
+import common_path  # noqa: F401
+from tracing import get_tracer
+
+X = Symbol("x")
+
+
+@lru_cache(maxsize=1024)
+def parse(expr_str: str):
+    """Parse ``expr_str`` with ``sympify``; repeated strings are parsed once."""
+    return sympify(expr_str)
+
+
+@lru_cache(maxsize=256)
+def _numeric(expr_str: str) -> Callable[[np.ndarray], np.ndarray]:
+    return lambdify(X, parse(expr_str), modules="numpy")
+
+
+def _worker_loop(conn) -> None:
+    """Worker process: receive ``srepr`` strings, reply with the integral."""
+    while True:
+        try:
+            canonical = conn.recv()
+        except EOFError:
+            return
+        try:
+            result = integrate(sympify(canonical), X)
+            conn.send(("ok", str(result), latex(result)))
+        except Exception as exc:  # noqa: BLE001 - reported to the caller
+            conn.send(("error", f"{type(exc).__name__}: {exc}", ""))
+
+
+class _Worker:
+    def __init__(self, ctx):
+        self.conn, child = ctx.Pipe()
+        self.process = ctx.Process(target=_worker_loop, args=(child,), daemon=True)
+        self.process.start()
+        child.close()
+
+    def kill(self) -> None:
+        self.process.kill()
+        self.process.join()
+        self.conn.close()
+
+
+class SymbolicEngine:
+    """Memoized derivative/integral engine with timeout-bounded integration.
+
+    Parameters
+    ----------
+    cache_size : int
+        Maximum number of memoized results.
+    timeout : float
+        Default seconds allowed for one ``integrate`` call.
+    workers : int
+        Number of integration worker processes (started lazily).
+    """
+
+    def __init__(self, cache_size: int = 512, timeout: float = 10.0, workers: int = 2):
+        self.cache_size = cache_size
+        self.timeout = timeout
+        self.workers = workers
+        self.hits = 0
+        self.misses = 0
+        self._cache: "OrderedDict[Tuple[str, str], Dict[str, str]]" = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._ctx = mp.get_context("spawn")
+        self._idle: "queue.LifoQueue[Optional[_Worker]]" = queue.LifoQueue()
+        for _ in range(workers):
+            self._idle.put(None)  # placeholder, spawned on first use
+
+    # ------------------------------------------------------------------
+    # Memoization
+    # ------------------------------------------------------------------
+
+    def canonical(self, expr_str: str) -> str:
+        return srepr(parse(expr_str))
+
+    def _cached(self, key: Tuple[str, str]) -> Optional[Dict[str, str]]:
+        with self._cache_lock:
+            result = self._cache.get(key)
+            if result is None:
+                self.misses += 1
+                return None
+            self._cache.move_to_end(key)
+            self.hits += 1
+            return dict(result)
+
+    def _remember(self, key: Tuple[str, str], result: Dict[str, str]) -> None:
+        with self._cache_lock:
+            self._cache[key] = dict(result)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    # ------------------------------------------------------------------
+    # Operations
+    # ------------------------------------------------------------------
+
+    def derivative(self, expr_str: str) -> Dict[str, str]:
+        with get_tracer().span("sympy.derivative") as span:
+            key = ("derivative", self.canonical(expr_str))
+            result = self._cached(key)
+            span.set(cache_hit=result is not None)
+            if result is None:
+                deriv = diff(parse(expr_str), X)
+                result = {"status": "ok", "derivative": str(deriv), "latex": latex(deriv)}
+                self._remember(key, result)
+            return result
+
+    def integral(self, expr_str: str, timeout: Optional[float] = None) -> Dict[str, str]:
+        """Integrate with respect to ``x`` in a worker process.
+
+        Returns ``{"status": "timeout", ...}`` if the worker does not answer
+        within ``timeout`` seconds; the worker is killed and replaced.
+        """
+        with get_tracer().span("sympy.integral") as span:
+            result = self._integral(expr_str, timeout, span)
+            span.set(status=result["status"])
+            return result
+
+    def _integral(self, expr_str: str, timeout: Optional[float], span) -> Dict[str, str]:
+        canonical = self.canonical(expr_str)
+        key = ("integral", canonical)
+        result = self._cached(key)
+        span.set(cache_hit=result is not None)
+        if result is not None:
+            return result
+
+        timeout = self.timeout if timeout is None else timeout
+        worker = self._idle.get() or _Worker(self._ctx)
+        try:
+            worker.conn.send(canonical)
+            if not worker.conn.poll(timeout):
+                worker.kill()
+                worker = None
+                return {
+                    "status": "timeout",
+                    "expression": expr_str,
+                    "timeout": str(timeout),
+                    "error": f"Integration did not finish within {timeout:g}s",
+                }
+            status, value, tex = worker.conn.recv()
+        except (EOFError, OSError):
+            worker.kill()
+            worker = None
+            raise
+        finally:
+            self._idle.put(worker)
+
+        if status != "ok":
+            raise ValueError(value)
+        result = {"status": "ok", "integral": value, "latex": tex}
+        self._remember(key, result)
+        return result
+
+    # ------------------------------------------------------------------
+    # Batch and numeric evaluation
+    # ------------------------------------------------------------------
+
+    def derivative_many(self, expressions: Sequence[str]) -> List[Dict[str, str]]:
+        return [self.derivative(expr_str) for expr_str in expressions]
+
+    def integral_many(self, expressions: Sequence[str], timeout: Optional[float] = None) -> List[Dict[str, str]]:
+        """Integrate ``expressions`` across all worker processes at once.
+
+        Each expression gets its own ``timeout``; failures are reported as
+        ``{"status": "error", ...}`` entries instead of aborting the batch.
+        """
+
+        def _one(expr_str: str) -> Dict[str, str]:
+            try:
+                return self.integral(expr_str, timeout=timeout)
+            except Exception as exc:  # noqa: BLE001 - reported per expression
+                return {"status": "error", "expression": expr_str, "error": str(exc)}
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            return list(pool.map(_one, expressions))
+
+    def evaluate(self, expr_str: str, points, operation: Optional[str] = None) -> np.ndarray:
+        """Evaluate ``expr_str`` (or its ``"derivative"``/``"integral"``) at ``points``.
+
+        The expression is compiled once with ``lambdify`` and applied to the
+        whole NumPy array, so a million points cost one vectorized call.
+        """
+        if operation == "derivative":
+            expr_str = self.derivative(expr_str)["derivative"]
+        elif operation == "integral":
+            result = self.integral(expr_str)
+            if result["status"] != "ok":
+                raise TimeoutError(result["error"])
+            expr_str = result["integral"]
+        elif operation is not None:
+            raise ValueError(f"Unknown operation: {operation!r}")
+
+        points = np.asarray(points, dtype=float)
+        values = _numeric(expr_str)(points)
+        # Constant expressions come back as scalars.
+        return np.broadcast_to(values, points.shape)
+
+    def stats(self) -> Dict[str, int]:
+        with self._cache_lock:
+            return {"entries": len(self._cache), "hits": self.hits, "misses": self.misses}
+
+    def shutdown(self) -> None:
+        while True:
+            try:
+                worker = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            if worker is not None:
+                worker.kill()
+
+
+_engine: Optional[SymbolicEngine] = None
+_engine_lock = threading.Lock()
+
+
+def get_engine() -> SymbolicEngine:
+    """Return the process-wide engine shared by all SymPy tools."""
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = SymbolicEngine()
+            atexit.register(_engine.shutdown)
+    return _engine
+
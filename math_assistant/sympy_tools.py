@@ -1,24 +1,12 @@
 # sympy_tools.py
-from sympy import symbols, diff, integrate, sympify, latex
 from langchain.tools import Tool
+from sympy_engine import get_engine
 
 def compute_derivative(expr_str: str) -> dict:
-    x = symbols("x")
-    expr = sympify(expr_str)
-    deriv = diff(expr, x)
-    return {
-        "derivative": str(deriv),
-        "latex": latex(deriv)
-    }
+    return get_engine().derivative(expr_str)
 
 def compute_integral(expr_str: str) -> dict:
-    x = symbols("x")
-    expr = sympify(expr_str)
-    integral = integrate(expr, x)
-    return {
-        "integral": str(integral),
-        "latex": latex(integral)
-    }
+    return get_engine().integral(expr_str)
 
 sympy_derivative_tool = Tool(
     name="sympy_derivative",
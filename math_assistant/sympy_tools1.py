@@ -1,7 +1,15 @@
 # sympy_tools.py
-from sympy import symbols, diff, integrate, sympify, latex
+import asyncio
+from typing import List, Literal, Optional
+
 from langchain.tools import BaseTool
 from pydantic import BaseModel, Field
+from sympy_engine import get_engine
+
+
+async def _offload(func, *args):
+    # SymPy work is CPU-bound; keep it off the event loop.
+    return await asyncio.get_running_loop().run_in_executor(None, func, *args)
 
 class DerivativeArgs(BaseModel):
     expression: str = Field(..., description="A valid SymPy expression, e.g. 'sin(x)*x**2'")
@@ -14,14 +22,11 @@ class SympyDerivativeTool(BaseTool):
     )
     args_schema: type = DerivativeArgs
 
-    def _run(self, args: DerivativeArgs) -> dict:
-        x = symbols('x')
-        expr = sympify(args.expression)
-        deriv = diff(expr, x)
-        return {"derivative": str(deriv), "latex": latex(deriv)}
+    def _run(self, expression: str) -> dict:
+        return get_engine().derivative(expression)
 
-    async def _arun(self, args: DerivativeArgs) -> dict:
-        raise NotImplementedError
+    async def _arun(self, expression: str) -> dict:
+        return await _offload(get_engine().derivative, expression)
 
 class IntegralArgs(BaseModel):
     expression: str = Field(..., description="A valid SymPy expression, e.g. 'x**3'")
@@ -34,11 +39,51 @@ class SympyIntegralTool(BaseTool):
     )
     args_schema: type = IntegralArgs
 
-    def _run(self, args: IntegralArgs) -> dict:
-        x = symbols('x')
-        expr = sympify(args.expression)
-        integ = integrate(expr, x)
-        return {"integral": str(integ), "latex": latex(integ)}
+    def _run(self, expression: str) -> dict:
+        return get_engine().integral(expression)
+
+    async def _arun(self, expression: str) -> dict:
+        return await _offload(get_engine().integral, expression)
+
+class BatchArgs(BaseModel):
+    expressions: List[str] = Field(..., description="SymPy expressions, e.g. ['x**2', 'sin(x)']")
+    operation: Literal["derivative", "integral"] = Field(..., description="'derivative' or 'integral'")
+
+class SympyBatchTool(BaseTool):
+    name: str = "sympy_batch"
+    description: str = (
+        "Use this to differentiate or integrate several SymPy expressions in one call. "
+        "Returns JSON: {results: [ {derivative|integral: str, latex: str, status: str} ]}."
+    )
+    args_schema: type = BatchArgs
+
+    def _run(self, expressions: List[str], operation: str) -> dict:
+        engine = get_engine()
+        if operation == "derivative":
+            return {"results": engine.derivative_many(expressions)}
+        return {"results": engine.integral_many(expressions)}
+
+    async def _arun(self, expressions: List[str], operation: str) -> dict:
+        return await _offload(self._run, expressions, operation)
+
+class EvaluateArgs(BaseModel):
+    expression: str = Field(..., description="A valid SymPy expression in x, e.g. 'sin(x)*x**2'")
+    points: List[float] = Field(..., description="Values of x to evaluate at")
+    operation: Optional[Literal["derivative", "integral"]] = Field(
+        None, description="Evaluate the derivative or integral instead of the expression itself"
+    )
+
+class SympyEvaluateTool(BaseTool):
+    name: str = "sympy_evaluate"
+    description: str = (
+        "Use this to evaluate a SymPy expression (or its derivative/integral) at many values of x. "
+        "Returns JSON: {points: [float], values: [float]}."
+    )
+    args_schema: type = EvaluateArgs
+
+    def _run(self, expression: str, points: List[float], operation: Optional[str] = None) -> dict:
+        values = get_engine().evaluate(expression, points, operation=operation)
+        return {"points": list(points), "values": values.tolist()}
 
-    async def _arun(self, args: IntegralArgs) -> dict:
-        raise NotImplementedError
+    async def _arun(self, expression: str, points: List[float], operation: Optional[str] = None) -> dict:
+        return await _offload(self._run, expression, points, operation)
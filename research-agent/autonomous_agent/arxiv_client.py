@@ -0,0 +1,187 @@
+"""Connection-pooled arXiv API client with incremental Atom parsing.
+
+Both clients keep one HTTP connection pool for their lifetime, page through
+large result sets, and parse the Atom feed with ``XMLPullParser`` while it
+downloads, yielding each paper as soon as its ``<entry>`` element closes.
+"""
+from __future__ import annotations
+
+import asyncio
+import time
+import xml.etree.ElementTree as ET
+from typing import AsyncIterator, Dict, Iterator, List, Optional
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+ARXIV_API_URL = "http://export.arxiv.org/api/query"
+
+ATOM = "{http://www.w3.org/2005/Atom}"
+OPENSEARCH = "{http://a9.com/-/spec/opensearch/1.1/}"
+
+_CHUNK_SIZE = 16 * 1024
+
+
+def _text(entry: ET.Element, tag: str) -> Optional[str]:
+    el = entry.find(ATOM + tag)
+    if el is None or el.text is None:
+        return None
+    return " ".join(el.text.split())
+
+
+def _entry_to_paper(entry: ET.Element) -> Optional[Dict[str, str]]:
+    title = _text(entry, "title")
+    abstract = _text(entry, "summary")
+    if title is None or abstract is None:
+        return None
+    entry_id = _text(entry, "id") or ""
+    paper = {
+        "id": entry_id.rsplit("/abs/", 1)[-1],
+        "title": title,
+        "abstract": abstract,
+        "published": _text(entry, "published") or "",
+        "authors": ", ".join(
+            " ".join(name.text.split())
+            for name in entry.iterfind(f"{ATOM}author/{ATOM}name")
+            if name.text
+        ),
+        "pdf_url": "",
+    }
+    for link in entry.iterfind(ATOM + "link"):
+        if link.get("title") == "pdf" or link.get("type") == "application/pdf":
+            paper["pdf_url"] = link.get("href", "")
+            break
+    return paper
+
+
+class AtomFeedParser:
+    """Incremental Atom parser: feed bytes, get papers back as entries complete."""
+
+    def __init__(self):
+        self._parser = ET.XMLPullParser(events=("end",))
+        self.total_results: Optional[int] = None
+        self.entries = 0
+
+    def feed(self, data: bytes) -> Iterator[Dict[str, str]]:
+        self._parser.feed(data)
+        yield from self._drain()
+
+    def close(self) -> Iterator[Dict[str, str]]:
+        self._parser.close()
+        yield from self._drain()
+
+    def _drain(self) -> Iterator[Dict[str, str]]:
+        for _, elem in self._parser.read_events():
+            if elem.tag == ATOM + "entry":
+                self.entries += 1
+                paper = _entry_to_paper(elem)
+                elem.clear()
+                if paper is not None:
+                    yield paper
+            elif elem.tag == OPENSEARCH + "totalResults" and elem.text:
+                self.total_results = int(elem.text)
+
+
+def _page_params(query: str, start: int, size: int) -> Dict[str, str]:
+    return {"search_query": f"all:{query}", "start": str(start), "max_results": str(size)}
+
+
+def _more_pages(parser: AtomFeedParser, requested: int, fetched: int, max_results: int) -> bool:
+    if parser.entries < requested:
+        return False
+    if parser.total_results is not None and fetched >= parser.total_results:
+        return False
+    return fetched < max_results
+
+
+class ArxivClient:
+    """Blocking arXiv client backed by a pooled ``requests.Session``.
+
+    Parameters
+    ----------
+    page_size : int
+        Results requested per API call when paging through ``max_results``.
+    page_delay : float
+        Seconds to wait between page requests (arXiv asks for ~3s).
+    pool_size : int
+        Maximum number of pooled keep-alive connections.
+    """
+
+    def __init__(self, base_url: str = ARXIV_API_URL, page_size: int = 100, page_delay: float = 3.0,
+                 pool_size: int = 10, timeout: float = 30.0, retries: int = 3):
+        self.base_url = base_url
+        self.page_size = page_size
+        self.page_delay = page_delay
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=pool_size,
+            pool_maxsize=pool_size,
+            max_retries=Retry(total=retries, backoff_factor=1.0, status_forcelist=(429, 500, 502, 503, 504)),
+        )
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def iter_search(self, query: str, max_results: int = 3) -> Iterator[Dict[str, str]]:
+        """Yield up to ``max_results`` papers, parsing each page while it streams in."""
+        fetched = 0
+        while fetched < max_results:
+            if fetched:
+                time.sleep(self.page_delay)
+            size = min(self.page_size, max_results - fetched)
+            parser = AtomFeedParser()
+            with self.session.get(self.base_url, params=_page_params(query, fetched, size),
+                                  timeout=self.timeout, stream=True) as response:
+                response.raise_for_status()
+                for chunk in response.iter_content(_CHUNK_SIZE):
+                    yield from parser.feed(chunk)
+            yield from parser.close()
+            fetched += parser.entries
+            if not _more_pages(parser, size, fetched, max_results):
+                return
+
+    def close(self) -> None:
+        self.session.close()
+
+
+class AsyncArxivClient:
+    """Async arXiv client backed by a pooled ``httpx.AsyncClient``; see :class:`ArxivClient`."""
+
+    def __init__(self, base_url: str = ARXIV_API_URL, page_size: int = 100, page_delay: float = 3.0,
+                 pool_size: int = 10, timeout: float = 30.0, retries: int = 3):
+        self.base_url = base_url
+        self.page_size = page_size
+        self.page_delay = page_delay
+        self.client = httpx.AsyncClient(
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+            transport=httpx.AsyncHTTPTransport(retries=retries),
+            follow_redirects=True,
+        )
+
+    async def aiter_search(self, query: str, max_results: int = 3) -> AsyncIterator[Dict[str, str]]:
+        fetched = 0
+        while fetched < max_results:
+            if fetched:
+                await asyncio.sleep(self.page_delay)
+            size = min(self.page_size, max_results - fetched)
+            parser = AtomFeedParser()
+            async with self.client.stream("GET", self.base_url,
+                                          params=_page_params(query, fetched, size)) as response:
+                response.raise_for_status()
+                async for chunk in response.aiter_bytes(_CHUNK_SIZE):
+                    for paper in parser.feed(chunk):
+                        yield paper
+            for paper in parser.close():
+                yield paper
+            fetched += parser.entries
+            if not _more_pages(parser, size, fetched, max_results):
+                return
+
+    async def search(self, query: str, max_results: int = 3) -> List[Dict[str, str]]:
+        return [paper async for paper in self.aiter_search(query, max_results)]
+
+    async def aclose(self) -> None:
+        await self.client.aclose()
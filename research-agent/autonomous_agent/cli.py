@@ -0,0 +1,80 @@
+"""Headless batch runner for the research agent.
+
+Search arXiv and summarize the top papers for a JSONL file of topics::
+
+    python cli.py topics.jsonl --out reports.jsonl --workers 4 --num-results 5
+    python cli.py questions.jsonl --deep --num-results 8
+
+Each input line is a JSON object with a ``query`` field (other fields are
+copied to the output) or a plain line of text; each output line holds the
+topic and its papers with summaries. With ``--deep`` every topic goes
+through :mod:`deep_research` instead (full papers, synthesis with
+citations). Input and output default to stdin/stdout (``-``).
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, Iterator, List
+
+from dotenv import load_dotenv
+
+from deep_research import DeepResearchConfig, deep_research
+from research_pipeline import open_cache, research_topic
+from utils import get_llm
+
+
+def read_jsonl(path: str) -> Iterator[Dict[str, Any]]:
+    stream = sys.stdin if path == "-" else open(path, encoding="utf-8")
+    with stream:
+        for line in stream:
+            line = line.strip()
+            if line:
+                yield json.loads(line) if line.startswith("{") else {"query": line}
+
+
+def main(argv: List[str] | None = None) -> int:
+    load_dotenv(Path(__file__).resolve().parent / ".env")
+    parser = argparse.ArgumentParser(description="Research agent batch runner")
+    parser.add_argument("input", nargs="?", default="-")
+    parser.add_argument("--out", default="-")
+    parser.add_argument("--num-results", type=int, default=3, help="Papers per topic")
+    parser.add_argument("--workers", type=int, default=2, help="Topics processed concurrently")
+    parser.add_argument("--llm-concurrency", type=int, default=4, help="Parallel LLM calls per topic")
+    parser.add_argument("--cache", help="Cache file (defaults to RESEARCH_CACHE_PATH)")
+    parser.add_argument("--deep", action="store_true", help="Read full papers and write a synthesis with citations")
+    args = parser.parse_args(argv)
+
+    llm = get_llm()
+    cache = open_cache(args.cache)
+
+    def _run(record: Dict[str, Any]) -> Dict[str, Any]:
+        try:
+            if args.deep:
+                config = DeepResearchConfig(max_papers=args.num_results, llm_concurrency=args.llm_concurrency)
+                report = deep_research(record["query"], llm, cache=cache, config=config)
+            else:
+                report = research_topic(record["query"], llm, cache=cache, max_results=args.num_results,
+                                        max_concurrency=args.llm_concurrency)
+            return {**record, **report}
+        except Exception as exc:  # noqa: BLE001 - reported per topic
+            return {**record, "error": str(exc)}
+
+    out = sys.stdout if args.out == "-" else open(args.out, "w", encoding="utf-8")
+    failures = 0
+    # arXiv searches share one rate-limited client; the pool mostly overlaps LLM calls.
+    with ThreadPoolExecutor(max_workers=args.workers) as pool:
+        for report in pool.map(_run, read_jsonl(args.input)):
+            failures += "error" in report
+            out.write(json.dumps(report, ensure_ascii=False) + "\n")
+            out.flush()
+    if out is not sys.stdout:
+        out.close()
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
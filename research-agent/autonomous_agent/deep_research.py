@@ -0,0 +1,509 @@
+"""Deep research: read full arXiv papers and write a synthesis with citations.
+
+:mod:`research_pipeline` summarizes abstracts. This pipeline reads the
+papers themselves, in stages connected by bounded ``asyncio.Queue`` objects
+so the first summaries appear while later PDFs are still downloading:
+
+1. **plan** -- the LLM expands the question into a few search queries;
+2. **search** -- all queries are searched on arXiv concurrently and papers
+   are deduplicated by their arXiv id without the version suffix;
+3. **download** -- a fixed number of httpx workers fetch the PDFs into a
+   disk cache;
+4. **parse** -- text is extracted and split into sections in a process
+   pool, since pdfplumber is CPU bound;
+5. **summarize** -- every section is summarized (map), then the section
+   summaries are combined into a paper summary aimed at the question
+   (reduce);
+6. **synthesize** -- the paper summaries are merged into one answer that
+   cites papers as ``[n]``.
+
+A paper whose PDF cannot be fetched or parsed falls back to its abstract.
+Searches and summaries go through the :class:`ResearchCache`; section
+summaries do not depend on the question, so they are reused across
+questions.
+"""
+from __future__ import annotations
+
+import asyncio
+import math
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+import httpx
+import pdfplumber
+
+from arxiv_client import ARXIV_API_URL, AsyncArxivClient
+from research_cache import ResearchCache, normalize_query, summary_key
+from utils import get_llm_model_id
+
+import common_path  # noqa: F401
+from tracing import get_tracer
+
+PROJECT_ROOT = Path(__file__).resolve().parent
+DEFAULT_PDF_DIR = PROJECT_ROOT / ".cache" / "pdfs"
+
+# Bump whenever one of the prompts below changes so cached summaries are not reused.
+PROMPT_VERSION = "deep-v1"
+
+EventHandler = Callable[[Dict[str, Any]], None]
+
+PLAN_PROMPT = (
+    "You are planning a literature search on arXiv.\n"
+    "Write up to {n} short search queries (3-8 words each) that together cover the question "
+    "below: its core topic, the main methods and closely related angles. "
+    "One query per line, without numbering or commentary.\n\n"
+    "Question: {question}\n\nQueries:"
+)
+
+SECTION_PROMPT = (
+    "Summarize this section of a research paper in 2-4 sentences. Keep concrete methods, "
+    "datasets, numbers and findings.\n\n"
+    "Paper: {title}\nSection: {section}\n\n{text}\n\nSummary:"
+)
+
+PAPER_PROMPT = (
+    "Combine the notes on a research paper into one summary of 4-6 sentences that explains "
+    "what the paper contributes to the question below, including its method and main results.\n\n"
+    "Question: {question}\nPaper: {title}\n\n{notes}\n\nSummary:"
+)
+
+SYNTHESIS_PROMPT = (
+    "Answer the research question using only the paper summaries below. Write a structured "
+    "synthesis of 3-5 paragraphs: the main approaches, how they compare, and open problems. "
+    "Cite papers by their number in square brackets, e.g. [2] or [1][3]; do not cite anything else.\n\n"
+    "Question: {question}\n\n{papers}\n\nSynthesis:"
+)
+
+
+@dataclass
+class DeepResearchConfig:
+    """Limits of one :class:`DeepResearch` run.
+
+    ``results_per_query`` papers are requested per search query and at most
+    ``max_papers`` distinct papers are read. Each PDF contributes up to
+    ``max_sections`` sections of at most ``section_chars`` characters from
+    its first ``max_pages`` pages.
+    """
+
+    max_queries: int = 4
+    results_per_query: int = 4
+    max_papers: int = 8
+    download_concurrency: int = 4
+    parse_workers: int = 2
+    llm_concurrency: int = 4
+    max_sections: int = 6
+    section_chars: int = 6000
+    max_pages: int = 30
+    max_pdf_bytes: int = 25 * 1024 * 1024
+    pdf_dir: Optional[Path] = None
+    arxiv_url: str = ARXIV_API_URL
+
+    def resolved_pdf_dir(self) -> Path:
+        return Path(self.pdf_dir or os.getenv("RESEARCH_PDF_DIR", DEFAULT_PDF_DIR))
+
+
+# ---------------------------------------------------------------------------
+# Planning and deduplication
+# ---------------------------------------------------------------------------
+
+_VERSION = re.compile(r"v\d+$")
+_LIST_MARKER = re.compile(r"^\s*(?:[-*•]|\d+[.)])\s*")
+
+
+def base_id(paper_id: str) -> str:
+    """arXiv id without its version suffix (``2401.01234v2`` -> ``2401.01234``)."""
+    return _VERSION.sub("", paper_id)
+
+
+def parse_queries(text: str, question: str, max_queries: int = 4) -> List[str]:
+    """Search queries from the planner's reply, starting with ``question`` itself."""
+    queries = [question]
+    seen = {normalize_query(question)}
+    for line in text.splitlines():
+        line = _LIST_MARKER.sub("", line).strip().strip("\"'")
+        if not line or len(line) > 200 or line.endswith(":"):
+            continue
+        key = normalize_query(line)
+        if key not in seen:
+            seen.add(key)
+            queries.append(line)
+    return queries[:max_queries]
+
+
+# ---------------------------------------------------------------------------
+# Sections
+# ---------------------------------------------------------------------------
+
+_NAMED_SECTIONS = frozenset(
+    "abstract|introduction|background|related work|preliminaries|method|methods|methodology|approach|"
+    "model|experiments|experimental setup|evaluation|results|discussion|analysis|conclusion|"
+    "conclusions|limitations|future work".split("|")
+)
+_END_SECTIONS = frozenset(("references", "bibliography", "acknowledgments", "acknowledgements", "appendix"))
+_NUMBERED_HEADING = re.compile(r"^(?:\d{1,2}|[IVX]{1,4})\.?\s+([A-Z][^.!?]{2,60})$")
+
+
+def _heading(line: str) -> Optional[str]:
+    line = line.strip()
+    if not line or len(line) > 70:
+        return None
+    match = _NUMBERED_HEADING.match(line)
+    title = match.group(1).strip() if match else line
+    name = title.lower().rstrip(":")
+    if name in _NAMED_SECTIONS or name in _END_SECTIONS:
+        return title.rstrip(":")
+    if match and len(title.split()) <= 8:
+        return title
+    return None
+
+
+def split_sections(text: str, max_sections: int = 6, section_chars: int = 6000,
+                   min_chars: int = 400) -> List[Tuple[str, str]]:
+    """Split paper text into ``(title, body)`` sections, stopping at the references.
+
+    A section shorter than ``min_chars`` absorbs the one that follows it.
+    Without recognisable headings the text is cut into ``section_chars``
+    parts. When there are more than ``max_sections`` sections, neighbours
+    are grouped so the whole paper is still covered.
+    """
+    raw: List[Tuple[str, List[str]]] = [("Front matter", [])]
+    for line in text.splitlines():
+        heading = _heading(line)
+        if heading is None:
+            raw[-1][1].append(line)
+        elif heading.lower() in _END_SECTIONS:
+            break
+        else:
+            raw.append((heading, []))
+
+    sections: List[Tuple[str, str]] = []
+    for title, lines in raw:
+        body = " ".join(" ".join(lines).split())
+        if not body:
+            continue
+        if sections and len(sections[-1][1]) < min_chars:
+            sections[-1] = (sections[-1][0], f"{sections[-1][1]} {body}")
+        else:
+            sections.append((title, body))
+
+    if len(sections) < 2:
+        body = " ".join(body for _, body in sections)
+        sections = [(f"Part {i + 1}", body[start:start + section_chars])
+                    for i, start in enumerate(range(0, len(body), section_chars))]
+
+    group = math.ceil(len(sections) / max_sections) if sections else 1
+    share = section_chars // group
+    return [
+        (" / ".join(title for title, _ in members), " ".join(body[:share] for _, body in members))
+        for members in (sections[i:i + group] for i in range(0, len(sections), group))
+    ]
+
+
+def extract_sections(path: str, max_pages: int = 30, max_sections: int = 6,
+                     section_chars: int = 6000) -> List[Tuple[str, str]]:
+    """Worker: sections of the first ``max_pages`` pages of the PDF at ``path``."""
+    with pdfplumber.open(path) as pdf:
+        text = "\n".join(page.extract_text() or "" for page in pdf.pages[:max_pages])
+    return split_sections(text, max_sections=max_sections, section_chars=section_chars)
+
+
+# ---------------------------------------------------------------------------
+# Pipeline
+# ---------------------------------------------------------------------------
+
+_DONE = object()
+
+
+async def _stage(inbox: asyncio.Queue, outbox: Optional[asyncio.Queue],
+                 fn: Callable[[Any], Awaitable[Any]], workers: int) -> None:
+    """Run ``workers`` consumers of ``inbox``; results go to ``outbox``, followed by one ``_DONE``."""
+
+    async def worker() -> None:
+        while True:
+            item = await inbox.get()
+            if item is _DONE:
+                await inbox.put(_DONE)  # let the sibling workers stop too
+                return
+            result = await fn(item)
+            if outbox is not None:
+                await outbox.put(result)
+
+    await asyncio.gather(*(worker() for _ in range(max(1, workers))))
+    if outbox is not None:
+        await outbox.put(_DONE)
+
+
+class DeepResearch:
+    """Plan, search, read and synthesize; see the module docstring for the stages.
+
+    Parameters
+    ----------
+    llm : Callable[[str], str]
+        Blocking LLM callable, as returned by :func:`utils.get_llm`; it is
+        called from worker threads, at most ``config.llm_concurrency`` at a time.
+    cache : ResearchCache, optional
+        Cache for searches and summaries.
+    config : DeepResearchConfig, optional
+        Concurrency and size limits.
+    on_event : callable, optional
+        Called on the event loop with ``{"type": ..., ...}`` as work
+        progresses: ``plan``, ``paper`` (found), ``parsed``, ``summary``
+        and ``synthesis``.
+    """
+
+    def __init__(self, llm: Callable[[str], str], cache: Optional[ResearchCache] = None,
+                 config: Optional[DeepResearchConfig] = None, on_event: Optional[EventHandler] = None):
+        self.llm = llm
+        self.cache = cache
+        self.config = config or DeepResearchConfig()
+        self.on_event = on_event
+        self.model_id = get_llm_model_id()
+        self._llm_slots: Optional[asyncio.Semaphore] = None
+
+    def _emit(self, kind: str, **data: Any) -> None:
+        if self.on_event is not None:
+            self.on_event({"type": kind, **data})
+
+    async def _complete(self, prompt: str, key: Optional[str] = None) -> str:
+        if key is not None and self.cache is not None:
+            cached = self.cache.get_summary(key)
+            if cached is not None:
+                return cached["summary"]
+        async with self._llm_slots:
+            # The shared LLM client retries rate limits itself.
+            result = {"summary": (await asyncio.to_thread(self.llm, prompt)).strip()}
+        if key is not None and self.cache is not None:
+            self.cache.put_summary(key, result)
+        return result["summary"]
+
+    # ------------------------------------------------------------------
+    # Stages
+    # ------------------------------------------------------------------
+
+    async def _plan(self, question: str) -> List[str]:
+        with get_tracer().span("research.plan") as span:
+            try:
+                reply = await self._complete(PLAN_PROMPT.format(n=self.config.max_queries, question=question))
+            except Exception as exc:  # noqa: BLE001 - search for the question as asked
+                span.set(error=str(exc))
+                reply = ""
+            queries = parse_queries(reply, question, self.config.max_queries)
+            span.set(queries=len(queries))
+        return queries
+
+    async def _search(self, arxiv: AsyncArxivClient, query: str, found: asyncio.Queue,
+                      papers: List[Dict[str, Any]], seen: Set[str]) -> None:
+        k = self.config.results_per_query
+        with get_tracer().span("research.search_arxiv", max_results=k) as span:
+            cached = self.cache.get_search(query, k) if self.cache is not None else None
+            span.set(cache_hit=cached is not None)
+            results: List[Dict[str, str]] = []
+            try:
+                if cached is not None:
+                    for paper in cached:
+                        await self._add_paper(paper, found, papers, seen)
+                    results = cached
+                else:
+                    # Papers go downstream as soon as their Atom entry is parsed.
+                    async for paper in arxiv.aiter_search(query, max_results=k):
+                        results.append(paper)
+                        await self._add_paper(paper, found, papers, seen)
+                    if self.cache is not None:
+                        self.cache.put_search(query, k, results)
+            except Exception as exc:  # noqa: BLE001 - the other queries still run
+                span.set(error=str(exc))
+            span.set(results=len(results))
+
+    async def _add_paper(self, paper: Dict[str, str], found: asyncio.Queue,
+                         papers: List[Dict[str, Any]], seen: Set[str]) -> None:
+        key = base_id(paper.get("id", "")) or normalize_query(paper["title"])
+        if key in seen or len(papers) >= self.config.max_papers:
+            return
+        seen.add(key)
+        paper = {**paper, "n": len(papers) + 1}
+        papers.append(paper)
+        self._emit("paper", paper=paper)
+        await found.put(paper)
+
+    async def _search_all(self, queries: List[str], found: asyncio.Queue, papers: List[Dict[str, Any]]) -> None:
+        arxiv = AsyncArxivClient(base_url=self.config.arxiv_url)
+        seen: Set[str] = set()
+        try:
+            await asyncio.gather(*(self._search(arxiv, query, found, papers, seen) for query in queries))
+        finally:
+            await arxiv.aclose()
+            await found.put(_DONE)
+
+    async def _download(self, http: httpx.AsyncClient, paper: Dict[str, Any]) -> Dict[str, Any]:
+        pdf_dir = self.config.resolved_pdf_dir()
+        path = pdf_dir / (paper.get("id", "").replace("/", "_") + ".pdf")
+        with get_tracer().span("research.download", paper_id=paper.get("id", "")) as span:
+            if path.is_file() and path.stat().st_size:
+                span.set(cache_hit=True, bytes=path.stat().st_size)
+                paper["pdf_path"] = str(path)
+                return paper
+            partial = path.with_suffix(".part")
+            try:
+                if not paper.get("pdf_url"):
+                    raise ValueError("no PDF link")
+                pdf_dir.mkdir(parents=True, exist_ok=True)
+                size = 0
+                async with http.stream("GET", paper["pdf_url"]) as response:
+                    response.raise_for_status()
+                    with open(partial, "wb") as f:
+                        async for chunk in response.aiter_bytes(64 * 1024):
+                            size += len(chunk)
+                            if size > self.config.max_pdf_bytes:
+                                raise ValueError(f"PDF larger than {self.config.max_pdf_bytes} bytes")
+                            f.write(chunk)
+                partial.replace(path)
+                paper["pdf_path"] = str(path)
+                span.set(cache_hit=False, bytes=size)
+            except Exception as exc:  # noqa: BLE001 - the paper falls back to its abstract
+                partial.unlink(missing_ok=True)
+                paper["pdf_error"] = str(exc)
+                span.set(error=str(exc))
+        return paper
+
+    async def _parse(self, pool: ProcessPoolExecutor, paper: Dict[str, Any]) -> Dict[str, Any]:
+        sections: List[Tuple[str, str]] = []
+        if paper.get("pdf_path"):
+            cfg = self.config
+            with get_tracer().span("research.parse_pdf", paper_id=paper.get("id", "")) as span:
+                try:
+                    sections = await asyncio.get_running_loop().run_in_executor(
+                        pool, extract_sections, paper["pdf_path"], cfg.max_pages, cfg.max_sections,
+                        cfg.section_chars,
+                    )
+                except Exception as exc:  # noqa: BLE001 - the paper falls back to its abstract
+                    paper["pdf_error"] = str(exc)
+                    span.set(error=str(exc))
+                span.set(sections=len(sections))
+        paper["source"] = "pdf" if sections else "abstract"
+        paper["_sections"] = sections
+        self._emit("parsed", paper=paper)
+        return paper
+
+    async def _summarize_section(self, paper: Dict[str, Any], title: str, body: str) -> str:
+        key = summary_key(f"{paper.get('id', '')}#{title}", body, self.model_id, PROMPT_VERSION)
+        return await self._complete(SECTION_PROMPT.format(title=paper["title"], section=title, text=body), key)
+
+    async def _summarize(self, question: str, paper: Dict[str, Any]) -> Dict[str, Any]:
+        sections = paper.pop("_sections", [])
+        with get_tracer().span("research.paper_summary", paper_id=paper.get("id", ""),
+                               sections=len(sections)) as span:
+            try:
+                if sections:
+                    # Map: sections are summarized concurrently, within the LLM limit.
+                    summaries = await asyncio.gather(
+                        *(self._summarize_section(paper, title, body) for title, body in sections)
+                    )
+                    paper["sections"] = [{"section": title, "summary": summary}
+                                         for (title, _), summary in zip(sections, summaries)]
+                    notes = "\n".join(f"- {title}: {summary}" for (title, _), summary in zip(sections, summaries))
+                else:
+                    notes = f"Abstract: {paper['abstract']}"
+                # Reduce: one summary aimed at the question.
+                key = summary_key(f"{paper.get('id', '')}|{normalize_query(question)}", notes, self.model_id,
+                                  PROMPT_VERSION)
+                paper["summary"] = await self._complete(
+                    PAPER_PROMPT.format(question=question, title=paper["title"], notes=notes), key
+                )
+            except Exception as exc:  # noqa: BLE001 - reported per paper
+                paper["summary"] = ""
+                paper["error"] = str(exc)
+                span.set(error=str(exc))
+        self._emit("summary", paper=paper)
+        return paper
+
+    async def _synthesize(self, question: str, papers: List[Dict[str, Any]]) -> str:
+        if not papers:
+            return ""
+        listing = "\n\n".join(
+            f"[{paper['n']}] {paper['title']} ({paper.get('authors', '')}, {paper.get('published', '')[:4]})\n"
+            f"{paper['summary']}"
+            for paper in papers
+        )
+        with get_tracer().span("research.synthesize", papers=len(papers)):
+            key = summary_key(f"synthesis|{normalize_query(question)}", listing, self.model_id, PROMPT_VERSION)
+            return await self._complete(SYNTHESIS_PROMPT.format(question=question, papers=listing), key)
+
+    # ------------------------------------------------------------------
+    # Run
+    # ------------------------------------------------------------------
+
+    async def run(self, question: str) -> Dict[str, Any]:
+        """Research ``question``; return a JSON-serialisable report."""
+        cfg = self.config
+        self._llm_slots = asyncio.Semaphore(cfg.llm_concurrency)
+        started = time.perf_counter()
+        first_summary: List[float] = []
+        papers: List[Dict[str, Any]] = []
+
+        async def summarize(paper: Dict[str, Any]) -> Dict[str, Any]:
+            paper = await self._summarize(question, paper)
+            if not first_summary and paper.get("summary"):
+                first_summary.append(time.perf_counter() - started)
+            return paper
+
+        with get_tracer().span("research.deep", max_papers=cfg.max_papers) as root:
+            queries = await self._plan(question)
+            self._emit("plan", queries=queries)
+
+            # Bounded queues: a slow stage holds back the ones feeding it.
+            found: asyncio.Queue = asyncio.Queue(maxsize=2 * cfg.download_concurrency)
+            downloaded: asyncio.Queue = asyncio.Queue(maxsize=2 * cfg.parse_workers)
+            parsed: asyncio.Queue = asyncio.Queue(maxsize=2 * cfg.llm_concurrency)
+            async with httpx.AsyncClient(
+                timeout=60.0,
+                limits=httpx.Limits(max_connections=cfg.download_concurrency),
+                follow_redirects=True,
+            ) as http:
+                with ProcessPoolExecutor(max_workers=cfg.parse_workers) as pool:
+                    await asyncio.gather(
+                        self._search_all(queries, found, papers),
+                        _stage(found, downloaded, lambda paper: self._download(http, paper),
+                               cfg.download_concurrency),
+                        _stage(downloaded, parsed, lambda paper: self._parse(pool, paper), cfg.parse_workers),
+                        _stage(parsed, None, summarize, cfg.llm_concurrency),
+                    )
+
+            summarized = [paper for paper in papers if paper.get("summary")]
+            try:
+                synthesis = await self._synthesize(question, summarized)
+                error = None
+            except Exception as exc:  # noqa: BLE001 - the paper summaries are still returned
+                synthesis, error = "", str(exc)
+            references = [
+                {"n": paper["n"], "id": paper.get("id", ""), "title": paper["title"],
+                 "url": f"https://arxiv.org/abs/{paper['id']}" if paper.get("id") else ""}
+                for paper in summarized
+            ]
+            self._emit("synthesis", synthesis=synthesis, references=references)
+            root.set(queries=len(queries), papers=len(papers), from_pdf=sum(p.get("source") == "pdf" for p in papers))
+
+        report = {
+            "question": question,
+            "queries": queries,
+            "papers": papers,
+            "synthesis": synthesis,
+            "references": references,
+            "timings": {"first_summary": first_summary[0] if first_summary else None,
+                        "total": time.perf_counter() - started},
+            "trace_id": root.trace_id,
+        }
+        if error is not None:
+            report["error"] = error
+        return report
+
+
+def deep_research(question: str, llm: Callable[[str], str], cache: Optional[ResearchCache] = None,
+                  config: Optional[DeepResearchConfig] = None,
+                  on_event: Optional[EventHandler] = None) -> Dict[str, Any]:
+    """Blocking entry point: run :class:`DeepResearch` for ``question`` on a new event loop."""
+    return asyncio.run(DeepResearch(llm, cache=cache, config=config, on_event=on_event).run(question))
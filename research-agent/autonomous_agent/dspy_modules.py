@@ -1,7 +1,59 @@
 """DSPy Signatures and Modules for the autonomous research agent."""
+from __future__ import annotations
+
+import asyncio
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import AsyncIterator, Callable, Dict, Iterator, List, Optional, Tuple
+
 import dspy
 from dspy import Signature, ChainOfThought
 
+from research_cache import ResearchCache, summary_key
+
+import common_path  # noqa: F401
+from llm_client import LLMError
+from tracing import get_tracer, in_current_context
+
+# Bump whenever the summarization prompt changes so cached summaries are not reused.
+PROMPT_VERSION = "v1"
+
+
+def is_rate_limit_error(exc: Exception) -> bool:
+    """Best-effort detection of HTTP 429 / quota errors across LLM client libraries."""
+    status = getattr(exc, "status_code", None) or getattr(getattr(exc, "response", None), "status_code", None)
+    if status == 429:
+        return True
+    text = f"{type(exc).__name__} {exc}".lower()
+    return "ratelimit" in text or "rate limit" in text or "too many requests" in text
+
+
+def _retry_after(exc: Exception) -> Optional[float]:
+    headers = getattr(getattr(exc, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+def call_with_retry(fn: Callable[[], Dict[str, str]], max_retries: int = 4,
+                    backoff: float = 1.0) -> Dict[str, str]:
+    """Call ``fn``, retrying rate-limit errors with jittered exponential backoff.
+
+    :class:`LLMError` is raised as is: the shared LLM client has already
+    retried the request, and retrying it again would multiply the attempts.
+    """
+    for attempt in range(max_retries + 1):
+        try:
+            return fn()
+        except Exception as exc:  # noqa: BLE001 - classified below
+            if attempt == max_retries or isinstance(exc, LLMError) or not is_rate_limit_error(exc):
+                raise
+            delay = _retry_after(exc) or backoff * (2 ** attempt)
+            time.sleep(delay * random.uniform(0.5, 1.5))
+    raise AssertionError("unreachable")
+
 
 class SummarizePaper(Signature):
     """Summarizes a research paper given its title and abstract."""
@@ -19,24 +71,103 @@ class SummarizerModule(ChainOfThought):
     llm : Callable[[str], str]
         A function or object with a __call__(str)->str interface that returns the
         model's response given a prompt.
+    cache : ResearchCache, optional
+        Persistent cache consulted before, and filled after, every LLM call.
+    model_id : str
+        Identifier of the model behind ``llm``; part of the cache key.
     """
 
-    def __init__(self, llm):
+    def __init__(self, llm, cache: Optional[ResearchCache] = None, model_id: str = ""):
         # Provide the signature to the ChainOfThought base class
         super().__init__(signature=SummarizePaper)
         self.llm = llm
+        self.cache = cache
+        self.model_id = model_id
 
-    def forward(self, title: str, abstract: str):  # noqa: D401
+    def forward(self, title: str, abstract: str, paper_id: str = ""):  # noqa: D401
         """Generate a concise summary for a paper.
 
         The summary focuses on the main contributions, methodology, and
         significance of the research.
         """
-        prompt = (
-            "You are an expert research assistant. Given the following title and "
-            "abstract, produce a concise summary (3-5 sentences) highlighting the "
-            "main contributions, methodology, and significance.\n\n"
-            f"Title: {title}\n\nAbstract: {abstract}\n\nSummary:"
-        )
-        response = self.llm(prompt)
-        return {"summary": response.strip()}
+        with get_tracer().span("research.summarize", paper_id=paper_id) as span:
+            key = summary_key(paper_id or title, abstract, self.model_id, PROMPT_VERSION)
+            if self.cache is not None:
+                cached = self.cache.get_summary(key)
+                span.set(cache_hit=cached is not None)
+                if cached is not None:
+                    return cached
+
+            prompt = (
+                "You are an expert research assistant. Given the following title and "
+                "abstract, produce a concise summary (3-5 sentences) highlighting the "
+                "main contributions, methodology, and significance.\n\n"
+                f"Title: {title}\n\nAbstract: {abstract}\n\nSummary:"
+            )
+            response = self.llm(prompt)
+            result = {"summary": response.strip()}
+            if self.cache is not None:
+                self.cache.put_summary(key, result)
+            return result
+
+    def batch(
+        self,
+        papers: List[Dict[str, str]],
+        max_concurrency: int = 4,
+        max_retries: int = 4,
+        backoff: float = 1.0,
+    ) -> Iterator[Tuple[int, Dict[str, str]]]:
+        """Summarize ``papers`` concurrently, yielding ``(index, result)`` as each finishes.
+
+        Rate-limit errors from backends without their own retries are retried
+        with jittered exponential backoff (see :func:`call_with_retry`); a paper
+        that still fails yields ``{"summary": "", "error": <message>}`` so the
+        remaining results are not lost.
+        """
+        with ThreadPoolExecutor(max_workers=max_concurrency) as pool:
+            # Run each paper in a copy of the caller's context so its spans nest under the caller's.
+            futures = {
+                pool.submit(
+                    in_current_context(call_with_retry),
+                    lambda paper=paper: self(
+                        title=paper["title"], abstract=paper["abstract"], paper_id=paper.get("id", "")
+                    ),
+                    max_retries,
+                    backoff,
+                ): idx
+                for idx, paper in enumerate(papers)
+            }
+            for future in as_completed(futures):
+                try:
+                    result = future.result()
+                except Exception as exc:  # noqa: BLE001 - reported per paper
+                    result = {"summary": "", "error": str(exc)}
+                yield futures[future], result
+
+    async def abatch(
+        self,
+        papers: List[Dict[str, str]],
+        max_concurrency: int = 4,
+        max_retries: int = 4,
+        backoff: float = 1.0,
+    ) -> AsyncIterator[Tuple[int, Dict[str, str]]]:
+        """Async variant of :meth:`batch`; the blocking LLM calls run in worker threads."""
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def _one(idx: int, paper: Dict[str, str]) -> Tuple[int, Dict[str, str]]:
+            async with semaphore:
+                try:
+                    result = await asyncio.to_thread(
+                        call_with_retry,
+                        lambda: self(
+                            title=paper["title"], abstract=paper["abstract"], paper_id=paper.get("id", "")
+                        ),
+                        max_retries,
+                        backoff,
+                    )
+                except Exception as exc:  # noqa: BLE001 - reported per paper
+                    result = {"summary": "", "error": str(exc)}
+                return idx, result
+
+        for next_done in asyncio.as_completed([_one(i, p) for i, p in enumerate(papers)]):
+            yield await next_done
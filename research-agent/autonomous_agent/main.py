@@ -7,8 +7,13 @@ from pathlib import Path
 import streamlit as st
 from dotenv import load_dotenv
 
-from dspy_modules import SummarizerModule
-from utils import get_llm, search_arxiv
+from deep_research import DeepResearchConfig, deep_research
+from research_cache import ResearchCache
+from research_pipeline import find_papers, open_cache, summarize_papers
+from utils import get_llm
+
+import common_path  # noqa: F401
+from tracing import get_tracer, render_debug_panel
 
 # ---------------------------------------------------------------------------
 # ENV & CONFIG
@@ -20,6 +25,15 @@ load_dotenv(PROJECT_ROOT / ".env")  # preload .env if exists
 st.set_page_config(page_title="🧠 Autonomous Research Agent", layout="wide")
 st.title("🧠 Autonomous Research Assistant")
 
+
+@st.cache_resource
+def get_cache() -> ResearchCache:
+    """Open the search/summary cache once per process."""
+    return open_cache()
+
+
+cache = get_cache()
+
 # --------------------- Sidebar: API Keys ------------------------------
 
 with st.sidebar:
@@ -51,25 +65,106 @@ with st.sidebar:
     except Exception as exc:  # pragma: no cover
         st.warning(f"LLM not initialized: {exc}")
 
+    st.subheader("🗄️ Cache")
+    cache_placeholder = st.empty()
+    if st.button("Clear Cache"):
+        cache.clear()
+
+    show_trace = st.toggle("🔬 Show trace", value=False, help="Per-stage spans of the last run")
+
 # ----------------------- Main Interface ------------------------------
 
 query = st.text_input("🔍 Enter your research topic or question:")
-num_results = st.slider("Number of papers", 1, 10, 3)
-
-run_btn = st.button("🔎 Search and Summarize", disabled=not (llm and query.strip()))
-
-if run_btn and llm:
-    with st.spinner("🔬 Searching ArXiv and generating summaries..."):
-        papers = search_arxiv(query, max_results=num_results)
-
-    if not papers:
-        st.error("No papers found.")
-    else:
-        summarizer = SummarizerModule(llm)
-        st.subheader("📄 Summarized Papers")
-        for idx, paper in enumerate(papers, start=1):
-            result = summarizer(title=paper["title"], abstract=paper["abstract"])
-            st.markdown(f"### Paper {idx}: {paper['title']}")
-            st.markdown(f"**Summary:** {result['summary']}")
-            with st.expander("🔍 View Abstract"):
-                st.write(paper["abstract"])
+mode = st.radio(
+    "Mode",
+    ["Quick summaries", "Deep research"],
+    horizontal=True,
+    help="Deep research plans several searches, reads the full PDFs and writes a synthesis with citations",
+)
+deep = mode == "Deep research"
+num_results = st.slider("Number of papers", 1, 10, 6 if deep else 3)
+max_concurrency = st.slider("Parallel LLM calls", 1, 10, 4)
+
+run_btn = st.button("🔎 Research" if deep else "🔎 Search and Summarize", disabled=not (llm and query.strip()))
+
+
+def render_deep_research(question: str) -> None:
+    """Run the deep research pipeline, filling in each paper as its stages finish."""
+    plan_slot = st.empty()
+    synthesis_slot = st.empty()
+    synthesis_slot.info("⏳ Reading papers; the synthesis follows the last summary...")
+    st.subheader("📄 Papers")
+    slots = {}
+
+    def on_event(event):
+        paper = event.get("paper")
+        if event["type"] == "plan":
+            plan_slot.markdown("**Searches:** " + " · ".join(f"`{q}`" for q in event["queries"]))
+        elif event["type"] == "paper":
+            st.markdown(f"### [{paper['n']}] {paper['title']}")
+            slots[paper["n"]] = st.empty()
+            slots[paper["n"]].info("⏳ Downloading PDF...")
+        elif event["type"] == "parsed":
+            source = "full text" if paper["source"] == "pdf" else "abstract only"
+            slots[paper["n"]].info(f"⏳ Summarizing ({source})...")
+        elif event["type"] == "summary":
+            if paper.get("error"):
+                slots[paper["n"]].error(f"Summary failed: {paper['error']}")
+            else:
+                note = "" if paper["source"] == "pdf" else " _(from the abstract; PDF unavailable)_"
+                slots[paper["n"]].markdown(f"**Summary:** {paper['summary']}{note}")
+        elif event["type"] == "synthesis":
+            if event["synthesis"]:
+                references = "\n".join(
+                    f"{ref['n']}. [{ref['title']}]({ref['url']})" for ref in event["references"]
+                )
+                synthesis_slot.markdown(f"## 🧾 Synthesis\n\n{event['synthesis']}\n\n**References**\n\n{references}")
+            else:
+                synthesis_slot.error("No synthesis: no paper could be summarized.")
+
+    config = DeepResearchConfig(max_papers=num_results, llm_concurrency=max_concurrency)
+    report = deep_research(question, llm, cache=cache, config=config, on_event=on_event)
+    st.session_state.trace_id = report["trace_id"]
+
+
+if run_btn and llm and deep:
+    render_deep_research(query)
+elif run_btn and llm:
+    # Search and summaries are recorded under one trace for the debug panel
+    with get_tracer().span("research.topic", query=query) as root:
+        st.session_state.trace_id = root.trace_id
+        with st.spinner("🔬 Searching ArXiv and generating summaries..."):
+            papers = find_papers(query, max_results=num_results, cache=cache)
+
+        if not papers:
+            st.error("No papers found.")
+        else:
+            st.subheader("📄 Summarized Papers")
+
+            # One slot per paper so results keep their order while arriving out of order
+            summary_slots = []
+            for idx, paper in enumerate(papers, start=1):
+                st.markdown(f"### Paper {idx}: {paper['title']}")
+                summary_slot = st.empty()
+                summary_slot.info("⏳ Summarizing...")
+                with st.expander("🔍 View Abstract"):
+                    st.write(paper["abstract"])
+                summary_slots.append(summary_slot)
+
+            for idx, result in summarize_papers(papers, llm, cache=cache, max_concurrency=max_concurrency):
+                summary_slot = summary_slots[idx]
+                if result.get("error"):
+                    summary_slot.error(f"Summary failed: {result['error']}")
+                else:
+                    summary_slot.markdown(f"**Summary:** {result['summary']}")
+
+if show_trace:
+    render_debug_panel(st.session_state.get("trace_id"))
+
+# Rendered last so the numbers include this run's lookups
+stats = cache.stats()
+cache_placeholder.markdown(
+    f"Searches: {stats['search_hits']} hits / {stats['search_misses']} misses  \n"
+    f"Summaries: {stats['summary_hits']} hits / {stats['summary_misses']} misses  \n"
+    f"Stored: {stats.get('search_entries', 0)} searches, {stats.get('summary_entries', 0)} summaries"
+)
@@ -0,0 +1,142 @@
+"""Persistent SQLite cache for arXiv search results and paper summaries.
+
+Search results are keyed by the normalized query and ``max_results`` and
+expire after ``search_ttl`` seconds. Summaries are keyed by paper id, a hash
+of the abstract, the model id and the summarizer prompt version, so they
+stay valid until one of those changes. The cache is size-bounded: the
+least-recently-used entries are evicted once ``max_bytes`` is exceeded.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+SEARCH = "search"
+SUMMARY = "summary"
+
+
+def normalize_query(query: str) -> str:
+    return " ".join(query.lower().split())
+
+
+def summary_key(paper_id: str, abstract: str, model_id: str, prompt_version: str) -> str:
+    abstract_hash = hashlib.sha256(abstract.encode("utf-8")).hexdigest()
+    return f"{paper_id}|{abstract_hash}|{model_id}|{prompt_version}"
+
+
+class ResearchCache:
+    """Size-bounded key/value cache for the research agent.
+
+    Parameters
+    ----------
+    path : str | Path
+        SQLite database file; created if missing.
+    search_ttl : float
+        Seconds a cached arXiv search stays fresh.
+    max_bytes : int
+        Total size of cached values before LRU eviction kicks in.
+    """
+
+    def __init__(self, path: str | Path, search_ttl: float = 24 * 3600, max_bytes: int = 256 * 1024 * 1024):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.search_ttl = search_ttl
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._counters = {f"{kind}_{event}": 0 for kind in (SEARCH, SUMMARY) for event in ("hits", "misses")}
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            " kind TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL,"
+            " size INTEGER NOT NULL, created REAL NOT NULL, last_access REAL NOT NULL,"
+            " PRIMARY KEY (kind, key))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_entries_access ON entries(last_access)")
+        self._conn.commit()
+
+    # ------------------------------------------------------------------
+    # Generic get/put
+    # ------------------------------------------------------------------
+
+    def _get(self, kind: str, key: str, ttl: Optional[float] = None) -> Optional[Any]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, created FROM entries WHERE kind = ? AND key = ?", (kind, key)
+            ).fetchone()
+            if row is not None and ttl is not None and now - row[1] > ttl:
+                self._conn.execute("DELETE FROM entries WHERE kind = ? AND key = ?", (kind, key))
+                self._conn.commit()
+                row = None
+            if row is None:
+                self._counters[f"{kind}_misses"] += 1
+                return None
+            self._conn.execute(
+                "UPDATE entries SET last_access = ? WHERE kind = ? AND key = ?", (now, kind, key)
+            )
+            self._conn.commit()
+            self._counters[f"{kind}_hits"] += 1
+        return json.loads(row[0])
+
+    def _put(self, kind: str, key: str, value: Any) -> None:
+        payload = json.dumps(value)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?)",
+                (kind, key, payload, len(payload), now, now),
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self) -> None:
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        freed = 0
+        victims = []
+        for kind, key, size in self._conn.execute(
+            "SELECT kind, key, size FROM entries ORDER BY last_access"
+        ):
+            victims.append((kind, key))
+            freed += size
+            if total - freed <= self.max_bytes:
+                break
+        self._conn.executemany("DELETE FROM entries WHERE kind = ? AND key = ?", victims)
+
+    # ------------------------------------------------------------------
+    # Searches and summaries
+    # ------------------------------------------------------------------
+
+    def get_search(self, query: str, max_results: int) -> Optional[List[Dict[str, str]]]:
+        return self._get(SEARCH, f"{normalize_query(query)}|{max_results}", ttl=self.search_ttl)
+
+    def put_search(self, query: str, max_results: int, papers: List[Dict[str, str]]) -> None:
+        self._put(SEARCH, f"{normalize_query(query)}|{max_results}", papers)
+
+    def get_summary(self, key: str) -> Optional[Dict[str, str]]:
+        return self._get(SUMMARY, key)
+
+    def put_summary(self, key: str, result: Dict[str, str]) -> None:
+        self._put(SUMMARY, key, result)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            stats = dict(self._counters)
+            for kind, count, size in self._conn.execute(
+                "SELECT kind, COUNT(*), COALESCE(SUM(size), 0) FROM entries GROUP BY kind"
+            ):
+                stats[f"{kind}_entries"] = count
+                stats[f"{kind}_bytes"] = size
+        return stats
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM entries")
+            self._conn.commit()
@@ -0,0 +1,58 @@
+"""Streamlit-free search-and-summarize pipeline for the research agent.
+
+``main.py`` and the headless ``cli.py`` share these functions, so a nightly
+batch over many topics uses the same arXiv client, cache and summarizer as
+the UI.
+"""
+from __future__ import annotations
+
+import os
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from dspy_modules import SummarizerModule
+from research_cache import ResearchCache
+from utils import get_llm_model_id, search_arxiv
+
+import common_path  # noqa: F401
+from tracing import get_tracer
+
+PROJECT_ROOT = Path(__file__).resolve().parent
+DEFAULT_CACHE_PATH = PROJECT_ROOT / ".cache" / "research.sqlite"
+
+
+def open_cache(path: Optional[str | Path] = None) -> ResearchCache:
+    """Open the search/summary cache at ``path``, ``RESEARCH_CACHE_PATH`` or the default."""
+    return ResearchCache(Path(path or os.getenv("RESEARCH_CACHE_PATH", DEFAULT_CACHE_PATH)))
+
+
+def find_papers(query: str, max_results: int = 3,
+                cache: Optional[ResearchCache] = None) -> List[Dict[str, str]]:
+    return search_arxiv(query, max_results=max_results, cache=cache)
+
+
+def summarize_papers(
+    papers: List[Dict[str, str]],
+    llm: Callable[[str], str],
+    cache: Optional[ResearchCache] = None,
+    max_concurrency: int = 4,
+) -> Iterator[Tuple[int, Dict[str, str]]]:
+    """Yield ``(index, {"summary": ...})`` for each paper as its summary completes."""
+    summarizer = SummarizerModule(llm, cache=cache, model_id=get_llm_model_id())
+    yield from summarizer.batch(papers, max_concurrency=max_concurrency)
+
+
+def research_topic(
+    query: str,
+    llm: Callable[[str], str],
+    cache: Optional[ResearchCache] = None,
+    max_results: int = 3,
+    max_concurrency: int = 4,
+) -> Dict[str, Any]:
+    """Search arXiv for ``query`` and summarize every hit; return a JSON-serialisable report."""
+    with get_tracer().span("research.topic", query=query) as root:
+        papers = find_papers(query, max_results=max_results, cache=cache)
+        results = [dict(paper) for paper in papers]
+        for idx, summary in summarize_papers(papers, llm, cache=cache, max_concurrency=max_concurrency):
+            results[idx].update(summary)
+    return {"query": query, "papers": results, "trace_id": root.trace_id}
@@ -2,13 +2,19 @@
 from __future__ import annotations
 
 import os
-import xml.etree.ElementTree as ET
-from typing import Callable, List, Dict
+from dataclasses import replace
+from typing import Callable, List, Dict, Optional
 
-import requests
 from dotenv import load_dotenv
 import dspy
 
+from arxiv_client import ArxivClient
+from research_cache import ResearchCache
+
+import common_path  # noqa: F401
+from llm_client import DEFAULT_BASE_URL, LLMSettings, get_client
+from tracing import get_tracer
+
 load_dotenv()
 
 # ---------------------------------------------------------------------------
@@ -20,37 +26,33 @@ def _make_openai_like_llm(api_key: str, base_url: str, model: str) -> Callable[[
     """Return a simple callable that wraps an OpenAI-compatible endpoint.
 
     We use this for Groq because their API is OpenAI‐compatible. The callable
-    signature matches what DSPy expects: fn(prompt:str)->str.
+    signature matches what DSPy expects: fn(prompt:str)->str. Calls go through
+    the shared LLM client: pooled connections, ``LLM_RPM``/``LLM_TPM`` rate
+    limits, retries on 429/5xx and coalescing of identical in-flight prompts.
     """
-    import openai
-
-    openai.api_key = api_key
-    # Ensure trailing slash for correct path concatenation
-    openai.base_url = base_url.rstrip("/") + "/"  # type: ignore[attr-defined]
+    client = get_client(replace(LLMSettings.from_env(model), api_key=api_key, base_url=base_url, model=model))
 
     def _completion(prompt: str) -> str:  # noqa: D401
-        resp = openai.chat.completions.create(
-            model=model,
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.3,
-        )
-        return resp.choices[0].message.content.strip()
+        return client.complete(prompt, temperature=0.3).text.strip()
 
     return _completion
 
 
+def _llm_settings() -> LLMSettings:
+    # GROQ_MODEL_ID is kept for existing .env files; LLM_MODEL takes precedence.
+    return LLMSettings.from_env(os.getenv("GROQ_MODEL_ID", "llama-3.3-70b-versatile"))
+
+
 def get_llm() -> Callable[[str], str]:
     """Return an LLM callable based on provided environment variables.
 
     Priority:
-    1. Groq (requires GROQ_API_KEY)
+    1. Groq, or any OpenAI-compatible ``LLM_BASE_URL`` (requires GROQ_API_KEY or LLM_API_KEY)
     2. HuggingFace model via HF_MODEL_ID (no key needed for public models)
     """
-    groq_key = os.getenv("GROQ_API_KEY")
-    if groq_key:
-        base_url = "https://api.groq.com/openai/v1/"  # trailing slash ensured in helper
-        model_id = os.getenv("GROQ_MODEL_ID", "llama-3.3-70b-versatile")
-        return _make_openai_like_llm(api_key=groq_key, base_url=base_url, model=model_id)
+    settings = _llm_settings()
+    if settings.api_key:
+        return _make_openai_like_llm(api_key=settings.api_key, base_url=settings.base_url, model=settings.model)
 
     hf_model = os.getenv("HF_MODEL_ID", "google/flan-t5-large")
     # dspy.HFModel does not need an API key for most public models, but respects the env.
@@ -58,6 +60,15 @@ def get_llm() -> Callable[[str], str]:
 
 
 
+def get_llm_model_id() -> str:
+    """Return the id of the model :func:`get_llm` would use (for cache keys)."""
+    settings = _llm_settings()
+    if settings.api_key:
+        provider = "groq" if settings.base_url.rstrip("/") == DEFAULT_BASE_URL else settings.base_url
+        return f"{provider}:{settings.model}"
+    return "hf:" + os.getenv("HF_MODEL_ID", "google/flan-t5-large")
+
+
 # Convenience alias for backward compatibility
 get_groq_llm = get_llm
 
@@ -66,23 +77,34 @@ get_groq_llm = get_llm
 # ---------------------------------------------------------------------------
 
 
-def search_arxiv(query: str, max_results: int = 3) -> List[Dict[str, str]]:
-    """Search ArXiv and return a list of papers with title & abstract."""
-    query = query.replace(" ", "+")
-    url = (
-        "http://export.arxiv.org/api/query?search_query=all:" f"{query}&start=0&max_results={max_results}"
-    )
-    response = requests.get(url, timeout=30)
-    response.raise_for_status()
-    root = ET.fromstring(response.content)
-
-    papers: List[Dict[str, str]] = []
-    for entry in root.findall("{http://www.w3.org/2005/Atom}entry"):
-        title_el = entry.find("{http://www.w3.org/2005/Atom}title")
-        summary_el = entry.find("{http://www.w3.org/2005/Atom}summary")
-        if title_el is None or summary_el is None:
-            continue
-        title = title_el.text.strip().replace("\n", " ")
-        summary = summary_el.text.strip().replace("\n", " ")
-        papers.append({"title": title, "abstract": summary})
-    return papers
+_arxiv_client: Optional[ArxivClient] = None
+
+
+def get_arxiv_client() -> ArxivClient:
+    """Return the process-wide arXiv client so searches share one connection pool."""
+    global _arxiv_client
+    if _arxiv_client is None:
+        _arxiv_client = ArxivClient()
+    return _arxiv_client
+
+
+def search_arxiv(query: str, max_results: int = 3,
+                 cache: Optional[ResearchCache] = None) -> List[Dict[str, str]]:
+    """Search ArXiv and return a list of papers with title & abstract.
+
+    Each paper also carries its arXiv ``id``, ``authors``, ``published`` date
+    and ``pdf_url``. With a ``cache``, fresh results for the same normalized
+    query are returned without calling the API.
+    """
+    with get_tracer().span("research.search_arxiv", max_results=max_results) as span:
+        if cache is not None:
+            cached = cache.get_search(query, max_results)
+            span.set(cache_hit=cached is not None)
+            if cached is not None:
+                span.set(results=len(cached))
+                return cached
+        papers = list(get_arxiv_client().iter_search(query, max_results=max_results))
+        span.set(results=len(papers))
+        if cache is not None:
+            cache.put_search(query, max_results, papers)
+        return papers
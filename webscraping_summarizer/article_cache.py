@@ -0,0 +1,185 @@
+"""Persistent SQLite cache in front of article download, extraction and summarization.
+
+Three kinds of entries share one size-bounded table:
+
+* ``page`` -- raw HTML per URL with its ``ETag``/``Last-Modified`` headers.
+  Within ``max_age`` seconds the HTML is served as-is; after that it is
+  revalidated with a conditional request and a ``304`` keeps the stored copy.
+* ``extraction`` -- title, text, keywords and metadata keyed by the SHA-256 of
+  the HTML, so newspaper3k never re-parses a page whose content is unchanged.
+* ``summary`` -- keyed by the SHA-256 of the *extracted text*, a hash of the
+  prompts and the model id, so a repeat request needs no LLM call at all,
+  even when only the markup around the article changed (ads, timestamps,
+  CSRF tokens).
+
+The least-recently-used entries are evicted once ``max_bytes`` is exceeded.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+PAGE = "page"
+EXTRACTION = "extraction"
+SUMMARY = "summary"
+KINDS = (PAGE, EXTRACTION, SUMMARY)
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def summary_key(digest: str, prompts: str, model_id: str) -> str:
+    prompt_hash = hashlib.sha256(prompts.encode("utf-8")).hexdigest()[:16]
+    return f"{digest}|{prompt_hash}|{model_id}"
+
+
+class ArticleCache:
+    """Size-bounded cache of pages, extractions and summaries.
+
+    Parameters
+    ----------
+    path : str | Path
+        SQLite database file; created if missing.
+    max_age : float
+        Seconds a cached page is used without revalidating it.
+    max_bytes : int
+        Total size of cached values before LRU eviction kicks in.
+    """
+
+    def __init__(self, path: str | Path, max_age: float = 3600, max_bytes: int = 256 * 1024 * 1024):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_age = max_age
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._counters = {f"{kind}_{event}": 0 for kind in KINDS for event in ("hits", "misses")}
+        self._counters["revalidated"] = 0
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            " kind TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL,"
+            " size INTEGER NOT NULL, created REAL NOT NULL, last_access REAL NOT NULL,"
+            " PRIMARY KEY (kind, key))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_entries_access ON entries(last_access)")
+        self._conn.commit()
+
+    # ------------------------------------------------------------------
+    # Generic get/put
+    # ------------------------------------------------------------------
+
+    def _get(self, kind: str, key: str, count: bool = True) -> Optional[tuple]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, created FROM entries WHERE kind = ? AND key = ?", (kind, key)
+            ).fetchone()
+            if row is None:
+                if count:
+                    self._counters[f"{kind}_misses"] += 1
+                return None
+            self._conn.execute(
+                "UPDATE entries SET last_access = ? WHERE kind = ? AND key = ?", (now, kind, key)
+            )
+            self._conn.commit()
+            if count:
+                self._counters[f"{kind}_hits"] += 1
+        return json.loads(row[0]), row[1]
+
+    def _put(self, kind: str, key: str, value: Any) -> None:
+        payload = json.dumps(value)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?)",
+                (kind, key, payload, len(payload), now, now),
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self) -> None:
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        freed = 0
+        victims = []
+        for kind, key, size in self._conn.execute(
+            "SELECT kind, key, size FROM entries ORDER BY last_access"
+        ):
+            victims.append((kind, key))
+            freed += size
+            if total - freed <= self.max_bytes:
+                break
+        self._conn.executemany("DELETE FROM entries WHERE kind = ? AND key = ?", victims)
+
+    # ------------------------------------------------------------------
+    # Pages
+    # ------------------------------------------------------------------
+
+    def get_page(self, url: str) -> Optional[Dict[str, Any]]:
+        """Return the stored page with a ``fresh`` flag, or ``None``.
+
+        Only fresh pages count as hits; stale ones still need a round trip.
+        """
+        found = self._get(PAGE, url, count=False)
+        fresh = found is not None and time.time() - found[1] <= self.max_age
+        with self._lock:
+            self._counters[f"{PAGE}_hits" if fresh else f"{PAGE}_misses"] += 1
+        if found is None:
+            return None
+        page = found[0]
+        page["fresh"] = fresh
+        return page
+
+    def put_page(self, url: str, html: str, etag: Optional[str] = None,
+                 last_modified: Optional[str] = None) -> Dict[str, Any]:
+        page = {"html": html, "etag": etag, "last_modified": last_modified, "content_hash": content_hash(html)}
+        self._put(PAGE, url, page)
+        return page
+
+    def revalidated(self, url: str, page: Dict[str, Any]) -> None:
+        """Restart the freshness window of ``page`` after a ``304 Not Modified``."""
+        page = {k: v for k, v in page.items() if k != "fresh"}
+        self._put(PAGE, url, page)
+        with self._lock:
+            self._counters["revalidated"] += 1
+
+    # ------------------------------------------------------------------
+    # Extractions and summaries
+    # ------------------------------------------------------------------
+
+    def get_extraction(self, digest: str) -> Optional[Dict[str, Any]]:
+        found = self._get(EXTRACTION, digest)
+        return found[0] if found else None
+
+    def put_extraction(self, digest: str, extraction: Dict[str, Any]) -> None:
+        self._put(EXTRACTION, digest, extraction)
+
+    def get_summary(self, key: str) -> Optional[Dict[str, Any]]:
+        found = self._get(SUMMARY, key)
+        return found[0] if found else None
+
+    def put_summary(self, key: str, result: Dict[str, Any]) -> None:
+        self._put(SUMMARY, key, result)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            stats = dict(self._counters)
+            for kind, count, size in self._conn.execute(
+                "SELECT kind, COUNT(*), COALESCE(SUM(size), 0) FROM entries GROUP BY kind"
+            ):
+                stats[f"{kind}_entries"] = count
+                stats[f"{kind}_bytes"] = size
+        return stats
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM entries")
+            self._conn.commit()
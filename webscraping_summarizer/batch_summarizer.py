@@ -0,0 +1,262 @@
+"""Concurrent multi-URL article summarization.
+
+Pipeline per batch of URLs:
+
+1. fetch every page concurrently over one pooled ``httpx.AsyncClient``;
+2. parse each page with newspaper3k in a process pool as soon as it arrives;
+3. summarize: short articles in a single LLM call, long ones by token-aware
+   map-reduce with the map calls running concurrently.
+
+Results are yielded as each article finishes, not in input order. With an
+:class:`~article_cache.ArticleCache`, fresh pages skip the network, unchanged
+pages skip parsing and already-summarized content skips the LLM.
+"""
+from __future__ import annotations
+
+import asyncio
+import functools
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional
+
+import httpx
+from langchain.prompts import PromptTemplate
+from newspaper import Article
+
+from article_cache import ArticleCache, content_hash, summary_key
+
+import common_path  # noqa: F401
+from tracing import TracingCallbackHandler, annotate, get_tracer
+
+USER_AGENT = "Mozilla/5.0 (compatible; web-article-summarizer/1.0)"
+
+MAP_PROMPT = PromptTemplate(
+    input_variables=["text"],
+    template="Summarize the key points of this part of an article in 3 to 5 bullet points:\n\n{text}\n",
+)
+
+REDUCE_PROMPT = PromptTemplate(
+    input_variables=["text"],
+    template=(
+        "The following are bullet-point summaries of consecutive parts of one article.\n"
+        "Combine them into a single summary of the whole article in 5 bullet points:\n\n{text}\n"
+    ),
+)
+
+# Rough size of a token in English prose, used when tiktoken is unavailable.
+CHARS_PER_TOKEN = 4
+
+
+@functools.lru_cache(maxsize=None)
+def _encoding():
+    # Loaded on first use: tiktoken downloads the BPE file the first time. Without
+    # it (offline host, not installed) token counts fall back to a character estimate.
+    try:
+        import tiktoken
+
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception:  # noqa: BLE001 - not installed, or the encoding file cannot be fetched
+        return None
+
+
+@dataclass
+class ArticleSummary:
+    url: str
+    title: str = ""
+    text: str = ""
+    keywords: List[str] = field(default_factory=list)
+    meta: Dict[str, str] = field(default_factory=dict)
+    summary: str = ""
+    chunks: int = 0
+    cached: bool = False
+    error: Optional[str] = None
+    trace_id: str = ""
+
+
+def count_tokens(text: str) -> int:
+    encoding = _encoding()
+    if encoding is None:
+        return -(-len(text) // CHARS_PER_TOKEN)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def split_by_tokens(text: str, max_tokens: int = 3000, overlap: int = 100) -> List[str]:
+    """Split ``text`` into pieces of at most ``max_tokens`` tokens with a small overlap.
+
+    Without tiktoken the pieces are cut by characters at :data:`CHARS_PER_TOKEN`.
+    """
+    encoding = _encoding()
+    if encoding is None:
+        size, step = max_tokens * CHARS_PER_TOKEN, (max_tokens - overlap) * CHARS_PER_TOKEN
+        if len(text) <= size:
+            return [text]
+        return [text[start:start + size] for start in range(0, len(text), step)]
+    tokens = encoding.encode(text, disallowed_special=())
+    if len(tokens) <= max_tokens:
+        return [text]
+    step = max_tokens - overlap
+    return [encoding.decode(tokens[start:start + max_tokens]) for start in range(0, len(tokens), step)]
+
+
+def parse_article(url: str, html: str) -> Dict[str, Any]:
+    """Worker: extract title, text, keywords and metadata from downloaded HTML."""
+    article = Article(url)
+    article.download(input_html=html)
+    article.parse()
+    article.nlp()  # For keywords
+    return {
+        "title": article.title,
+        "text": article.text,
+        "keywords": list(article.keywords),
+        "meta": {k: str(v) for k, v in article.meta_data.items() if not isinstance(v, dict)},
+    }
+
+
+async def fetch_page(client: httpx.AsyncClient, url: str, cache: Optional[ArticleCache] = None) -> Dict[str, Any]:
+    """Return ``{"html", "content_hash", ...}`` for ``url``, revalidating cached copies when stale."""
+    page = cache.get_page(url) if cache is not None else None
+    if page is not None and page["fresh"]:
+        annotate(cache="fresh")
+        return page
+
+    headers = {}
+    if page is not None:
+        if page.get("etag"):
+            headers["If-None-Match"] = page["etag"]
+        if page.get("last_modified"):
+            headers["If-Modified-Since"] = page["last_modified"]
+    response = await client.get(url, headers=headers)
+    annotate(status_code=response.status_code)
+    if response.status_code == 304 and page is not None:
+        annotate(cache="revalidated")
+        cache.revalidated(url, page)
+        return page
+    response.raise_for_status()
+    annotate(cache="miss" if cache is not None else "off")
+
+    html = response.text
+    if cache is None:
+        return {"html": html, "content_hash": content_hash(html)}
+    return cache.put_page(url, html, response.headers.get("etag"), response.headers.get("last-modified"))
+
+
+async def summarize_text(text: str, chain, map_chain, reduce_chain, max_tokens: int = 3000,
+                         semaphore: Optional[asyncio.Semaphore] = None) -> tuple:
+    """Return ``(summary, n_chunks)``; long texts go through concurrent map-reduce."""
+    semaphore = semaphore or asyncio.Semaphore(4)
+
+    async def _run(llm_chain, body: str) -> str:
+        async with semaphore:
+            return await llm_chain.arun(text=body, callbacks=[TracingCallbackHandler()])
+
+    chunks = split_by_tokens(text, max_tokens=max_tokens)
+    if len(chunks) == 1:
+        return await _run(chain, text), 1
+
+    partials = await asyncio.gather(*(_run(map_chain, chunk) for chunk in chunks))
+    combined = "\n\n".join(partials)
+    # Reduce recursively until the partial summaries fit in one prompt.
+    while count_tokens(combined) > max_tokens:
+        groups = split_by_tokens(combined, max_tokens=max_tokens, overlap=0)
+        combined = "\n\n".join(await asyncio.gather(*(_run(reduce_chain, group) for group in groups)))
+    return await _run(reduce_chain, combined), len(chunks)
+
+
+async def summarize_urls(
+    urls: List[str],
+    chain,
+    map_chain,
+    reduce_chain,
+    fetch_concurrency: int = 8,
+    llm_concurrency: int = 4,
+    parse_workers: Optional[int] = None,
+    max_tokens: int = 3000,
+    timeout: float = 20.0,
+    cache: Optional[ArticleCache] = None,
+    model_id: str = "",
+) -> AsyncIterator[ArticleSummary]:
+    """Fetch, parse and summarize ``urls`` concurrently, yielding each result when done.
+
+    With a ``cache``, unchanged pages are neither re-parsed nor re-summarized.
+    """
+    loop = asyncio.get_running_loop()
+    tracer = get_tracer()
+    fetch_limit = asyncio.Semaphore(fetch_concurrency)
+    llm_limit = asyncio.Semaphore(llm_concurrency)
+    limits = httpx.Limits(max_connections=fetch_concurrency, max_keepalive_connections=fetch_concurrency)
+    prompts = "\n".join(c.prompt.template for c in (chain, map_chain, reduce_chain)) + f"\n{max_tokens}"
+    # The process pool is only started on the first extraction cache miss; a
+    # single URL is parsed on a thread to skip the pool start-up cost.
+    executors = {}
+
+    def _executor():
+        if len(urls) == 1:
+            return None
+        if "pool" not in executors:
+            executors["pool"] = ProcessPoolExecutor(max_workers=parse_workers)
+        return executors["pool"]
+
+    async def _one(client: httpx.AsyncClient, url: str) -> ArticleSummary:
+        result = ArticleSummary(url=url)
+        # One root span per URL (its own trace unless the caller has a span open).
+        with tracer.span("web.article", url=url) as root:
+            result.trace_id = root.trace_id
+            try:
+                async with fetch_limit:
+                    with tracer.span("web.fetch"):
+                        page = await fetch_page(client, url, cache)
+                digest = page["content_hash"]
+
+                with tracer.span("web.parse") as span:
+                    parsed = cache.get_extraction(digest) if cache is not None else None
+                    span.set(cache_hit=parsed is not None)
+                    if parsed is None:
+                        parsed = await loop.run_in_executor(_executor(), parse_article, url, page["html"])
+                        if cache is not None:
+                            cache.put_extraction(digest, parsed)
+                result.title = parsed["title"]
+                result.text = parsed["text"]
+                result.keywords = parsed["keywords"]
+                result.meta = parsed["meta"]
+
+                with tracer.span("web.summarize") as span:
+                    # Keyed on the article text, not the HTML: markup churn must not cost an LLM call.
+                    key = summary_key(content_hash(result.text), prompts, model_id)
+                    stored = cache.get_summary(key) if cache is not None else None
+                    span.set(cache_hit=stored is not None)
+                    if stored is not None:
+                        result.summary, result.chunks, result.cached = stored["summary"], stored["chunks"], True
+                    else:
+                        result.summary, result.chunks = await summarize_text(
+                            result.text, chain, map_chain, reduce_chain, max_tokens=max_tokens, semaphore=llm_limit
+                        )
+                        if cache is not None:
+                            cache.put_summary(key, {"summary": result.summary, "chunks": result.chunks})
+                    span.set(chunks=result.chunks)
+            except Exception as exc:  # noqa: BLE001 - reported per URL
+                result.error = root.error = str(exc)
+        return result
+
+    try:
+        async with httpx.AsyncClient(timeout=timeout, limits=limits, follow_redirects=True,
+                                     headers={"User-Agent": USER_AGENT}) as client:
+            for next_done in asyncio.as_completed([_one(client, url) for url in urls]):
+                yield await next_done
+    finally:
+        if "pool" in executors:
+            executors["pool"].shutdown(wait=False, cancel_futures=True)
+
+
+def run_batch(urls: List[str], chain, map_chain, reduce_chain,
+              on_result: Optional[Callable[[ArticleSummary], None]] = None, **kwargs) -> List[ArticleSummary]:
+    """Synchronous entry point (e.g. for Streamlit); ``on_result`` fires per finished article."""
+
+    async def _collect() -> List[ArticleSummary]:
+        results = []
+        async for result in summarize_urls(urls, chain, map_chain, reduce_chain, **kwargs):
+            if on_result is not None:
+                on_result(result)
+            results.append(result)
+        return results
+
+    return asyncio.run(_collect())
@@ -0,0 +1,77 @@
+"""Headless batch runner for the web article summarizer.
+
+Summarize a list of URLs without Streamlit::
+
+    python cli.py urls.txt --out summaries.jsonl --fetch-concurrency 16
+
+Input lines are plain URLs or JSON objects with a ``url`` field (other
+fields are copied to the output). Results are written as each article
+finishes. Input and output default to stdin/stdout (``-``).
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+from dataclasses import asdict
+from typing import Any, Dict, Iterator, List
+
+from dotenv import load_dotenv
+
+from batch_summarizer import run_batch
+from summarizer_pipeline import build_chains, make_llm, open_cache, summarize_options
+
+
+def read_jsonl(path: str) -> Iterator[Dict[str, Any]]:
+    stream = sys.stdin if path == "-" else open(path, encoding="utf-8")
+    with stream:
+        for line in stream:
+            line = line.strip()
+            if line:
+                yield json.loads(line) if line.startswith("{") else {"url": line}
+
+
+def main(argv: List[str] | None = None) -> int:
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Web article summarizer batch runner")
+    parser.add_argument("input", nargs="?", default="-")
+    parser.add_argument("--out", default="-")
+    parser.add_argument("--fetch-concurrency", type=int, default=8, help="Parallel downloads")
+    parser.add_argument("--llm-concurrency", type=int, default=4, help="Parallel LLM calls")
+    parser.add_argument("--parse-workers", type=int, default=None, help="newspaper3k worker processes")
+    parser.add_argument("--include-text", action="store_true", help="Also write the extracted article text")
+    parser.add_argument("--no-cache", action="store_true", help="Bypass the article cache")
+    args = parser.parse_args(argv)
+
+    records = {}
+    for record in read_jsonl(args.input):
+        records.setdefault(record["url"], record)
+
+    out = sys.stdout if args.out == "-" else open(args.out, "w", encoding="utf-8")
+    failures = []
+
+    def _write(result) -> None:
+        row = asdict(result)
+        if not args.include_text:
+            row.pop("text")
+        if result.error:
+            failures.append(result.url)
+        out.write(json.dumps({**records[result.url], **row}, ensure_ascii=False) + "\n")
+        out.flush()
+
+    chain, map_chain, reduce_chain = build_chains(make_llm())
+    run_batch(
+        list(records), chain, map_chain, reduce_chain,
+        on_result=_write,
+        fetch_concurrency=args.fetch_concurrency,
+        llm_concurrency=args.llm_concurrency,
+        parse_workers=args.parse_workers,
+        **summarize_options(None if args.no_cache else open_cache()),
+    )
+    if out is not sys.stdout:
+        out.close()
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
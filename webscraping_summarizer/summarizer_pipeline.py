@@ -0,0 +1,64 @@
+"""Streamlit-free setup for the web article summarizer.
+
+``web_scraper_summarizer.py`` and the headless ``cli.py`` build the LLM,
+chains and cache here and then run :func:`batch_summarizer.run_batch`.
+"""
+from __future__ import annotations
+
+import os
+from dataclasses import replace
+from pathlib import Path
+from typing import Any, Dict, Tuple
+
+from langchain.chains import LLMChain
+from langchain.prompts import PromptTemplate
+
+from article_cache import ArticleCache
+from batch_summarizer import MAP_PROMPT, REDUCE_PROMPT
+
+import common_path  # noqa: F401
+from chat_model import PooledChatModel
+from llm_client import LLMSettings, get_client
+
+MODEL_NAME = "mixtral-8x7b-32768"
+DEFAULT_CACHE_PATH = Path(__file__).resolve().parent / ".cache" / "articles.sqlite"
+
+# Prompt template for summarization
+SUMMARY_PROMPT = PromptTemplate(
+    input_variables=["text"],
+    template="Summarize the following article in 5 bullet points:\n\n{text}\n"
+)
+
+
+def llm_settings(api_key: str | None = None) -> LLMSettings:
+    """``LLM_*`` settings with :data:`MODEL_NAME` as the default model."""
+    settings = LLMSettings.from_env(MODEL_NAME)
+    return replace(settings, api_key=api_key or settings.api_key)
+
+
+def make_llm(api_key: str | None = None) -> PooledChatModel:
+    """Chat model on the shared client, so concurrent map calls respect the provider quota."""
+    return PooledChatModel(client=get_client(llm_settings(api_key)))
+
+
+def build_chains(llm) -> Tuple[LLMChain, LLMChain, LLMChain]:
+    """Return ``(chain, map_chain, reduce_chain)``; the last two handle articles too long for one prompt."""
+    return (
+        LLMChain(llm=llm, prompt=SUMMARY_PROMPT),
+        LLMChain(llm=llm, prompt=MAP_PROMPT),
+        LLMChain(llm=llm, prompt=REDUCE_PROMPT),
+    )
+
+
+def open_cache() -> ArticleCache:
+    """Open the article cache configured by ``ARTICLE_CACHE_*``."""
+    return ArticleCache(
+        Path(os.getenv("ARTICLE_CACHE_PATH", DEFAULT_CACHE_PATH)),
+        max_age=float(os.getenv("ARTICLE_CACHE_MAX_AGE", "3600")),
+        max_bytes=int(os.getenv("ARTICLE_CACHE_MAX_MB", "256")) * 1024 * 1024,
+    )
+
+
+def summarize_options(cache: ArticleCache | None = None) -> Dict[str, Any]:
+    """Keyword arguments for :func:`batch_summarizer.run_batch` shared by the app and the CLI."""
+    return dict(max_tokens=int(os.getenv("MAX_CHUNK_TOKENS", "3000")), cache=cache, model_id=llm_settings().model)
@@ -1,56 +1,122 @@
-import os
+import time
 from dotenv import load_dotenv
-from newspaper import Article
-from langchain.chat_models import ChatGroq
-from langchain.prompts import PromptTemplate
-from langchain.chains import LLMChain
 import streamlit as st
+from batch_summarizer import run_batch
+from summarizer_pipeline import build_chains, make_llm, open_cache, summarize_options
+import common_path  # noqa: F401
+from tracing import render_debug_panel
 
 # Load .env
 load_dotenv()
-GROQ_API_KEY = os.getenv("GROQ_API_KEY")
 
-# Load LLM
-llm = ChatGroq(api_key=GROQ_API_KEY, model="mixtral-8x7b-32768")
+# Load LLM; map-reduce chains handle articles too long for a single prompt
+llm = make_llm()
+chain, map_chain, reduce_chain = build_chains(llm)
 
-# Prompt template for summarization
-prompt = PromptTemplate(
-    input_variables=["text"],
-    template="Summarize the following article in 5 bullet points:\n\n{text}\n"
-)
 
-chain = LLMChain(llm=llm, prompt=prompt)
+@st.cache_resource
+def get_article_cache():
+    """Open the page/extraction/summary cache once per process."""
+    return open_cache()
+
+
+article_cache = get_article_cache()
+run_options = summarize_options(article_cache)
 
 # Streamlit UI
 st.title("📰 Web Article Summarizer")
 
-url = st.text_input("Enter article URL:")
-if st.button("Summarize"):
+with st.sidebar:
+    st.header("🗄️ Cache")
+    cache_stats = article_cache.stats()
+    st.write(
+        f"Pages: {cache_stats.get('page_entries', 0)} · "
+        f"Summaries: {cache_stats.get('summary_entries', 0)} · "
+        f"{sum(v for k, v in cache_stats.items() if k.endswith('_bytes')) / 1e6:.1f} MB"
+    )
+    st.caption(
+        f"Summary hits {cache_stats['summary_hits']} / misses {cache_stats['summary_misses']} · "
+        f"revalidated pages {cache_stats['revalidated']}"
+    )
+    if st.button("Clear cache"):
+        article_cache.clear()
+        st.success("Cache cleared.")
+    # Per-stage spans (fetch, parse, LLM calls) of each article
+    show_trace = st.toggle("🔬 Show trace", value=False)
+
+mode = st.radio("Mode", ["Single URL", "Batch"], horizontal=True)
+
+if mode == "Single URL":
+    url = st.text_input("Enter article URL:")
+else:
+    url = None
+    urls_text = st.text_area("Enter article URLs (one per line):", height=150)
+    fetch_concurrency = st.slider("Parallel downloads", 1, 32, 8)
+    llm_concurrency = st.slider("Parallel LLM calls", 1, 16, 4)
+
+if mode == "Batch" and st.button("Summarize all"):
+    urls = list(dict.fromkeys(u.strip() for u in urls_text.splitlines() if u.strip()))
+    if urls:
+        progress = st.progress(0.0, text=f"0 / {len(urls)} articles")
+        done = []
+
+        def show_result(result):
+            done.append(result)
+            progress.progress(len(done) / len(urls), text=f"{len(done)} / {len(urls)} articles")
+            if show_trace:
+                render_debug_panel(result.trace_id, title=f"🔬 Trace: {result.url}")
+            with st.expander(f"{'❌' if result.error else '✅'} {result.title or result.url}", expanded=not result.error):
+                if result.error:
+                    st.error(f"Failed to summarize {result.url}: {result.error}")
+                    return
+                st.caption(
+                    result.url
+                    + (f" · map-reduce over {result.chunks} chunks" if result.chunks > 1 else "")
+                    + (" · ⚡ cached" if result.cached else "")
+                )
+                st.markdown(result.summary)
+                st.markdown("**🏷️ Keywords:** " + ", ".join(result.keywords))
+
+        run_batch(
+            urls, chain, map_chain, reduce_chain,
+            on_result=show_result,
+            fetch_concurrency=fetch_concurrency,
+            llm_concurrency=llm_concurrency,
+            **run_options,
+        )
+    else:
+        st.warning("Please enter at least one URL.")
+
+if mode == "Single URL" and st.button("Summarize"):
     if url:
         try:
-            # Extract article
-            article = Article(url)
-            article.download()
-            article.parse()
-            article.nlp()  # For keywords
+            # Fetch, extract and summarize; repeat requests are served from the cache
+            start = time.perf_counter()
+            with st.spinner("Summarizing..."):
+                # Long articles are split by tokens and summarized map-reduce style
+                article = run_batch([url], chain, map_chain, reduce_chain, **run_options)[0]
+            if article.error:
+                raise RuntimeError(article.error)
+            elapsed = time.perf_counter() - start
 
             st.subheader(article.title)
-            st.write(f"🕒 Reading time: {article.meta_data.get('reading_time', 'Unknown')} mins")
+            st.write(f"🕒 Reading time: {article.meta.get('reading_time', 'Unknown')} mins")
 
             # Show extracted info
             with st.expander("📄 Full Article Text"):
                 st.write(article.text)
 
-            # Summarize
-            with st.spinner("Summarizing..."):
-                summary = chain.run(text=article.text)
-                st.subheader("🔍 Summary:")
-                st.markdown(summary)
+            st.subheader("🔍 Summary:")
+            st.markdown(article.summary)
+            st.caption(f"{'⚡ From cache' if article.cached else '🤖 Generated'} in {elapsed:.2f}s")
 
             # Optional: show keywords
             st.markdown("### 🏷️ Keywords:")
             st.write(", ".join(article.keywords))
 
+            if show_trace:
+                render_debug_panel(article.trace_id)
+
         except Exception as e:
             st.error(f"Failed to summarize the article: {str(e)}")
     else: